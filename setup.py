@@ -282,6 +282,8 @@ setup_args = {
                             'bin/radical-pilot-run-session',
                             'bin/radical-pilot-stats',
                             'bin/radical-pilot-stats.plot',
+                            'bin/radical-pilot-top',
+                            'bin/radical-pilot-agent-bench',
                             'bin/radical-pilot-version',
                             'bin/radical-pilot-agent',
                             'bin/radical-pilot-agent-statepush'
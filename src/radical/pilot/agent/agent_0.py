@@ -9,6 +9,7 @@ import copy
 import stat
 import time
 import pprint
+import threading
 import subprocess         as sp
 
 import radical.utils      as ru
@@ -60,9 +61,28 @@ class Agent_0(rpu.Worker):
         self._final_cause = None
         self._lrms        = None
 
+        # late binding: we pull units from the pools of these unit managers,
+        # and keep track of the resources used by the units we own
+        self._pools         = set()
+        self._inflight      = dict()
+        self._inflight_lock = threading.RLock()
+
+        # we never ingest more units than this (0: unlimited)
+        self._max_inflight  = cfg.get('max_inflight_units', 0)
+
         # this better be on a shared FS!
         cfg['workdir']    = os.getcwd()
 
+        # unit handles can only be exchanged between components on this node
+        # (see `rpu.UnitStore`), so we disable the unit store if any sub-agent
+        # runs elsewhere
+        if cfg.get('unit_store'):
+            for sa, sa_cfg in cfg.get('agents', {}).iteritems():
+                if sa_cfg.get('target') != 'local':
+                    print 'disable unit store (%s runs remote)' % sa
+                    cfg['unit_store'] = None
+                    break
+
         # sanity check on config settings
         if 'cores'               not in cfg: raise ValueError('Missing number of cores')
         if 'lrms'                not in cfg: raise ValueError('Missing LRMS')
@@ -128,6 +148,10 @@ class Agent_0(rpu.Worker):
         # create the sub-agent configs
         self._write_sa_configs()
 
+        # record the bridge addresses for external tools, such as
+        # `radical-pilot-top`
+        ru.write_json(self._cfg['bridges'], './bridges.json')
+
         # and start the sub agents
         self._start_sub_agents()
 
@@ -156,6 +180,10 @@ class Agent_0(rpu.Worker):
         self.register_timed_cb(self._check_units_cb,
                                timer=self._cfg['db_poll_sleeptime'])
 
+        # we watch unit states to learn about freed resources, which we need to
+        # size the bulks for late binding unit pulls
+        self.register_subscriber(rpc.STATE_PUBSUB, self._state_cb)
+
 
         # record hostname in profile to enable mapping of profile entries
         self._prof.prof(event='hostname', uid=self._pid, msg=ru.get_hostname())
@@ -171,6 +199,7 @@ class Agent_0(rpu.Worker):
         self.publish(rpc.CONTROL_PUBSUB, {'cmd' : 'terminate',
                                           'arg' : None})
 
+        self.unregister_subscriber(rpc.STATE_PUBSUB, self._state_cb)
         self.unregister_timed_cb(self._check_units_cb)
         self.unregister_output(rps.AGENT_STAGING_INPUT_PENDING)
         self.unregister_timed_cb(self._agent_command_cb)
@@ -234,7 +263,7 @@ class Agent_0(rpu.Worker):
         try    : log = open('./agent_0.log', 'r').read(1024)
         except Exception: pass
 
-        ret = self._session._dbs._c.update(
+        ret = self._session._dbs.get_collection('pilot').update(
                 {'type'   : 'pilot',
                  'uid'    : self._pid},
                 {'$set'   : {'stdout'        : rpu.tail(out),
@@ -251,8 +280,15 @@ class Agent_0(rpu.Worker):
         # we have all information needed by the subagents -- write the
         # sub-agent config files.
 
+        # components get an instance index which is unique over all agents
+        # (used to spread consumers over queue shards).  agent_0's components
+        # come first, then those of the sub-agents, in order of their names.
+        offsets = dict()
+        for cname, ccfg in self._cfg.get('components', {}).iteritems():
+            offsets[cname] = ccfg.get('count', 1)
+
         # write deep-copies of the config for each sub-agent (sans from agent_0)
-        for sa in self._cfg.get('agents', {}):
+        for sa in sorted(self._cfg.get('agents', {})):
 
             assert(sa != 'agent_0'), 'expect subagent, not agent_0'
 
@@ -268,6 +304,10 @@ class Agent_0(rpu.Worker):
             tmp_cfg['agent_name'] = sa
             tmp_cfg['owner']      = 'agent_0'
 
+            tmp_cfg['component_offsets'] = dict(offsets)
+            for cname, ccfg in tmp_cfg['components'].iteritems():
+                offsets[cname] = offsets.get(cname, 0) + ccfg.get('count', 1)
+
             ru.write_json(tmp_cfg, './%s.cfg' % sa)
 
 
@@ -422,7 +462,7 @@ class Agent_0(rpu.Worker):
         #        should then be communicated over the command pubsub
         # FIXME: commands go to pmgr, umgr, session docs
         # FIXME: this is disabled right now
-        retdoc = self._session._dbs._c.find_and_modify(
+        retdoc = self._session._dbs.get_collection('pilot').find_and_modify(
                     query ={'uid'  : self._pid},
                     update={'$set' : {'cmd': []}},  # Wipe content of array
                     fields=['cmd'])
@@ -462,6 +502,15 @@ class Agent_0(rpu.Worker):
                 self._log.info('cancel_units cmd')
                 self.publish(rpc.CONTROL_PUBSUB, {'cmd' : 'cancel_units',
                                                   'arg' : arg})
+
+            elif cmd == 'add_pool':
+                self._log.info('add unit pool %s', arg['pool'])
+                self._pools.add(arg['pool'])
+
+            elif cmd == 'remove_pool':
+                self._log.info('remove unit pool %s', arg['pool'])
+                self._pools.discard(arg['pool'])
+
             else:
                 self._log.error('could not interpret cmd "%s" - ignore', cmd)
 
@@ -502,30 +551,85 @@ class Agent_0(rpu.Worker):
         #        to use 'find'.  To avoid finding the same units over and over
         #        again, we update the 'control' field *before* running the next
         #        find -- so we do it right here.
-        #        This also blocks us from using multiple ingest threads, or from
-        #        doing late binding by unit pull :/
-        unit_cursor = self._session._dbs._c.find({'type'    : 'unit',
-                                                  'pilot'   : self._pid,
-                                                  'control' : 'agent_pending'})
-        if not unit_cursor.count():
+        #        This also blocks us from using multiple ingest threads.  Late
+        #        binding by unit pull is handled separately, in
+        #        `_claim_units()`.
+        #
+        # We only pull as many units as the agent pipeline can take.
+        limit = self._get_ingest_limit()
+        if limit == 0:
+            self._log.info('units pulled:    0 (agent is busy)')
+            return True
+
+        coll        = self._session._dbs.get_collection('unit')
+        unit_cursor = coll.find({'type'    : 'unit',
+                                 'pilot'   : self._pid,
+                                 'control' : 'agent_pending'})
+        if limit:
+            unit_cursor = unit_cursor.limit(limit)
+
+        unit_list = list(unit_cursor)
+        if not unit_list:
             # no units whatsoever...
             self._log.info('units pulled:    0')
-            return True  # this is not an error
 
-        # update the units to avoid pulling them again next time.
-        unit_list = list(unit_cursor)
-        unit_uids = [unit['uid'] for unit in unit_list]
+        else:
+            # update the units to avoid pulling them again next time.
+            unit_uids = [unit['uid'] for unit in unit_list]
 
-        self._log.info('units PULLED: %4d', len(unit_list))
+            self._log.info('units PULLED: %4d', len(unit_list))
 
-        self._session._dbs._c.update({'type'  : 'unit',
-                                      'uid'   : {'$in'     : unit_uids}},
-                                     {'$set'  : {'control' : 'agent'}},
-                                     multi=True)
+            coll.update({'type'  : 'unit',
+                         'uid'   : {'$in'     : unit_uids}},
+                        {'$set'  : {'control' : 'agent'}},
+                        multi=True)
 
-        self._log.info("units pulled: %4d", len(unit_list))
-        self._prof.prof('get', msg='bulk size: %d' % len(unit_list),
-                        uid=self._pid)
+            self._log.info("units pulled: %4d", len(unit_list))
+            self._prof.prof('get', msg='bulk size: %d' % len(unit_list),
+                            uid=self._pid)
+
+            for unit in unit_list:
+
+                # FIXME: raise or fail unit!
+                if unit['control'] != 'agent_pending':
+                    self._log.error('invalid control: %s', (pprint.pformat(unit)))
+
+            self._ingest_units(unit_list)
+
+        # if we serve any unit pools, claim as many units from there as we
+        # currently have capacity for
+        if self._pools:
+            self._claim_units()
+
+        return True
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _get_ingest_limit(self):
+        '''
+        Return the max number of units we should ingest right now: `0` if the
+        staging input queue is full, or if `max_inflight_units` are in flight
+        already, `None` if there is no limit.  Units are in flight until they
+        are done executing (see `_state_cb()`).
+        '''
+
+        output = self._outputs.get(rps.AGENT_STAGING_INPUT_PENDING)
+        if output:
+            with self._put_lock:
+                if output.is_full():
+                    return 0
+
+        if not self._max_inflight:
+            return None
+
+        with self._inflight_lock:
+            return max(0, self._max_inflight - len(self._inflight))
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _ingest_units(self, unit_list):
 
         for unit in unit_list:
 
@@ -533,22 +637,164 @@ class Agent_0(rpu.Worker):
             unit['state'] = rps._unit_state_collapse(unit['states'])
             self._prof.prof('get', uid=unit['uid'])
 
-            # FIXME: raise or fail unit!
-            if unit['control'] != 'agent_pending':
-                self._log.error('invalid control: %s', (pprint.pformat(unit)))
-
             if unit['state'] != rps.AGENT_STAGING_INPUT_PENDING:
                 self._log.error('invalid state: %s', (pprint.pformat(unit)))
 
             unit['control'] = 'agent'
 
+        # keep track of the resources the units will occupy
+        with self._inflight_lock:
+            for unit in unit_list:
+                self._inflight[unit['uid']] = self._get_unit_size(unit)
+
         # now we really own the CUs, and can start working on them (ie. push
         # them into the pipeline).  We don't publish nor profile as advance,
         # since that happened already on the module side when the state was set.
         self.advance(unit_list, publish=False, push=True)
 
+
+    # --------------------------------------------------------------------------
+    #
+    def _get_unit_size(self, unit):
+
+        descr = unit['description']
+        cores = (descr.get('cpu_processes') or 1) \
+              * (descr.get('cpu_threads')   or 1)
+        gpus  = (descr.get('gpu_processes') or 0)
+
+        return [cores, gpus]
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _state_cb(self, topic, msg):
+
+        # units free their resources once they are done executing: successful
+        # units leave the agent in UMGR_STAGING_OUTPUT_PENDING, which is not
+        # final, so we release on any state from AGENT_STAGING_OUTPUT onward.
+        cmd = msg.get('cmd')
+        arg = msg.get('arg')
+
+        if cmd != 'update':
+            return True
+
+        if not isinstance(arg, list): things = [arg]
+        else                        : things =  arg
+
+        done = rps._unit_state_value(rps.AGENT_STAGING_OUTPUT)
+
+        with self._inflight_lock:
+            for thing in things:
+                if  thing.get('type') == 'unit'         and \
+                    thing['uid']      in self._inflight and \
+                    rps._unit_state_values.get(thing.get('state'), -1) >= done:
+                    del(self._inflight[thing['uid']])
+
         return True
 
 
+    # --------------------------------------------------------------------------
+    #
+    def _claim_units(self):
+        '''
+        Claim units from the pools of the unit managers we serve.  Those units
+        are not bound to any pilot, and other agents will compete for them.  We
+        thus first look for candidate units which fit into our free capacity,
+        then claim those in a single update which only matches units which are
+        still unbound, and then find out which of the candidates we actually
+        own.  The update is atomic per document, so no unit will ever be claimed
+        by two agents.
+        '''
+
+        with self._inflight_lock:
+            used_cores = sum([size[0] for size in self._inflight.values()])
+            used_gpus  = sum([size[1] for size in self._inflight.values()])
+
+        free_cores = self._cfg['cores']          - used_cores
+        free_gpus  = self._cfg.get('gpus', 0)    - used_gpus
+
+        if free_cores <= 0:
+            self._log.debug('no capacity for pool units')
+            return
+
+        limit = self._get_ingest_limit()
+        if limit == 0:
+            self._log.debug('agent is busy - no pool units')
+            return
+
+        coll  = self._session._dbs.get_collection('unit')
+        query = {'type'    : 'unit',
+                 'umgr'    : {'$in' : list(self._pools)},
+                 'pilot'   : None,
+                 'control' : 'agent_pending',
+                 'state'   : rps.AGENT_STAGING_INPUT_PENDING}
+
+        # each unit needs at least one core, so we never need to look at more
+        # than `free_cores` candidates
+        if limit: limit = min(limit, free_cores)
+        else    : limit = free_cores
+        cursor = coll.find(query, ['uid', 'description'], limit=limit)
+
+        uids = list()
+        for doc in cursor:
+            cores, gpus = self._get_unit_size(doc)
+            if cores <= free_cores and gpus <= free_gpus:
+                uids.append(doc['uid'])
+                free_cores -= cores
+                free_gpus  -= gpus
+
+        if not uids:
+            self._log.info('units claimed:   0')
+            return
+
+        # claim the candidates which are still unbound
+        claim = copy.deepcopy(query)
+        claim['uid'] = {'$in' : uids}
+        del(claim['umgr'])
+        coll.update(claim, {'$set' : {'pilot'   : self._pid,
+                                      'control' : 'agent'}},
+                    multi=True)
+
+        unit_list = list(coll.find({'type'  : 'unit',
+                                    'uid'   : {'$in' : uids},
+                                    'pilot' : self._pid}))
+
+        self._log.info('units claimed: %4d (of %d)', len(unit_list), len(uids))
+
+        if not unit_list:
+            return
+
+        self._prof.prof('get', msg='claim size: %d' % len(unit_list),
+                        uid=self._pid)
+
+        # the units only now learn about their sandboxes.  We record those in
+        # the DB for the unit manager to find (it needs them for output
+        # staging).
+        # the unit sandboxes need to have the pilot sandbox as prefix (see
+        # `get_local_context()`), so we avoid double slashes.
+        fs_url       = ru.Url(self._cfg['resource_cfg']['filesystem_endpoint'])
+        fs_url.path  = self._cfg['resource_sandbox']
+        rsbox        = str(fs_url)
+        psbox_path   = self._cfg['pilot_sandbox'].rstrip('/')
+        fs_url.path  = '%s/' % psbox_path
+        psbox        = str(fs_url)
+
+        bulk = coll.initialize_ordered_bulk_op()
+        for unit in unit_list:
+            fs_url.path = '%s/%s/' % (psbox_path, unit['uid'])
+            unit['pilot']            = self._pid
+            unit['resource_sandbox'] = rsbox
+            unit['pilot_sandbox'   ] = psbox
+            unit['unit_sandbox'    ] = str(fs_url)
+            bulk.find({'type' : 'unit',
+                       'uid'  : unit['uid']}) \
+                .update({'$set' : {'resource_sandbox' : unit['resource_sandbox'],
+                                   'pilot_sandbox'    : unit['pilot_sandbox'],
+                                   'unit_sandbox'     : unit['unit_sandbox']}})
+        bulk.execute()
+
+        self._ingest_units(unit_list)
+
+
 # ------------------------------------------------------------------------------
 
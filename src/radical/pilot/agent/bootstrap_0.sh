@@ -92,6 +92,7 @@ LOCK_TIMEOUT=600 # 10 min
 VIRTENV_TGZ_URL="https://pypi.python.org/packages/source/v/virtualenv/virtualenv-1.9.tar.gz"
 VIRTENV_TGZ="virtualenv-1.9.tar.gz"
 VIRTENV_IS_ACTIVATED=FALSE
+VIRTENV_LOCAL_BASE="/tmp"    # node-local location for unpacked virtenv packs
 VIRTENV_RADICAL_DEPS="pymongo==2.8 apache-libcloud colorama python-hostlist ntplib pyzmq netifaces==0.10.4 setproctitle orte_cffi msgpack-python future"
 
 
@@ -558,6 +559,8 @@ run_cmd()
 #   'create'  : use    if it exists, otherwise create, then use
 #   'use'     : use    if it exists, otherwise error,  then exit
 #   'recreate': delete if it exists, otherwise create, then use
+#   'pack'    : use the pack if it exists, otherwise create the virtenv and the
+#               pack, then unpack to node-local storage and use that copy
 #
 # create and update ops will be locked and thus protected against concurrent
 # bootstrap_0 invokations.
@@ -618,6 +621,18 @@ virtenv_setup()
         test -d "$virtenv/" && rm -r "$virtenv"
         ve_create=TRUE
         ve_update=FALSE
+
+    elif test "$virtenv_mode" = "pack"
+    then
+        if test "$python_dist" = "anaconda"
+        then
+            printf "\nERROR: virtenv mode 'pack' not supported for anaconda\n\n"
+            exit 1
+        fi
+        # the virtenv is only needed to create the pack
+        ve_create=FALSE
+        ve_update=FALSE
+        test -f "$virtenv.tgz.sha1" || ve_create=TRUE
     else
         ve_create=FALSE
         ve_update=FALSE
@@ -692,11 +707,12 @@ virtenv_setup()
             RP_INSTALL_SDIST='FALSE'
     esac
 
-    # NOTE: for any immutable virtenv (VIRTENV_MODE==use), we have to choose
-    #       a SANDBOX install target.  SANDBOX installation will only work with
-    #       'python setup.py install' (pip cannot handle it), so we have to use
-    #       the sdist, and the RP_INSTALL_SOURCES has to point to directories.
-    if test "$virtenv_mode" = "use"
+    # NOTE: for any immutable virtenv (VIRTENV_MODE==use|pack), we have to
+    #       choose a SANDBOX install target.  SANDBOX installation will only
+    #       work with 'python setup.py install' (pip cannot handle it), so we
+    #       have to use the sdist, and the RP_INSTALL_SOURCES has to point to
+    #       directories.
+    if test "$virtenv_mode" = "use" -o "$virtenv_mode" = "pack"
     then
         if test "$RP_INSTALL_TARGET" = "VIRTENV"
         then
@@ -754,6 +770,36 @@ virtenv_setup()
         echo "do not create virtenv $virtenv"
     fi
 
+    # in pack mode, we never use the virtenv itself, but only a node-local copy
+    # unpacked from the pack.  The pack is created once (under lock), and then
+    # reused by all pilots.  From here on, $VIRTENV points to the local copy.
+    if test "$virtenv_mode" = "pack"
+    then
+        if ! test -f "$virtenv.tgz.sha1"
+        then
+            echo 'rp lock for ve pack'
+            lock "$pid" "$virtenv" # use default timeout
+            virtenv_pack "$virtenv"
+            if ! test "$?" = 0
+            then
+               echo "Error on virtenv packing -- abort"
+               unlock "$pid" "$virtenv"
+               exit 1
+            fi
+            unlock "$pid" "$virtenv"
+        fi
+
+        virtenv_unpack "$virtenv"
+        if ! test "$?" = 0
+        then
+           echo "Error on virtenv unpacking -- abort"
+           exit 1
+        fi
+
+        virtenv="$VIRTENV_LOCAL"
+        VIRTENV="$VIRTENV_LOCAL"
+    fi
+
     # creation or not -- at this point it needs activation
     virtenv_activate "$virtenv" "$python_dist"
 
@@ -1073,6 +1119,116 @@ virtenv_create()
 }
 
 
+# ------------------------------------------------------------------------------
+#
+# pack a virtenv into a (checksummed) tarball next to it, so that it can be
+# unpacked on node-local storage by later pilots, w/o any pip invocation.  The
+# original location is recorded in the pack, so that the copy can be relocated
+# on unpacking.  The checksum file is created last, and marks the pack as
+# complete.
+#
+virtenv_pack()
+{
+    profile_event 've_pack_start'
+
+    virtenv="$1"
+    pack="$virtenv.tgz"
+    pack_dir=`dirname  "$pack"`
+    pack_name=`basename "$pack"`
+
+    if test -f "$pack.sha1"
+    then
+        echo "virtenv pack $pack exists"
+        profile_event 've_pack_stop'
+        return 0
+    fi
+
+    # the pack is created from a clean, non-activated virtenv
+    if test "$VIRTENV_IS_ACTIVATED" = "TRUE"
+    then
+        deactivate
+        PYTHONPATH="$VE_PYTHONPATH"
+        export PYTHONPATH
+        VIRTENV_IS_ACTIVATED=FALSE
+        rehash "$PYTHON"
+    fi
+
+    echo "$virtenv" > "$virtenv/.rp_ve_prefix"
+
+    run_cmd "pack virtenv" \
+            "tar zcf '$pack.tmp' -C '$virtenv' ." \
+         || return 1
+
+    mv -f "$pack.tmp" "$pack"
+    (cd "$pack_dir" && sha1sum "$pack_name") > "$pack.sha1.tmp" || return 1
+    mv -f "$pack.sha1.tmp" "$pack.sha1"
+
+    echo "virtenv pack: $pack (`cat $pack.sha1`)"
+
+    profile_event 've_pack_stop'
+}
+
+
+# ------------------------------------------------------------------------------
+#
+# unpack a virtenv pack to node-local storage, and relocate it there.  The
+# local copy is named after the pack checksum, so that concurrent pilots on the
+# same node share it, and so that a new pack results in a new copy.  Unpacking
+# happens into a private directory which is atomically moved into place -- no
+# locking is needed.
+#
+# The unpack script is also written to the pilot sandbox, so that the
+# sub-agents can create node-local copies via bootstrap_2.sh.  This function
+# sets $VIRTENV_LOCAL.
+#
+virtenv_unpack()
+{
+    profile_event 've_unpack_start'
+
+    virtenv="$1"
+    pack="$virtenv.tgz"
+
+    sha=`cut -f 1 -d ' ' "$pack.sha1"`
+    VIRTENV_LOCAL="$VIRTENV_LOCAL_BASE/rp_ve.$sha"
+
+    cat > ve_unpack.sh <<EOT
+#!/bin/sh
+
+pack="$pack"
+tgt="$VIRTENV_LOCAL"
+
+test -f "\$tgt/.rp_ve_ok" && exit 0
+
+# verify the pack before use
+(cd \`dirname "\$pack"\` && sha1sum -c --status "\$pack.sha1") || exit 1
+
+tmp="\$tgt.\`hostname\`.\$\$"
+rm -rf   "\$tmp"
+mkdir -p "\$tmp"                    || exit 1
+tar zxmf "\$pack" -C "\$tmp"        || exit 1
+
+# relocate: replace the original location in scripts and path files
+old=\`cat "\$tmp/.rp_ve_prefix"\`
+for f in \`grep -lI "\$old" "\$tmp"/bin/* "\$tmp"/lib*/python*/site-packages/*.pth 2>/dev/null\`
+do
+    sed -i -e "s|\$old|\$tgt|g" "\$f"
+done
+touch "\$tmp/.rp_ve_ok"
+
+# someone else may have won the race -- that is ok
+mv -T "\$tmp" "\$tgt" 2>/dev/null || rm -rf "\$tmp"
+test -f "\$tgt/.rp_ve_ok"
+EOT
+    chmod 0755 ve_unpack.sh
+
+    run_cmd "unpack virtenv to $VIRTENV_LOCAL" \
+            "./ve_unpack.sh" \
+         || return 1
+
+    profile_event 've_unpack_stop'
+}
+
+
 # ------------------------------------------------------------------------------
 #
 # update virtualenv - this assumes that the virtenv has been activated
@@ -1743,6 +1899,12 @@ cd $PILOT_SANDBOX
 export PATH="$PB1_PATH"
 export LD_LIBRARY_PATH="$PB1_LDLB"
 
+# create the node-local virtenv copy if needed (virtenv mode 'pack')
+if test "$VIRTENV_MODE" = "pack"
+then
+    ./ve_unpack.sh || exit 1
+fi
+
 # activate virtenv
 if test "$PYTHON_DIST" = "anaconda"
 then
@@ -118,7 +118,7 @@ class ABDS(AgentExecutingComponent):
 
             self._log.info("cancel_units command (%s)" % arg)
             with self._cancel_lock:
-                self._cus_to_cancel.extend(arg['uids'])
+                self._cus_to_cancel.extend(rpu.expand_uids(arg))
 
         return True
 
@@ -227,8 +227,10 @@ class ABDS(AgentExecutingComponent):
         #       class definition.
         sandbox = '%s/%s' % (self._pwd, cu['uid'])
 
-        # make sure the sandbox exists
-        rpu.rec_makedir(sandbox)
+        # make sure the sandbox exists (unless the agent staging component
+        # took care of that already)
+        if not self._cfg.get('provision_sandboxes'):
+            rpu.rec_makedir(sandbox)
 
         # prep stdout/err so that we can append w/o checking for None
         cu['stdout'] = ''
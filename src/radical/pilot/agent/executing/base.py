@@ -16,6 +16,11 @@ EXECUTING_NAME_POPEN = "POPEN"
 EXECUTING_NAME_SHELL = "SHELL"
 EXECUTING_NAME_ABDS  = "ABDS"
 EXECUTING_NAME_ORTE  = "ORTE"
+EXECUTING_NAME_EMULATE = "EMULATE"
+
+# unit sandbox modes
+UNIT_SANDBOX_SHARED  = "shared"   # units run in the (shared) pilot sandbox
+UNIT_SANDBOX_LOCAL   = "local"    # units run in node-local scratch space
 
 
 # ==============================================================================
@@ -40,6 +45,12 @@ class AgentExecutingComponent(rpu.Component):
         # if so configured, let the CU know what to use as tmp dir
         self._cu_tmp = cfg.get('cu_tmp', os.environ.get('TMP', '/tmp'))
 
+        # units either run in their sandbox below the pilot sandbox, or in
+        # node-local scratch space (and results are written back later)
+        self._sandbox_mode = cfg.get('unit_sandbox_mode', UNIT_SANDBOX_SHARED)
+        self._scratch_base = cfg.get('unit_scratch') \
+                          or os.environ.get('TMPDIR', '/tmp')
+
 
     # --------------------------------------------------------------------------
     #
@@ -49,6 +60,23 @@ class AgentExecutingComponent(rpu.Component):
     def create(cls, cfg, session):
 
         name = cfg['spawner']
+        mode = cfg.get('unit_sandbox_mode', UNIT_SANDBOX_SHARED)
+
+        if mode not in [UNIT_SANDBOX_SHARED, UNIT_SANDBOX_LOCAL]:
+            raise ValueError("unit sandbox mode '%s' unknown" % mode)
+
+        if mode == UNIT_SANDBOX_LOCAL and name != EXECUTING_NAME_POPEN:
+            raise ValueError("unit sandbox mode '%s' not supported by '%s'"
+                            % (mode, name))
+
+        # scratch space is created on the node of the executor, so units need
+        # to run on that node, too: either all units are forked locally, or
+        # the pilot has only one node.
+        if mode == UNIT_SANDBOX_LOCAL:
+            nodes = cfg.get('lrms_info', {}).get('node_list', [])
+            if len(nodes) != 1 and cfg.get('task_launch_method') != 'FORK':
+                raise ValueError("unit sandbox mode '%s' needs a single node "
+                                 "pilot or the FORK task launch method" % mode)
 
         # Make sure that we are the base-class!
         if cls != AgentExecutingComponent:
@@ -66,6 +94,9 @@ class AgentExecutingComponent(rpu.Component):
         elif name == EXECUTING_NAME_ORTE:
             from .orte import ORTE
             impl = ORTE(cfg, session)
+        elif name == EXECUTING_NAME_EMULATE:
+            from .emulate import Emulate
+            impl = Emulate(cfg, session)
         else:
             raise ValueError("AgentExecutingComponent '%s' unknown or defunct" % name)
 
@@ -0,0 +1,144 @@
+
+__copyright__ = "Copyright 2017, http://radical.rutgers.edu"
+__license__   = "MIT"
+
+
+import time
+import heapq
+import threading
+
+import radical.utils as ru
+
+from ...  import states    as rps
+from ...  import constants as rpc
+
+from .base import AgentExecutingComponent
+
+
+# ------------------------------------------------------------------------------
+#
+EMULATE_RUNTIME = 0.0   # default emulated unit runtime (seconds)
+EMULATE_TICK    = 0.01  # max delay for completing emulated units
+
+
+# ==============================================================================
+#
+class Emulate(AgentExecutingComponent):
+    """
+    The emulating executor does not execute units at all: units are kept in
+    `AGENT_EXECUTING` state for `emulate_runtime` seconds, and are then
+    completed successfully, in bulks of all units which completed at the same
+    time.  With a runtime of `0`, units are completed right away.  This is used
+    to measure the throughput of the agent pipeline independent of the cost of
+    unit execution (see `bin/radical-pilot-agent-bench`).
+    """
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, cfg, session):
+
+        AgentExecutingComponent.__init__ (self, cfg, session)
+
+        self._watcher   = None
+        self._terminate = threading.Event()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def initialize_child(self):
+
+        self.register_input(rps.AGENT_EXECUTING_PENDING,
+                            rpc.AGENT_EXECUTING_QUEUE, self.work)
+
+        self.register_output(rps.AGENT_STAGING_OUTPUT_PENDING,
+                             rpc.AGENT_STAGING_OUTPUT_QUEUE)
+
+        self.register_publisher (rpc.AGENT_UNSCHEDULE_PUBSUB)
+
+        self._runtime   = self._cfg.get('emulate_runtime', EMULATE_RUNTIME)
+        self._running   = list()             # heap of [t_done, uid, unit]
+        self._run_lock  = threading.Lock()
+
+        if self._runtime:
+            self._watcher = ru.Thread(target=self._watch, name="Watcher")
+            self._watcher.start()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def finalize_child(self):
+
+        self._terminate.set()
+
+        if self._watcher:
+            self._watcher.join()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def work(self, units):
+
+        if not isinstance(units, list):
+            units = [units]
+
+        self.advance(units, rps.AGENT_EXECUTING, publish=True, push=False)
+
+        now = time.time()
+        for unit in units:
+            self._prof.prof('exec_start', uid=unit['uid'], timestamp=now)
+
+        if not self._runtime:
+            self._complete(units)
+            return
+
+        with self._run_lock:
+            for unit in units:
+                heapq.heappush(self._running,
+                               [now + self._runtime, unit['uid'], unit])
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _watch(self):
+
+        try:
+            while not self._terminate.is_set():
+
+                done = list()
+                now  = time.time()
+                with self._run_lock:
+                    while self._running and self._running[0][0] <= now:
+                        done.append(heapq.heappop(self._running)[2])
+
+                if done:
+                    self._complete(done)
+                else:
+                    time.sleep(EMULATE_TICK)
+
+        except Exception as e:
+            self._log.exception("Error in emulator watch loop (%s)" % e)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _complete(self, units):
+
+        now = time.time()
+        for unit in units:
+
+            self._prof.prof('exec_stop', uid=unit['uid'], timestamp=now)
+
+            unit['stdout']       = ''
+            unit['stderr']       = ''
+            unit['exit_code']    = 0
+            unit['target_state'] = rps.DONE
+
+            # Free the Slots, Flee the Flots, Ree the Frots!
+            self.publish(rpc.AGENT_UNSCHEDULE_PUBSUB, unit)
+
+        self.advance(units, rps.AGENT_STAGING_OUTPUT_PENDING,
+                     publish=True, push=True)
+
+
+# ------------------------------------------------------------------------------
+
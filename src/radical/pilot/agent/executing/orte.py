@@ -116,7 +116,7 @@ class ORTE(AgentExecutingComponent):
 
             self._log.info("cancel_units command (%s)" % arg)
             with self._cancel_lock:
-                self._cus_to_cancel.extend(arg['uids'])
+                self._cus_to_cancel.extend(rp.utils.expand_uids(arg))
 
         return True
 
@@ -8,6 +8,7 @@ import copy
 import stat
 import time
 import Queue
+import shutil
 import signal
 import tempfile
 import threading
@@ -22,11 +23,39 @@ from ...  import states    as rps
 from ...  import constants as rpc
 
 from .base import AgentExecutingComponent
+from .base import UNIT_SANDBOX_LOCAL
+
+
+# ------------------------------------------------------------------------------
+#
+WRITEBACK_BULKSIZE = 1024   # max number of units to write back in one go
+WRITEBACK_TIMEOUT  = 0.1    # wait time for units to write back
 
 
 # ==============================================================================
 #
 class Popen(AgentExecutingComponent) :
+    """
+    The Popen executor spawns units via `subprocess.Popen`, and watches them in
+    a separate thread.
+
+    If `unit_sandbox_mode` is set to `local`, units are not executed in their
+    sandbox below the pilot sandbox, but in a scratch directory (below
+    `unit_scratch`, which defaults to `$TMPDIR` or `/tmp`).  The launch script,
+    stdout, stderr and the unit profile are then created in that scratch
+    directory, which avoids metadata operations on the shared file system on
+    the critical path of unit execution.  Input files staged to the unit
+    sandbox are symlinked into the scratch directory.  When a unit completes,
+    its slots are released immediately, and the unit is handed to a write-back
+    thread which copies the scratch directory content (except those symlinks)
+    to the unit sandbox, in bulks of all units completed on this node, before
+    passing the units on to output staging.  Note that the scratch directory
+    needs to be accessible to the units -- this is the case for node-local
+    scratch if the units run on the node of this component.  The local mode is
+    thus limited to single node pilots and to the FORK task launch method (see
+    `AgentExecutingComponent.create()`).  On multi-node pilots, MPI units are
+    always run in their shared sandbox.
+    """
 
     # --------------------------------------------------------------------------
     #
@@ -35,6 +64,7 @@ class Popen(AgentExecutingComponent) :
         AgentExecutingComponent.__init__ (self, cfg, session)
 
         self._watcher   = None
+        self._writer    = None
         self._terminate = threading.Event()
 
 
@@ -51,10 +81,10 @@ class Popen(AgentExecutingComponent) :
                              rpc.AGENT_STAGING_OUTPUT_QUEUE)
 
         self.register_publisher (rpc.AGENT_UNSCHEDULE_PUBSUB)
-        self.register_subscriber(rpc.CONTROL_PUBSUB, self.command_cb)
 
-        self._cancel_lock    = threading.RLock()
-        self._cus_to_cancel  = list()
+        # cancellation requests are collected by the component base class
+        # (`self._cancel_idx`), and are checked on each sweep over the running
+        # units
         self._cus_to_watch   = list()
         self._watch_queue    = Queue.Queue ()
 
@@ -64,6 +94,20 @@ class Popen(AgentExecutingComponent) :
         self._watcher = ru.Thread(target=self._watch, name="Watcher")
         self._watcher.start()
 
+        # run write-back thread if units are run in scratch space
+        self._scratch = None
+        self._single  = len(self._cfg.get('lrms_info', {})
+                                     .get('node_list', [])) == 1
+        if self._sandbox_mode == UNIT_SANDBOX_LOCAL:
+            self._scratch = '%s/rp.%s.%s' % (self._scratch_base,
+                                             self._cfg['session_id'], self.uid)
+            rpu.rec_makedir(self._scratch)
+            self._log.info('run units in scratch space %s', self._scratch)
+
+            self._writeback_queue = Queue.Queue()
+            self._writer = ru.Thread(target=self._write_back, name="Writer")
+            self._writer.start()
+
         # The AgentExecutingComponent needs the LaunchMethods to construct
         # commands.
         self._task_launcher = rp.agent.LM.create(
@@ -95,24 +139,6 @@ class Popen(AgentExecutingComponent) :
                             self._env_cu_export[key] = val
 
 
-    # --------------------------------------------------------------------------
-    #
-    def command_cb(self, topic, msg):
-
-        self._log.info('command_cb [%s]: %s', topic, msg)
-
-        cmd = msg['cmd']
-        arg = msg['arg']
-
-        if cmd == 'cancel_units':
-
-            self._log.info("cancel_units command (%s)" % arg)
-            with self._cancel_lock:
-                self._cus_to_cancel.extend(arg['uids'])
-
-        return True
-
-
     # --------------------------------------------------------------------------
     #
     def _populate_cu_environment(self):
@@ -228,11 +254,27 @@ class Popen(AgentExecutingComponent) :
         descr   = cu['description']
         sandbox = '%s/%s' % (self._pwd, cu['uid'])
 
-        # make sure the sandbox exists
-        self._prof.prof('exec_mkdir', uid=cu['uid'])
-        rpu.rec_makedir(sandbox)
-        self._prof.prof('exec_mkdir_done', uid=cu['uid'])
-        launch_script_name = '%s/%s.sh' % (sandbox, cu['uid'])
+        # only units which run on this node can use (node-local) scratch space
+        if self._scratch and (self._single or launcher is self._task_launcher):
+            # run the unit in scratch space, with access to staged input files
+            workdir = '%s/%s' % (self._scratch, cu['uid'])
+            self._prof.prof('exec_mkdir', uid=cu['uid'])
+            rpu.rec_makedir(workdir)
+            if descr.get('input_staging'):
+                self._link_inputs(sandbox, workdir)
+            self._prof.prof('exec_mkdir_done', uid=cu['uid'])
+            cu['scratch'] = workdir
+
+        else:
+            # make sure the sandbox exists (unless the agent staging component
+            # took care of that already)
+            workdir = sandbox
+            if not self._cfg.get('provision_sandboxes'):
+                self._prof.prof('exec_mkdir', uid=cu['uid'])
+                rpu.rec_makedir(sandbox)
+                self._prof.prof('exec_mkdir_done', uid=cu['uid'])
+
+        launch_script_name = '%s/%s.sh' % (workdir, cu['uid'])
 
         self._log.debug("Created launch_script: %s", launch_script_name)
 
@@ -253,7 +295,7 @@ class Popen(AgentExecutingComponent) :
             env_string += 'export RP_GTOD="%s"\n'         % self.gtod
             env_string += 'export RP_TMP="%s"\n'          % self._cu_tmp
             if 'RADICAL_PILOT_PROFILE' in os.environ:
-                env_string += 'export RP_PROF="%s/%s.prof"\n' % (sandbox, cu['uid'])
+                env_string += 'export RP_PROF="%s/%s.prof"\n' % (workdir, cu['uid'])
             else:
                 env_string += 'unset  RP_PROF\n'
 
@@ -286,7 +328,7 @@ prof(){
 
             launch_script.write('\n# Environment variables\n%s\n' % env_string)
             launch_script.write('prof cu_start\n')
-            launch_script.write('\n# Change to unit sandbox\ncd %s\n' % sandbox)
+            launch_script.write('\n# Change to unit sandbox\ncd %s\n' % workdir)
             launch_script.write('prof cu_cd_done\n')
 
             # Before the Big Bang there was nothing
@@ -346,13 +388,13 @@ prof(){
         stdout_file = descr.get('stdout') or 'STDOUT'
         stderr_file = descr.get('stderr') or 'STDERR'
 
-        cu['stdout_file'] = os.path.join(sandbox, stdout_file)
-        cu['stderr_file'] = os.path.join(sandbox, stderr_file)
+        cu['stdout_file'] = os.path.join(workdir, stdout_file)
+        cu['stderr_file'] = os.path.join(workdir, stderr_file)
 
         _stdout_file_h = open(cu['stdout_file'], "w")
         _stderr_file_h = open(cu['stderr_file'], "w")
 
-        self._log.info("Launching unit %s via %s in %s", cu['uid'], cmdline, sandbox)
+        self._log.info("Launching unit %s via %s in %s", cu['uid'], cmdline, workdir)
 
         self._prof.prof('exec_start', uid=cu['uid'])
         cu['proc'] = subprocess.Popen(args       = cmdline,
@@ -363,12 +405,25 @@ prof(){
                                       preexec_fn = os.setsid,
                                       close_fds  = True,
                                       shell      = True,
-                                      cwd        = sandbox)
+                                      cwd        = workdir)
         self._prof.prof('exec_ok', uid=cu['uid'])
 
         self._watch_queue.put(cu)
 
 
+    # --------------------------------------------------------------------------
+    #
+    def _link_inputs(self, sandbox, workdir):
+
+        # staged input files live in the unit sandbox -- make them available in
+        # the scratch directory
+        if not os.path.isdir(sandbox):
+            return
+
+        for name in os.listdir(sandbox):
+            os.symlink('%s/%s' % (sandbox, name), '%s/%s' % (workdir, name))
+
+
     # --------------------------------------------------------------------------
     #
     def _watch(self):
@@ -413,7 +468,8 @@ prof(){
     # next step.  Also check for a requested cancellation for the tasks.
     def _check_running(self):
 
-        action = 0
+        action    = 0
+        to_cancel = list()
         for cu in self._cus_to_watch:
 
             # poll subprocess object
@@ -421,39 +477,10 @@ prof(){
             uid       = cu['uid']
 
             if exit_code is None:
-                # Process is still running
-
-                if cu['uid'] in self._cus_to_cancel:
-
-                    # FIXME: there is a race condition between the state poll
-                    # above and the kill command below.  We probably should pull
-                    # state after kill again?
-
-                    self._prof.prof('exec_cancel_start', uid=uid)
-
-                    # We got a request to cancel this cu - send SIGTERM to the
-                    # process group (which should include the actual launch
-                    # method)
-                  # cu['proc'].kill()
-                    action += 1
-                    try:
-                        os.killpg(cu['proc'].pid, signal.SIGTERM)
-                    except OSError:
-                        # unit is already gone, we ignore this
-                        pass
-                    cu['proc'].wait()  # make sure proc is collected
-
-                    with self._cancel_lock:
-                        self._cus_to_cancel.remove(uid)
-
-                    self._prof.prof('exec_cancel_stop', uid=uid)
-
-                    del(cu['proc'])  # proc is not json serializable
-                    self.publish(rpc.AGENT_UNSCHEDULE_PUBSUB, cu)
-                    self.advance(cu, rps.CANCELED, publish=True, push=False)
-
-                    # we don't need to watch canceled CUs
-                    self._cus_to_watch.remove(cu)
+                # Process is still running -- cancel it if that was requested
+                # (the index lookup is cheap, and empty most of the time)
+                if self._cancel_idx and self._cancel_idx.pop(uid):
+                    to_cancel.append(cu)
 
             else:
 
@@ -483,10 +510,137 @@ prof(){
                     # directives -- at the very least, we'll upload stdout/stderr
                     cu['target_state'] = rps.DONE
 
-                self.advance(cu, rps.AGENT_STAGING_OUTPUT_PENDING, publish=True, push=True)
+                if cu.get('scratch'):
+                    # results need to be written back before output staging
+                    self._writeback_queue.put(cu)
+                else:
+                    self.advance(cu, rps.AGENT_STAGING_OUTPUT_PENDING,
+                                 publish=True, push=True)
+
+        if to_cancel:
+            action += len(to_cancel)
+            self._cancel_running(to_cancel)
 
         return action
 
 
-# ------------------------------------------------------------------------------
+    # --------------------------------------------------------------------------
+    #
+    def _cancel_running(self, cus):
+
+        # FIXME: there is a race condition between the state poll and the kill
+        #        command below.  We probably should pull state after kill again?
+
+        # Send SIGTERM to all process groups (which should include the actual
+        # launch methods) before collecting any process, so that the units
+        # terminate concurrently.
+        for cu in cus:
+            self._prof.prof('exec_cancel_start', uid=cu['uid'])
+            try:
+                os.killpg(cu['proc'].pid, signal.SIGTERM)
+            except OSError:
+                # unit is already gone, we ignore this
+                pass
+
+        for cu in cus:
+
+            cu['proc'].wait()  # make sure proc is collected
+            self._prof.prof('exec_cancel_stop', uid=cu['uid'])
+
+            del(cu['proc'])  # proc is not json serializable
+            self.publish(rpc.AGENT_UNSCHEDULE_PUBSUB, cu)
+
+            if cu.get('scratch'):
+                shutil.rmtree(cu['scratch'], ignore_errors=True)
+
+        # we don't need to watch canceled CUs
+        canceled = set([cu['uid'] for cu in cus])
+        self._cus_to_watch = [cu for cu in self._cus_to_watch
+                                 if  cu['uid'] not in canceled]
+
+        self.advance(cus, rps.CANCELED, publish=True, push=False)
+
 
+    # --------------------------------------------------------------------------
+    #
+    def _write_back(self):
+
+        try:
+            while not self._terminate.is_set():
+
+                try:
+                    cus = [self._writeback_queue.get(timeout=WRITEBACK_TIMEOUT)]
+                except Queue.Empty:
+                    continue
+
+                # collect all other units completed by now, so that they are
+                # written back (and advanced) as a bulk
+                try:
+                    while len(cus) < WRITEBACK_BULKSIZE:
+                        cus.append(self._writeback_queue.get_nowait())
+                except Queue.Empty:
+                    pass
+
+                self._log.debug('write back %d units', len(cus))
+
+                for cu in cus:
+                    self._write_back_unit(cu)
+
+                self.advance(cus, rps.AGENT_STAGING_OUTPUT_PENDING,
+                             publish=True, push=True)
+
+        except Exception as e:
+            self._log.exception("Error in ExecWorker write-back loop (%s)" % e)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _write_back_unit(self, cu):
+
+        uid     = cu['uid']
+        workdir = cu.pop('scratch')
+        sandbox = '%s/%s' % (self._pwd, uid)
+
+        self._prof.prof('exec_writeback_start', uid=uid)
+
+        try:
+            rpu.rec_makedir(sandbox)
+            self._copy_back(workdir, sandbox)
+
+            cu['stdout_file'] = cu['stdout_file'].replace(workdir, sandbox, 1)
+            cu['stderr_file'] = cu['stderr_file'].replace(workdir, sandbox, 1)
+
+        except Exception as e:
+            self._log.exception('write-back failed for %s', uid)
+            cu['stderr'] += '\nPilot cannot write back unit sandbox:\n%s\n' % e
+            cu['target_state'] = rps.FAILED
+
+        shutil.rmtree(workdir, ignore_errors=True)
+
+        self._prof.prof('exec_writeback_stop', uid=uid)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _copy_back(self, src, tgt):
+
+        # symlinks point to staged input files, and are skipped.  Existing
+        # files in the unit sandbox are overwritten.
+        for name in os.listdir(src):
+
+            src_path = '%s/%s' % (src, name)
+            tgt_path = '%s/%s' % (tgt, name)
+
+            if os.path.islink(src_path):
+                continue
+
+            if os.path.isdir(src_path):
+                if not os.path.isdir(tgt_path):
+                    os.mkdir(tgt_path)
+                self._copy_back(src_path, tgt_path)
+
+            else:
+                shutil.copy2(src_path, tgt_path)
+
+
+# ------------------------------------------------------------------------------
@@ -168,7 +168,7 @@ class Shell(AgentExecutingComponent):
 
             self._log.info("cancel_units command (%s)" % arg)
             with self._cancel_lock:
-                self._cus_to_cancel.append(arg['uids'])
+                self._cus_to_cancel.extend(rpu.expand_uids(arg))
 
         return True
 
@@ -291,6 +291,10 @@ class AgentSchedulingComponent(rpu.Component):
         self._log.debug("slot status after  init      : %s", 
                         self.slot_status())
 
+        if self._metrics:
+            self._metrics.gauge('wait_pool',  lambda: len(self._wait_pool))
+            self._metrics.gauge('busy_cores', self._get_busy_cores)
+
 
     # --------------------------------------------------------------------------
     #
@@ -392,6 +396,27 @@ class AgentSchedulingComponent(rpu.Component):
         return ret
 
 
+    # --------------------------------------------------------------------------
+    #
+    # NOTE: any scheduler implementation which uses a different nodelist
+    #       structure MUST overload this method.
+    def _get_busy_cores(self):
+        '''
+        Returns the fraction of busy cores (for metrics)
+        '''
+
+        total = 0
+        busy  = 0
+        for node in self.nodes:
+            total += len(node['cores'])
+            busy  += len([core for core in node['cores'] if core != rpc.FREE])
+
+        if not total:
+            return 0.0
+
+        return float(busy) / total
+
+
     # --------------------------------------------------------------------------
     #
     def _configure(self):
@@ -585,6 +610,14 @@ class AgentSchedulingComponent(rpu.Component):
             self._log.debug("before schedule   %s: %s", unit['uid'],
                             self.slot_status())
 
+        # units which got canceled while waiting for resources are dropped
+        if self._cancel_idx and self._wait_pool:
+            with self._wait_lock:
+                self._wait_pool, canceled = \
+                                       self._cancel_idx.filter(self._wait_pool)
+            if canceled:
+                self.advance(canceled, rps.CANCELED, publish=True, push=False)
+
         # cycle through wait queue, and see if we get anything placed now.  We
         # cycle over a copy of the list, so that we can modify the list on the
         # fly,without locking the whole loop.  However, this is costly, too.
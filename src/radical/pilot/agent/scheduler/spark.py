@@ -60,6 +60,20 @@ class Spark(AgentSchedulingComponent):
          return 'n/a'
 
 
+    # --------------------------------------------------------------------------
+    #
+    def _get_busy_cores(self):
+        '''
+        Returns the fraction of busy cores (for metrics), as far as known to
+        this scheduler
+        '''
+
+        if not self._mnum_of_cores:
+            return 0.0
+
+        return 1.0 - float(self.avail_cores) / self._mnum_of_cores
+
+
     # --------------------------------------------------------------------------
     #
     def _release_slot(self, opaque_slot):
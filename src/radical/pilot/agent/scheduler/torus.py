@@ -71,6 +71,24 @@ class Torus(AgentSchedulingComponent):
                 'slotstate': slot_matrix}
 
 
+    # --------------------------------------------------------------------------
+    #
+    def _get_busy_cores(self):
+        '''
+        Returns the fraction of busy cores (for metrics).  We only allocate
+        full nodes, so this is the fraction of busy nodes in the torus block.
+        '''
+
+        block = self._lrms.torus_block
+        if not block:
+            return 0.0
+
+        busy = len([node for node in block
+                         if node[self.TORUS_BLOCK_STATUS] != rpc.FREE])
+
+        return float(busy) / len(block)
+
+
     # --------------------------------------------------------------------------
     #
     # Allocate a number of cores
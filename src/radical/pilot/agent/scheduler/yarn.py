@@ -107,6 +107,20 @@ class Yarn(AgentSchedulingComponent):
                 (self.avail_app, self.avail_cores, self.avail_mem)
 
 
+    # --------------------------------------------------------------------------
+    #
+    def _get_busy_cores(self):
+        '''
+        Returns the fraction of busy cores (for metrics), as far as known to
+        this scheduler
+        '''
+
+        if not self._mnum_of_cores:
+            return 0.0
+
+        return 1.0 - float(self.avail_cores) / self._mnum_of_cores
+
+
     # --------------------------------------------------------------------------
     #
     def _release_slot(self, opaque_slot):
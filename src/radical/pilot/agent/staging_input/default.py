@@ -4,9 +4,11 @@ __license__   = "MIT"
 
 
 import os
+import Queue
 import errno
 import shutil
 import tarfile
+import threading
 
 import saga          as rs
 import radical.utils as ru
@@ -18,7 +20,18 @@ from ...  import constants as rpc
 
 from .base import AgentStagingInputComponent
 
-from ...staging_directives import complete_url
+from ...staging_directives import complete_url, get_local_context
+from ...staging_directives import get_cache_path, get_cache_dir
+
+
+# ------------------------------------------------------------------------------
+# default settings for the staging engine, can be overwritten in the agent cfg
+DEFAULT_STAGING_WORKERS  = 8     # number of concurrent staging workers
+DEFAULT_STAGING_FS_LIMIT = 4     # concurrent staging ops per file system
+DEFAULT_STAGING_CACHE    = True  # cache copied files, link to unit sandboxes
+STAGING_COLLECT_TIMER    = 0.1   # interval for collecting completed units
+SANDBOX_CHUNK_SIZE       = 64    # sandboxes to create per worker task
+STAGING_CACHE_SIZE       = 10000 # cache entries to keep track of in memory
 
 
 # ==============================================================================
@@ -30,6 +43,26 @@ class Default(AgentStagingInputComponent):
     AGENT_STAGING_INPUT_PENDING state, will advance them to AGENT_STAGING_INPUT
     state while performing the staging, and then moves then to the
     AGENT_SCHEDULING_PENDING state, into the agent_scheduling_queue.
+
+    Units are staged concurrently by a pool of worker threads.  The staging
+    directives of a single unit are still enacted in order, but units are
+    advanced as soon as their staging completes, independent of the order in
+    which they arrived.  The number of concurrent staging operations per file
+    system is limited, to avoid thrashing shared file systems.
+
+    Files which are staged via `COPY` are cached in the pilot's staging area
+    (`<pilot_sandbox>/staging_area/staging_cache/`, which is what the
+    `pilot:///staging_cache/` URLs of the umgr expand to), keyed by source
+    path, size and mtime.  Each
+    source is thus only copied once per pilot, and is then hard linked into the
+    unit sandboxes.  The umgr input stager populates the same cache for
+    `TRANSFER` directives (see `staging_directives.get_cache_path()`).
+
+    If `provision_sandboxes` is set in the agent config, this component also
+    creates the sandboxes of *all* incoming units, ahead of scheduling.  Units
+    without staging directives are handled in chunks by the same worker pool.
+    The executing components then don't need to create sandboxes on the
+    critical path of unit execution.
     """
 
     # --------------------------------------------------------------------------
@@ -45,12 +78,55 @@ class Default(AgentStagingInputComponent):
 
         self._pwd = os.getcwd()
 
+        self._n_workers  = self._cfg.get('staging_input_workers',
+                                          DEFAULT_STAGING_WORKERS)
+        self._fs_limit   = self._cfg.get('staging_input_fs_limit',
+                                          DEFAULT_STAGING_FS_LIMIT)
+        self._provision  = self._cfg.get('provision_sandboxes', False)
+
+        self._cache_dir  = None
+        self._cache      = dict()             # cache path : threading.Event
+        self._cache_lock = threading.Lock()   # protect self._cache
+
+        if self._cfg.get('staging_cache', DEFAULT_STAGING_CACHE):
+            # use the same location as `complete_url()` for `pilot://` URLs
+            pilot_sandbox      = ru.Url(self._cfg['pilot_sandbox']).path
+            self._cache_dir    = get_cache_dir(pilot_sandbox)
+            self._staging_area = os.path.dirname(self._cache_dir)
+
+        self._fs         = rpu.FSLimiter(self._fs_limit)  # ops per fs
+        self._todo       = Queue.Queue()      # units to stage
+        self._done       = Queue.Queue()      # staged units (or failures)
+
+        self._stagers    = list()
+        for i in range(self._n_workers):
+            worker = threading.Thread(target=self._stage_worker,
+                                      name='%s.stager.%d' % (self.uid, i))
+            worker.daemon = True
+            worker.start()
+            self._stagers.append(worker)
+
         self.register_input(rps.AGENT_STAGING_INPUT_PENDING,
                             rpc.AGENT_STAGING_INPUT_QUEUE, self.work)
 
         self.register_output(rps.AGENT_SCHEDULING_PENDING, 
                              rpc.AGENT_SCHEDULING_QUEUE)
 
+        # completed units are advanced from the component thread
+        self.register_timed_cb(self._collect_cb, timer=STAGING_COLLECT_TIMER)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def finalize_child(self):
+
+        # terminate the staging workers
+        for worker in self._stagers:
+            self._todo.put(None)
+
+        for worker in self._stagers:
+            worker.join()
+
 
     # --------------------------------------------------------------------------
     #
@@ -87,11 +163,177 @@ class Default(AgentStagingInputComponent):
 
 
         if no_staging_units:
-            self.advance(no_staging_units, rps.AGENT_SCHEDULING_PENDING,
-                         publish=True, push=True)
+
+            if self._provision:
+                # we still need to create the sandboxes -- do so in chunks
+                for i in range(0, len(no_staging_units), SANDBOX_CHUNK_SIZE):
+                    chunk = no_staging_units[i:i + SANDBOX_CHUNK_SIZE]
+                    self._todo.put(['mkdir', chunk])
+            else:
+                self.advance(no_staging_units, rps.AGENT_SCHEDULING_PENDING,
+                             publish=True, push=True)
 
         for unit,actionables in staging_units:
-            self._handle_unit(unit, actionables)
+            self._todo.put(['stage', [unit, actionables]])
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _collect_cb(self):
+
+        staged = list()
+        failed = list()
+
+        while True:
+            try:
+                unit, error = self._done.get_nowait()
+            except Queue.Empty:
+                break
+
+            if error: failed.append(unit)
+            else    : staged.append(unit)
+
+        if failed:
+            self.advance(failed, rps.FAILED, publish=True, push=False)
+
+        # all staging is done -- pass on to the scheduler
+        if staged:
+            self.advance(staged, rps.AGENT_SCHEDULING_PENDING,
+                         publish=True, push=True)
+
+        return True
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _stage_worker(self):
+
+        while True:
+
+            task = self._todo.get()
+            if task is None:
+                break
+
+            kind, payload = task
+
+            if kind == 'mkdir':
+                with self._fs.occupy(self._pwd):
+                    for unit in payload:
+                        try:
+                            self._make_sandbox(unit)
+                            self._done.put([unit, None])
+                        except Exception as e:
+                            self._log.exception('mkdir failed for %s',
+                                                unit['uid'])
+                            self._done.put([unit, str(e)])
+                continue
+
+            unit, actionables = payload
+
+            try:
+                if self._provision:
+                    with self._fs.occupy(self._pwd):
+                        self._make_sandbox(unit)
+                self._handle_unit(unit, actionables)
+                self._done.put([unit, None])
+
+            except Exception as e:
+                self._log.exception('staging failed for %s', unit['uid'])
+                self._done.put([unit, str(e)])
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _make_sandbox(self, unit):
+
+        # NOTE: this needs to be consistent with the sandbox location used by
+        #       the executing components
+        uid = unit['uid']
+        self._prof.prof('sandbox_mkdir', uid=uid)
+        rpu.rec_makedir('%s/%s' % (self._pwd, uid))
+        self._prof.prof('sandbox_mkdir_done', uid=uid)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _copy(self, src, tgt):
+        """
+        Copy `src` to `tgt`.  If the staging cache is enabled and `src` is
+        a file, we copy it into the cache (unless it is already cached), and
+        hard link the cached copy to `tgt`.  We fall back to a plain copy if
+        that is not possible.  We return `True` on a cache hit, `False` on
+        a cache miss, and `None` if the cache was not used.
+        """
+
+        if not self._cache_dir or not os.path.isfile(src):
+            self._plain_copy(src, tgt)
+            return None
+
+        if os.path.normpath(src).startswith('%s/' % self._cache_dir):
+            # already cached by the umgr
+            cached = src
+            entry  = None
+            hit    = True
+
+        else:
+            st     = os.stat(src)
+            cached = '%s/%s' % (self._staging_area,
+                                get_cache_path(src, st.st_size, st.st_mtime))
+            with self._cache_lock:
+                if cached in self._cache:
+                    entry = self._cache[cached]
+                    hit   = True
+                else:
+                    if len(self._cache) > STAGING_CACHE_SIZE:
+                        # forget completed entries -- those are found on disk
+                        for key in self._cache.keys():
+                            if self._cache[key].is_set():
+                                del(self._cache[key])
+                    entry = threading.Event()
+                    hit   = False
+                    self._cache[cached] = entry
+
+        if hit:
+            # don't occupy any file system slots while waiting for the copy
+            if entry:
+                entry.wait()
+
+        else:
+            # populate the cache.  Other stagers (of other agents) may use the
+            # same cache, so we copy to a private name and move into place.
+            try:
+                if not os.path.exists(cached):
+                    with self._fs.occupy(src, cached):
+                        tmp = '%s.%s.tmp' % (cached, threading.current_thread().name)
+                        rpu.rec_makedir(os.path.dirname(cached))
+                        shutil.copy2(src, tmp)
+                        os.rename(tmp, cached)
+            finally:
+                entry.set()
+
+        with self._fs.occupy(cached, tgt):
+            try:
+                os.link(cached, tgt)
+                return hit
+            except OSError as e:
+                self._log.debug('link %s failed (%s) - copy', tgt, e)
+
+        self._plain_copy(src, tgt)
+        return None
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _plain_copy(self, src, tgt):
+
+        with self._fs.occupy(src, tgt):
+            try:
+                shutil.copytree(src, tgt)
+            except OSError as exc: 
+                if exc.errno == errno.ENOTDIR:
+                    shutil.copy(src, tgt)
+                else: 
+                    raise
 
 
     # --------------------------------------------------------------------------
@@ -106,38 +348,9 @@ class Default(AgentStagingInputComponent):
         #       class definition.
         sandbox = unit['unit_sandbox']
 
-        # By definition, this compoentn lives on the pilot's target resource.
-        # As such, we *know* that all staging ops which would refer to the
-        # resource now refer to file://localhost, and thus translate the unit,
-        # pilot and resource sandboxes into that scope.  Some assumptions are
-        # made though:
-        #
-        #   * paths are directly translatable across schemas
-        #   * resource level storage is in fact accessible via file://
-        #
-        # FIXME: this is costly and should be cached.
-
-        unit_sandbox     = ru.Url(unit['unit_sandbox'])
-        pilot_sandbox    = ru.Url(unit['pilot_sandbox'])
-        resource_sandbox = ru.Url(unit['resource_sandbox'])
-
-        unit_sandbox.schema     = 'file'
-        pilot_sandbox.schema    = 'file'
-        resource_sandbox.schema = 'file'
-
-        unit_sandbox.host       = 'localhost'
-        pilot_sandbox.host      = 'localhost'
-        resource_sandbox.host   = 'localhost'
-
-        src_context = {'pwd'      : str(unit_sandbox),       # !!!
-                       'unit'     : str(unit_sandbox), 
-                       'pilot'    : str(pilot_sandbox), 
-                       'resource' : str(resource_sandbox)}
-        tgt_context = {'pwd'      : str(unit_sandbox),       # !!!
-                       'unit'     : str(unit_sandbox), 
-                       'pilot'    : str(pilot_sandbox), 
-                       'resource' : str(resource_sandbox)}
-
+        # all staging ops refer to file://localhost (see `get_local_context()`)
+        src_context = get_local_context(unit)
+        tgt_context = src_context
 
         # we can now handle the actionable staging directives
         for sd in actionables:
@@ -195,14 +408,12 @@ class Default(AgentStagingInputComponent):
                     rpu.rec_makedir(tgtdir)
 
             if action == rpc.COPY: 
-                try:
-                    shutil.copytree(src.path, tgt.path)
-                except OSError as exc: 
-                    if exc.errno == errno.ENOTDIR:
-                        shutil.copy(src.path, tgt.path)
-                    else: 
-                        raise
-                        
+                hit = self._copy(src.path, tgt.path)
+                if   hit is True : self._prof.prof('staging_in_cache_hit',
+                                                   uid=uid, msg=did)
+                elif hit is False: self._prof.prof('staging_in_cache_miss',
+                                                   uid=uid, msg=did)
+
             elif action == rpc.LINK:
 
                 # Fix issue/1513 if link source is file and target is folder.
@@ -255,9 +466,6 @@ class Default(AgentStagingInputComponent):
 
             self._prof.prof('staging_in_stop', uid=uid, msg=did)
 
-        # all staging is done -- pass on to the scheduler
-        self.advance(unit, rps.AGENT_SCHEDULING_PENDING, publish=True, push=True)
-
 
 # ------------------------------------------------------------------------------
 
@@ -4,8 +4,10 @@ __license__   = "MIT"
 
 
 import os
+import Queue
 import errno
 import shutil
+import threading
 
 import saga          as rs
 import radical.utils as ru
@@ -17,10 +19,26 @@ from ...  import constants as rpc
 
 from .base import AgentStagingOutputComponent
 
-from ...staging_directives import complete_url
+from ...staging_directives import complete_url, get_local_context
+from ...staging_directives import expand_staging_directives
 
 
 # ------------------------------------------------------------------------------
+# stdio capture modes
+STDIO_CAPTURE_OFF  = 'off'    # don't capture unit stdout/stderr
+STDIO_CAPTURE_TAIL = 'tail'   # capture the tail of stdout/stderr
+STDIO_CAPTURE_FULL = 'full'   # capture the tail, and transfer the full files
+                              # to the client sandbox (`<uid>.<name>`)
+
+# default settings, can be overwritten in the agent cfg
+DEFAULT_STDIO_CAPTURE    = STDIO_CAPTURE_TAIL
+DEFAULT_STAGING_WORKERS  = 8   # number of concurrent staging workers
+DEFAULT_STAGING_FS_LIMIT = 4   # concurrent staging ops per file system
+STDIO_CHUNK_SIZE         = 32  # number of units per stdio capture task
+STAGING_COLLECT_TIMER    = 0.1 # interval for collecting completed units
+
+
+# ==============================================================================
 #
 class Default(AgentStagingOutputComponent):
     """
@@ -32,7 +50,19 @@ class Default(AgentStagingOutputComponent):
     state change to be published to MongoDB (no push into a queue).
 
     Note that this component also collects stdout/stderr of the units (which
-    can also be considered staging, really).
+    can also be considered staging, really).  That capture is configured via
+    `stdio_capture` in the agent config: it can be switched `off`, or can
+    collect the `tail` of the output (the last `max_io_loglength` characters,
+    which is the default), or can in addition transfer the `full` stdout and
+    stderr files to the client sandbox.  Only the tail end of the files is
+    ever read.
+
+    Stdio capture and staging are performed concurrently by a pool of worker
+    threads.  Units which need staging are handled individually, all other
+    units in chunks.  Units are advanced in bulks, in the order in which they
+    complete.  The number of concurrent staging operations per file system is
+    limited, and files are hard linked instead of copied (and renamed instead
+    of moved) if source and target share a file system.
     """
 
     # --------------------------------------------------------------------------
@@ -48,12 +78,59 @@ class Default(AgentStagingOutputComponent):
 
         self._pwd = os.getcwd()
 
+        self._capture   = self._cfg.get('stdio_capture', DEFAULT_STDIO_CAPTURE)
+        self._max_io    = self._cfg.get('max_io_loglength',
+                                         rpu.MAX_IO_LOGLENGTH)
+        self._n_workers = self._cfg.get('staging_output_workers',
+                                         DEFAULT_STAGING_WORKERS)
+        self._fs_limit  = self._cfg.get('staging_output_fs_limit',
+                                         DEFAULT_STAGING_FS_LIMIT)
+
+        if self._capture not in [STDIO_CAPTURE_OFF, STDIO_CAPTURE_TAIL,
+                                 STDIO_CAPTURE_FULL]:
+            raise ValueError('invalid stdio capture mode %s' % self._capture)
+
+        self._fs        = rpu.FSLimiter(self._fs_limit)   # ops per fs
+        self._todo      = Queue.Queue()       # unit chunks to handle
+        self._done      = Queue.Queue()       # handled units (or failures)
+
+        self._stagers   = list()
+        for i in range(self._n_workers):
+            worker = threading.Thread(target=self._stage_worker,
+                                      name='%s.stage.%d' % (self.uid, i))
+            worker.daemon = True
+            worker.start()
+            self._stagers.append(worker)
+
         self.register_input(rps.AGENT_STAGING_OUTPUT_PENDING, 
                             rpc.AGENT_STAGING_OUTPUT_QUEUE, self.work)
 
         # we don't need an output queue -- units are picked up via mongodb
         self.register_output(rps.UMGR_STAGING_OUTPUT_PENDING, None) # drop units
 
+        self.register_timed_cb(self._collect_cb, timer=STAGING_COLLECT_TIMER)
+
+        # unit profiles are merged into a single profile, by a separate thread
+        self._merger = None
+        if 'RADICAL_PILOT_PROFILE' in os.environ:
+            self._merger = rpu.ProfileMerger(
+                                 path='%s/%s.units.prof' % (self._pwd, self.uid),
+                                 name=self.uid, log=self._log)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def finalize_child(self):
+
+        for worker in self._stagers:
+            self._todo.put(None)
+
+        for worker in self._stagers:
+            worker.join()
+
+        if self._merger:
+            self._merger.close()
+
 
     # --------------------------------------------------------------------------
     #
@@ -66,15 +143,79 @@ class Default(AgentStagingOutputComponent):
 
         ru.raise_on('work bulk')
 
-        # we first filter out any units which don't need any input staging, and
-        # advance them again as a bulk.  We work over the others one by one, and
-        # advance them individually, to avoid stalling from slow staging ops.
-        
+        # NOTE: all units get here after execution, even those which did not
+        #       finish successfully.  We do that so that we can make
+        #       stdout/stderr available for failed units (see
+        #       _handle_unit_stdio below).  But we don't need to perform any
+        #       other staging for those units, and in fact can make them
+        #       final.
+        #
+        # We always dig for stdout/stderr, and perform the staging actions
+        # this component is responsible for.  That is done by the worker
+        # threads, and `_collect_cb` picks the units up again.  Units which
+        # need staging are submitted individually, to avoid stalling other
+        # units on slow staging ops.
         no_staging_units = list()
-        staging_units    = list()
 
         for unit in units:
 
+            actionables = list()
+            if unit['target_state'] == rps.DONE:
+                for sd in unit['description'].get('output_staging', []):
+                    if sd['action'] in [rpc.LINK, rpc.COPY, rpc.MOVE]:
+                        actionables.append(sd)
+
+            if actionables:
+                self._todo.put([[unit, actionables]])
+            else:
+                no_staging_units.append([unit, None])
+
+        for i in range(0, len(no_staging_units), STDIO_CHUNK_SIZE):
+            self._todo.put(no_staging_units[i:i + STDIO_CHUNK_SIZE])
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _stage_worker(self):
+
+        while True:
+
+            task = self._todo.get()
+            if task is None:
+                break
+
+            for unit, actionables in task:
+
+                try:
+                    self._handle_unit_stdio(unit)
+                except Exception:
+                    self._log.exception('stdio capture failed for %s',
+                                        unit['uid'])
+
+                if not actionables:
+                    self._done.put([unit, None])
+                    continue
+
+                try:
+                    self._handle_unit_staging(unit, actionables)
+                    self._done.put([unit, None])
+
+                except Exception as e:
+                    self._log.exception('staging failed for %s', unit['uid'])
+                    self._done.put([unit, str(e)])
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _collect_cb(self):
+
+        units = list()
+        while True:
+            try:
+                unit, error = self._done.get_nowait()
+            except Queue.Empty:
+                break
+
             uid = unit['uid']
 
             # From here on, any state update will hand control over to the umgr
@@ -83,42 +224,25 @@ class Default(AgentStagingOutputComponent):
             unit['$all']    = True 
             unit['control'] = 'umgr_pending'
 
-            # we always dig for stdout/stderr
-            self._handle_unit_stdio(unit)
-
-            # NOTE: all units get here after execution, even those which did not
-            #       finish successfully.  We do that so that we can make
-            #       stdout/stderr available for failed units (see
-            #       _handle_unit_stdio above).  But we don't need to perform any
-            #       other staging for those units, and in fact can make them
-            #       final.
             if unit['target_state'] != rps.DONE:
                 unit['state'] = unit['target_state']
                 self._log.debug('unit %s skips staging (%s)', uid, unit['state'])
-                no_staging_units.append(unit)
-                continue
 
-            # check if we have any staging directives to be enacted in this
-            # component
-            actionables = list()
-            for sd in unit['description'].get('output_staging', []):
-                if sd['action'] in [rpc.LINK, rpc.COPY, rpc.MOVE]:
-                    actionables.append(sd)
+            elif error:
+                unit['state']   = rps.FAILED
+                unit['stderr'] += '\nPilot cannot stage unit output:\n%s\n' \
+                                  % error
 
-            if actionables:
-                # this unit needs some staging
-                staging_units.append([unit, actionables])
             else:
-                # this unit does not need any staging at this point, and can be
-                # advanced
+                # all agent staging is done -- pass on to umgr output staging
                 unit['state'] = rps.UMGR_STAGING_OUTPUT_PENDING
-                no_staging_units.append(unit)
 
-        if no_staging_units:
-            self.advance(no_staging_units, publish=True, push=True)
+            units.append(unit)
+
+        if units:
+            self.advance(units, publish=True, push=True)
 
-        for unit,actionables in staging_units:
-            self._handle_unit_staging(unit, actionables)
+        return True
 
 
     # --------------------------------------------------------------------------
@@ -128,52 +252,57 @@ class Default(AgentStagingOutputComponent):
         sandbox = ru.Url(unit['unit_sandbox']).path
         uid     = unit['uid']
 
-        self._prof.prof('staging_stdout_start', uid=uid)
+        if self._capture != STDIO_CAPTURE_OFF:
 
-        # TODO: disable this at scale?
-        if os.path.isfile(unit['stdout_file']):
-            with open(unit['stdout_file'], 'r') as stdout_f:
-                try:
-                    txt = unicode(stdout_f.read(), "utf-8")
-                except UnicodeDecodeError:
-                    txt = "unit stdout is binary -- use file staging"
+            self._prof.prof('staging_stdout_start', uid=uid)
+            unit['stdout'] += self._tail(unit.get('stdout_file'), 'stdout')
+            self._prof.prof('staging_stdout_stop',  uid=uid)
 
-                unit['stdout'] += rpu.tail(txt)
+            self._prof.prof('staging_stderr_start', uid=uid)
+            unit['stderr'] += self._tail(unit.get('stderr_file'), 'stderr')
+            self._prof.prof('staging_stderr_stop', uid=uid)
 
-        self._prof.prof('staging_stdout_stop',  uid=uid)
-        self._prof.prof('staging_stderr_start', uid=uid)
+        if self._capture == STDIO_CAPTURE_FULL:
 
-        # TODO: disable this at scale?
-        if os.path.isfile(unit['stderr_file']):
-            with open(unit['stderr_file'], 'r') as stderr_f:
-                try:
-                    txt = unicode(stderr_f.read(), "utf-8")
-                except UnicodeDecodeError:
-                    txt = "unit stderr is binary -- use file staging"
+            # let the umgr output stager fetch the complete files
+            sds = list()
+            for key in ['stdout_file', 'stderr_file']:
+                if unit.get(key) and os.path.isfile(unit[key]):
+                    rel  = os.path.relpath(unit[key], sandbox)
+                    name = os.path.basename(unit[key])
+                    sds.append({'source' : 'unit:///%s' % rel,
+                                'target' : 'client:///%s.%s' % (uid, name),
+                                'action' : rpc.TRANSFER})
+            unit['description']['output_staging'] += \
+                                                 expand_staging_directives(sds)
 
-                unit['stderr'] += rpu.tail(txt)
+            # the stored description is stale now
+            unit.pop(rpu.STORE_REF, None)
 
-        self._prof.prof('staging_stderr_stop', uid=uid)
         self._prof.prof('staging_uprof_start', uid=uid)
 
-        unit_prof = "%s/%s.prof" % (sandbox, uid)
-
-        if os.path.isfile(unit_prof):
-            try:
-                with open(unit_prof, 'r') as prof_f:
-                    txt = prof_f.read()
-                    for line in txt.split("\n"):
-                        if line:
-                            ts, event, comp, tid, _uid, state, msg = line.split(',')
-                            self._prof.prof(timestamp=float(ts), event=event,
-                                            comp=comp, tid=tid, uid=_uid,
-                                            state=state, msg=msg)
-            except Exception as e:
-                self._log.error("Pre/Post profile read failed: `%s`" % e)
+        # unit profiles are not parsed here, but are appended to the merged
+        # unit profile as they are
+        if self._merger:
+            self._merger.add("%s/%s.prof" % (sandbox, uid))
 
         self._prof.prof('staging_uprof_stop', uid=uid)
 
 
+    # --------------------------------------------------------------------------
+    #
+    def _tail(self, path, name):
+
+        if not path or not os.path.isfile(path):
+            return ''
+
+        txt = rpu.tail_file(path, self._max_io)
+        if txt is None:
+            txt = "unit %s is binary -- use file staging" % name
+
+        return txt
+
+
     # --------------------------------------------------------------------------
     #
     def _handle_unit_staging(self, unit, actionables):
@@ -186,37 +315,9 @@ class Default(AgentStagingOutputComponent):
         #       class definition.
         sandbox = ru.Url(unit['unit_sandbox']).path
 
-        # By definition, this compoentn lives on the pilot's target resource.
-        # As such, we *know* that all staging ops which would refer to the
-        # resource now refer to file://localhost, and thus translate the unit,
-        # pilot and resource sandboxes into that scope.  Some assumptions are
-        # made though:
-        #
-        #   * paths are directly translatable across schemas
-        #   * resource level storage is in fact accessible via file://
-        #
-        # FIXME: this is costly and should be cached.
-
-        unit_sandbox     = ru.Url(unit['unit_sandbox'])
-        pilot_sandbox    = ru.Url(unit['pilot_sandbox'])
-        resource_sandbox = ru.Url(unit['resource_sandbox'])
-
-        unit_sandbox.schema     = 'file'
-        pilot_sandbox.schema    = 'file'
-        resource_sandbox.schema = 'file'
-
-        unit_sandbox.host       = 'localhost'
-        pilot_sandbox.host      = 'localhost'
-        resource_sandbox.host   = 'localhost'
-
-        src_context = {'pwd'      : str(unit_sandbox),       # !!!
-                       'unit'     : str(unit_sandbox), 
-                       'pilot'    : str(pilot_sandbox), 
-                       'resource' : str(resource_sandbox)}
-        tgt_context = {'pwd'      : str(unit_sandbox),       # !!!
-                       'unit'     : str(unit_sandbox), 
-                       'pilot'    : str(pilot_sandbox), 
-                       'resource' : str(resource_sandbox)}
+        # all staging ops refer to file://localhost (see `get_local_context()`)
+        src_context = get_local_context(unit)
+        tgt_context = src_context
 
         # we can now handle the actionable staging directives
         for sd in actionables:
@@ -274,25 +375,25 @@ class Default(AgentStagingOutputComponent):
                     rpu.rec_makedir(tgtdir)
 
             if   action == rpc.COPY: 
-                try:
-                    shutil.copytree(src.path, tgt.path)
-                except OSError as exc: 
-                    if exc.errno == errno.ENOTDIR:
-                        shutil.copy(src.path, tgt.path)
-                    else: 
-                        raise
+                self._copy(src.path, tgt.path)
                 
             elif action == rpc.LINK:
-                # Fix issue/1513 if link source is file and target is folder
-                # should support POSIX standard where link is created
-                # with the same name as the source
-                if os.path.isfile(src.path) and os.path.isdir(tgt.path):
-                    os.symlink(src.path, 
-                               os.path.join(tgt.path, 
-                                            os.path.basename(src.path)))
-                else:  # default behavior
-                    os.symlink(src.path, tgt.path)
-            elif action == rpc.MOVE: shutil.move(src.path, tgt.path)
+                with self._fs.occupy(tgt.path):
+                    # Fix issue/1513 if link source is file and target is
+                    # folder should support POSIX standard where link is
+                    # created with the same name as the source
+                    if os.path.isfile(src.path) and os.path.isdir(tgt.path):
+                        os.symlink(src.path, 
+                                   os.path.join(tgt.path, 
+                                                os.path.basename(src.path)))
+                    else:  # default behavior
+                        os.symlink(src.path, tgt.path)
+
+            elif action == rpc.MOVE:
+                # `shutil.move()` renames if possible, and copies otherwise
+                with self._fs.occupy(src.path, tgt.path):
+                    shutil.move(src.path, tgt.path)
+
             elif action == rpc.TRANSFER: pass
                 # This is currently never executed. Commenting it out.
                 # Uncomment and implement when uploads directly to remote URLs
@@ -314,8 +415,36 @@ class Default(AgentStagingOutputComponent):
 
             self._prof.prof('staging_out_stop', uid=uid, msg=did)
 
-        # all agent staging is done -- pass on to umgr output staging
-        self.advance(unit, rps.UMGR_STAGING_OUTPUT_PENDING, publish=True, push=False)
+
+    # --------------------------------------------------------------------------
+    #
+    def _copy(self, src, tgt):
+        """
+        Copy `src` to `tgt`.  Files are hard linked if source and target live
+        on the same file system -- the unit is done, so the source will not
+        change anymore.  We fall back to a plain copy if that fails.
+        """
+
+        with self._fs.occupy(src, tgt):
+
+            if os.path.isfile(src) and rpu.get_fs_id(src) == rpu.get_fs_id(tgt):
+
+                if os.path.isdir(tgt):
+                    tgt = os.path.join(tgt, os.path.basename(src))
+
+                try:
+                    os.link(src, tgt)
+                    return
+                except OSError as e:
+                    self._log.debug('link %s failed (%s) - copy', tgt, e)
+
+            try:
+                shutil.copytree(src, tgt)
+            except OSError as exc: 
+                if exc.errno == errno.ENOTDIR:
+                    shutil.copy(src, tgt)
+                else: 
+                    raise
 
 
 # ------------------------------------------------------------------------------
@@ -38,6 +38,7 @@ AGENT_SCHEDULE_PUBSUB          = 'agent_schedule_pubsub'
 CONTROL_PUBSUB                 = 'control_pubsub'
 STATE_PUBSUB                   = 'state_pubsub'
 LOG_PUBSUB                     = 'log_pubsub'
+METRICS_PUBSUB                 = 'metrics_pubsub'
 
 
 # ------------------------------------------------------------------------------
@@ -90,6 +91,7 @@ STAGING_AREA     = 'staging_area'
 # scheduler names (and backwards compat)
 SCHEDULER_ROUND_ROBIN  = "round_robin"
 SCHEDULER_BACKFILLING  = "backfilling"
+SCHEDULER_LATE_BINDING = "late_binding"
 SCHEDULER_DEFAULT      = SCHEDULER_ROUND_ROBIN
 
 # ------------------------------------------------------------------------------
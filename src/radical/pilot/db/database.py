@@ -34,6 +34,11 @@ class DBSession(object):
         pilots  : document describing a rp.Pilot
         umgr    : document describing a rp.UnitManager
         units   : document describing a rp.Unit
+
+        If `db_layout` is set to `split` in the session config, pilot and
+        unit documents are stored in separate collections (see
+        `rpu.get_session_collections()`).  Use `get_collection(type)` to find
+        the collection for documents of a certain type.
         """
 
         self._dburl      = dburl
@@ -44,8 +49,13 @@ class DBSession(object):
         self._connected  = None
         self._closed     = None
         self._c          = None
+        self._colls      = dict()
+        self._layout     = cfg.get('db_layout', rpu.DB_LAYOUT_SHARED)
         self._can_remove = False
 
+        if self._layout not in rpu.DB_LAYOUTS:
+            raise ValueError('invalid db layout %s' % self._layout)
+
         if not connect:
             return
 
@@ -64,17 +74,16 @@ class DBSession(object):
         # NOTE: hell will break loose if session IDs are not unique!
         if not self._c.count():
 
-            # make 'uid', 'type' and 'state' indexes, as we frequently query
-            # based on combinations of those.  Only 'uid' is unique
-            self._c.create_index([('uid',   pymongo.ASCENDING)], unique=True,  sparse=False)
-            self._c.create_index([('type',  pymongo.ASCENDING)], unique=False, sparse=False)
-            self._c.create_index([('state', pymongo.ASCENDING)], unique=False, sparse=False)
+            self._colls = rpu.get_session_collections(self._db, sid,
+                                                      self._layout)
+            self._create_indexes()
 
             # insert the session doc
             self._can_delete = True
             self._c.insert({'type'      : 'session',
                             '_id'       : sid,
                             'uid'       : sid,
+                            'layout'    : self._layout,
                             'cfg'       : copy.deepcopy(cfg),
                             'created'   : self._created,
                             'connected' : self._connected})
@@ -90,9 +99,58 @@ class DBSession(object):
             self._created    = doc['created']
             self._connected  = time.time()
 
+            # the layout is determined by the session creator
+            self._layout = doc.get('layout', rpu.DB_LAYOUT_SHARED)
+            self._colls  = rpu.get_session_collections(self._db, sid,
+                                                       self._layout)
+
             # FIXME: get bridge addresses from DB?  If not, from where?
 
 
+    #--------------------------------------------------------------------------
+    #
+    def _create_indexes(self):
+
+        # 'uid' is unique for all documents.  The hot queries are the unit
+        # pulls of agents ('pilot', 'control' : 'agent_pending') and of unit
+        # managers ('umgr', 'control' : 'umgr_pending'), and the claims of
+        # pool units ('umgr', 'pilot' : None, 'control' : 'agent_pending').
+        # Those are served by partial indexes which only cover the (few)
+        # pending documents, and thus remain small for large sessions.
+        agent_pending = {'partialFilterExpression' : {'control' : 'agent_pending'}}
+        umgr_pending  = {'partialFilterExpression' : {'control' : 'umgr_pending' }}
+
+        asc = pymongo.ASCENDING
+
+        if self._layout == rpu.DB_LAYOUT_SHARED:
+
+            # make 'uid', 'type' and 'state' indexes, as we frequently query
+            # based on combinations of those.  Only 'uid' is unique
+            self._c.create_index([('uid',   asc)], unique=True,  sparse=False)
+            self._c.create_index([('type',  asc)], unique=False, sparse=False)
+            self._c.create_index([('state', asc)], unique=False, sparse=False)
+
+            self._c.create_index([('type', asc), ('pilot', asc), ('umgr', asc)],
+                                 **agent_pending)
+            self._c.create_index([('type', asc), ('umgr',  asc)],
+                                 **umgr_pending)
+
+        else:
+            pilots = self._colls['pilot']
+            units  = self._colls['unit']
+
+            self._c.create_index([('uid',   asc)], unique=True)
+            self._c.create_index([('type',  asc)])
+
+            pilots.create_index([('uid',    asc)], unique=True)
+            pilots.create_index([('pmgr',   asc)])
+
+            units.create_index ([('uid',    asc)], unique=True)
+            units.create_index ([('pilot',  asc)])
+            units.create_index ([('pilot',  asc), ('umgr', asc)], **agent_pending)
+            units.create_index ([('umgr',   asc)],                **umgr_pending)
+
+
     #--------------------------------------------------------------------------
     #
     @property
@@ -112,6 +170,26 @@ class DBSession(object):
         return self._db
 
 
+    #--------------------------------------------------------------------------
+    #
+    @property
+    def layout(self):
+        """
+        Returns the storage layout of the session ('shared' or 'split')
+        """
+        return self._layout
+
+
+    #--------------------------------------------------------------------------
+    #
+    def get_collection(self, ttype):
+        """
+        Returns the collection which holds documents of the given type
+        ('session', 'pmgr', 'umgr', 'pilot' or 'unit').
+        """
+        return self._colls.get(ttype, self._c)
+
+
     #--------------------------------------------------------------------------
     #
     @property
@@ -165,13 +243,15 @@ class DBSession(object):
         # only the Session which created the collection can delete it!
         if delete and self._can_remove:
             self._log.info('delete session')
-            self._c.drop()
+            for coll in set(self._colls.values()):
+                coll.drop()
 
         if self._mongo:
             self._mongo.close()
 
         self._closed = time.time()
-        self._c = None
+        self._c      = None
+        self._colls  = dict()
 
 
     #--------------------------------------------------------------------------
@@ -205,7 +285,7 @@ class DBSession(object):
             return None
           # raise Exception('No active session.')
 
-        bulk = self._c.initialize_ordered_bulk_op()
+        bulk = self._colls['pilot'].initialize_ordered_bulk_op()
 
         for doc in pilot_docs:
             doc['_id']     = doc['uid']
@@ -247,15 +327,16 @@ class DBSession(object):
                         'arg' : arg}
 
             # FIXME: evaluate res
+            coll = self._colls['pilot']
             if pids:
-                res = self._c.update({'type'  : 'pilot',
-                                      'uid'   : {'$in' : pids}},
-                                     {'$push' : {'cmd' : cmd_spec}},
-                                     multi = True)
+                res = coll.update({'type'  : 'pilot',
+                                   'uid'   : {'$in' : pids}},
+                                  {'$push' : {'cmd' : cmd_spec}},
+                                  multi = True)
             else:
-                res = self._c.update({'type'  : 'pilot'},
-                                     {'$push' : {'cmd' : cmd_spec}},
-                                     multi = True)
+                res = coll.update({'type'  : 'pilot'},
+                                  {'$push' : {'cmd' : cmd_spec}},
+                                  multi = True)
 
         except pymongo.errors.OperationFailure as e:
             self._log.exception('pymongo error: %s' % e.details)
@@ -274,16 +355,17 @@ class DBSession(object):
         if not pmgr_uid and not pilot_ids:
             raise Exception("pmgr_uid and pilot_ids can't both be None.")
 
+        coll = self._colls['pilot']
         if not pilot_ids:
-            cursor = self._c.find({'type' : 'pilot', 
-                                   'pmgr' : pmgr_uid})
+            cursor = coll.find({'type' : 'pilot', 
+                                'pmgr' : pmgr_uid})
         else:
 
             if not isinstance(pilot_ids, list):
                 pilot_ids = [pilot_ids]
 
-            cursor = self._c.find({'type' : 'pilot', 
-                                   'uid'  : {'$in': pilot_ids}})
+            cursor = coll.find({'type' : 'pilot', 
+                                'uid'  : {'$in': pilot_ids}})
 
         # make sure we return every pilot doc only once
         # https://www.quora.com/How-did-mongodb-return-duplicated-but-different-documents
@@ -312,18 +394,19 @@ class DBSession(object):
 
         # we only pull units which are not yet owned by the umgr
 
+        coll = self._colls['unit']
         if not unit_ids:
-            cursor = self._c.find({'type'   : 'unit',
-                                   'umgr'   : umgr_uid,
-                                   'control': {'$ne' : 'umgr'},
-                                   })
+            cursor = coll.find({'type'   : 'unit',
+                                'umgr'   : umgr_uid,
+                                'control': {'$ne' : 'umgr'},
+                                })
 
         else:
-            cursor = self._c.find({'type'   : 'unit',
-                                   'umgr'   : umgr_uid,
-                                   'uid'    : {'$in' : unit_ids},
-                                   'control': {'$ne' : 'umgr'  },
-                                   })
+            cursor = coll.find({'type'   : 'unit',
+                                'umgr'   : umgr_uid,
+                                'uid'    : {'$in' : unit_ids},
+                                'control': {'$ne' : 'umgr'  },
+                                })
 
         # make sure we return every unit doc only once
         # https://www.quora.com/How-did-mongodb-return-duplicated-but-different-documents
@@ -381,7 +464,7 @@ class DBSession(object):
         while True:
 
             subset = unit_docs[cur : cur+bcs]
-            bulk   = self._c.initialize_ordered_bulk_op()
+            bulk   = self._colls['unit'].initialize_ordered_bulk_op()
             cur   += bcs
 
             if not subset:
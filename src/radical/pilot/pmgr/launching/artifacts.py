@@ -0,0 +1,182 @@
+
+__copyright__ = "Copyright 2017, http://radical.rutgers.edu"
+__license__   = "MIT"
+
+
+import os
+import shutil
+import hashlib
+import tarfile
+import tempfile
+import threading
+
+
+# ------------------------------------------------------------------------------
+# Bootstrap artifacts live in a content addressed store below the resource
+# sandbox, which is shared by all sessions on that resource:
+#
+#   $RESOURCE_SANDBOX/artifacts/MANIFEST
+#   $RESOURCE_SANDBOX/artifacts/<sha1>/<name>
+#
+# The manifest lists the hashes of all artifacts which have been completely
+# unpacked -- blobs are only ever added to the manifest *after* unpacking.
+#
+ARTIFACT_DIR      = 'artifacts'
+ARTIFACT_MANIFEST = 'MANIFEST'
+
+_CHUNK_SIZE       = 1024 * 1024
+
+
+# ==============================================================================
+#
+class ArtifactCache(object):
+    """
+    The artifact cache keeps track of bootstrap artifacts (sdists, bootstrapper,
+    CA certificates) for the pilot launcher.  Artifacts are identified by the
+    hash of their content.  For each resource sandbox, the cache remembers what
+    artifacts are known to exist on the target resource, so that the remote
+    manifest only needs to be inspected once per launcher and resource.
+    Tarballs of artifacts which need staging are kept around locally, so that
+    they can be reused for later pilot bulks (for example toward other
+    resources).
+    """
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, log):
+
+        self._log      = log
+        self._lock     = threading.RLock()
+        self._hashes   = dict()   # path     : [size, mtime, hash]
+        self._known    = dict()   # sandbox  : set of staged hashes
+        self._tarballs = dict()   # hash set : local tarball path
+        self._tmp      = tempfile.mkdtemp(prefix='rp_artifacts.')
+
+
+    # --------------------------------------------------------------------------
+    #
+    def close(self):
+
+        shutil.rmtree(self._tmp, ignore_errors=True)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def get_hash(self, path):
+        """
+        return the content hash for the file at `path`.  Hashes are cached, and
+        only recomputed if size or mtime of the file change.
+        """
+
+        st = os.stat(path)
+
+        with self._lock:
+            entry = self._hashes.get(path)
+            if entry and entry[0] == st.st_size and entry[1] == st.st_mtime:
+                return entry[2]
+
+        sha1 = hashlib.sha1()
+        with open(path, 'rb') as f:
+            while True:
+                data = f.read(_CHUNK_SIZE)
+                if not data:
+                    break
+                sha1.update(data)
+        digest = sha1.hexdigest()
+
+        with self._lock:
+            self._hashes[path] = [st.st_size, st.st_mtime, digest]
+
+        return digest
+
+
+    # --------------------------------------------------------------------------
+    #
+    def get_rel_path(self, path):
+        """
+        return the location of an artifact relative to the resource sandbox
+        """
+
+        return '%s/%s/%s' % (ARTIFACT_DIR, self.get_hash(path),
+                             os.path.basename(path))
+
+
+    # --------------------------------------------------------------------------
+    #
+    def is_known(self, sandbox):
+
+        with self._lock:
+            return sandbox in self._known
+
+
+    # --------------------------------------------------------------------------
+    #
+    def set_manifest(self, sandbox, manifest):
+        """
+        register the content of a remote manifest for a resource sandbox
+        """
+
+        hashes = set([line.strip() for line in manifest.split('\n')
+                                   if  line.strip()])
+        with self._lock:
+            if sandbox not in self._known:
+                self._known[sandbox] = set()
+            self._known[sandbox].update(hashes)
+
+        self._log.debug('%d artifacts known for %s', len(hashes), sandbox)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def get_missing(self, sandbox, paths):
+        """
+        return the subset of paths whose content is not known to exist in the
+        given resource sandbox
+        """
+
+        with self._lock:
+            known = self._known.get(sandbox, set())
+            return [path for path in paths
+                         if  self.get_hash(path) not in known]
+
+
+    # --------------------------------------------------------------------------
+    #
+    def mark_staged(self, sandbox, paths):
+
+        with self._lock:
+            if sandbox not in self._known:
+                self._known[sandbox] = set()
+            for path in paths:
+                self._known[sandbox].add(self.get_hash(path))
+
+
+    # --------------------------------------------------------------------------
+    #
+    def get_tarball(self, paths):
+        """
+        return a local tarball which contains the given artifacts at their
+        location relative to the resource sandbox.  Tarballs are created on
+        first use, and are kept for reuse.
+        """
+
+        key = tuple(sorted([self.get_hash(path) for path in paths]))
+
+        with self._lock:
+
+            if key in self._tarballs and os.path.exists(self._tarballs[key]):
+                return self._tarballs[key]
+
+            tar_path = '%s/artifacts.%d.tgz' % (self._tmp, len(self._tarballs))
+            with tarfile.open(tar_path, mode='w:gz', dereference=True) as tar:
+                for path in paths:
+                    tar.add(path, arcname=self.get_rel_path(path))
+
+            self._tarballs[key] = tar_path
+            self._log.debug('created artifact tarball %s (%s)', tar_path, paths)
+
+            return tar_path
+
+
+# ------------------------------------------------------------------------------
+
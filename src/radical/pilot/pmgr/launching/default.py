@@ -7,6 +7,7 @@ import os
 import copy
 import math
 import time
+import heapq
 import pprint
 import shutil
 import tempfile
@@ -22,7 +23,8 @@ from .... import pilot      as rp
 from ...  import states     as rps
 from ...  import constants  as rpc
 
-from .base import PMGRLaunchingComponent
+from .base      import PMGRLaunchingComponent
+from .artifacts import ArtifactCache, ARTIFACT_DIR, ARTIFACT_MANIFEST
 
 from ...staging_directives import complete_url
 from ...staging_directives import TRANSFER, COPY, LINK, MOVE
@@ -41,6 +43,18 @@ JOB_CHECK_INTERVAL    =  60  # seconds between runs of the job state check loop
 JOB_CHECK_MAX_MISSES  =   3  # number of times to find a job missing before
                              # declaring it dead
 
+# The pilot watcher checks job states with an adaptive interval per pilot: after
+# a job state change, the job is checked again after JOB_CHECK_INTERVAL_MIN
+# seconds, and that interval grows by JOB_CHECK_BACKOFF on every check which
+# does not find a state change, up to a maximum which depends on the job state.
+# Pending jobs are checked more frequently than running jobs, as the latter
+# also report their state via the agent.
+JOB_CHECK_INTERVAL_MIN     =  10  # seconds
+JOB_CHECK_INTERVAL_PENDING =  JOB_CHECK_INTERVAL
+JOB_CHECK_INTERVAL_ACTIVE  = 300  # seconds
+JOB_CHECK_BACKOFF          = 1.5
+JOB_WATCHER_TICK           = 1.0  # seconds between watcher invocations
+
 LOCAL_SCHEME   = 'file'
 BOOTSTRAPPER_0 = "bootstrap_0.sh"
 
@@ -67,9 +81,11 @@ class Default(PMGRLaunchingComponent):
         self._pilots_lock   = threading.RLock()  # lock on maipulating the above
         self._checking      = list()             # pilots to check state on
         self._check_lock    = threading.RLock()  # lock on maipulating the above
+        self._check_queue   = list()             # heap of (due, pid) checks
+        self._cancel_queue  = list()             # heap of (due, pid) kills
         self._saga_fs_cache = dict()             # cache of saga directories
         self._saga_js_cache = dict()             # cache of saga job services
-        self._sandboxes     = dict()             # cache of resource sandbox URLs
+        self._artifacts     = ArtifactCache(self._log)  # bootstrap artifacts
         self._cache_lock    = threading.RLock()  # lock for cache
 
         self._mod_dir       = os.path.dirname(os.path.abspath(__file__))
@@ -79,8 +95,9 @@ class Default(PMGRLaunchingComponent):
         self.register_input(rps.PMGR_LAUNCHING_PENDING, 
                             rpc.PMGR_LAUNCHING_QUEUE, self.work)
 
-        # FIXME: make interval configurable
-        self.register_timed_cb(self._pilot_watcher_cb, timer=10.0)
+        # The watcher is invoked frequently, but only checks those pilots which
+        # are due for a state check or a forceful cancellation.
+        self.register_timed_cb(self._pilot_watcher_cb, timer=JOB_WATCHER_TICK)
 
         # we listen for pilot cancel and input staging commands
         self.register_subscriber(rpc.CONTROL_PUBSUB, self._pmgr_control_cb)
@@ -114,6 +131,8 @@ class Default(PMGRLaunchingComponent):
                 js.close()
                 self._log.debug('closed js to %s', url)
             self._saga_js_cache.clear()
+
+        self._artifacts.close()
         self._log.debug('finalized child')
 
 
@@ -248,42 +267,75 @@ class Default(PMGRLaunchingComponent):
         #          disappeared
         #        This implies that we want to communicate 'final_cause'
 
-        # we don't want to lock our members all the time.  For that reason we
-        # use a copy of the pilots_tocheck list and iterate over that, and only
-        # lock other members when they are manipulated.
-
         ru.raise_on('pilot_watcher_cb')
 
-        tc = rs.job.Container()
+        now = time.time()
+
+        # collect all pilots which are due for a state check, and sort them by
+        # job service, so that we can issue one bulk state query per job
+        # service
+        buckets = dict()
         with self._pilots_lock, self._check_lock:
 
-            for pid in self._checking:
-                tc.add(self._pilots[pid]['job'])
+            while self._check_queue and self._check_queue[0][0] <= now:
 
-        states = tc.get_states()
+                _, pid = heapq.heappop(self._check_queue)
 
-        self._log.debug('bulk states: %s', states)
+                if pid not in self._checking:
+                    # pilot is final or killed meanwhile
+                    continue
 
-        # if none of the states is final, we have nothing to do.
-        # We can't rely on the ordering of tasks and states in the task
-        # container, so we hope that the task container's bulk state query lead
-        # to a caching of state information, and we thus have cache hits when
-        # querying the pilots individually
+                js_ep = self._pilots[pid]['js']
+                if js_ep not in buckets:
+                    buckets[js_ep] = list()
+                buckets[js_ep].append(pid)
 
         final_pilots = list()
-        with self._pilots_lock, self._check_lock:
+        for js_ep, pids in buckets.iteritems():
+
+            tc = rs.job.Container()
+            with self._pilots_lock:
+                for pid in pids:
+                    tc.add(self._pilots[pid]['job'])
 
-            for pid in self._checking:
+            states = tc.get_states()
+            self._log.debug('bulk states %s: %s', js_ep, states)
 
-                state = self._pilots[pid]['job'].state
-                self._log.debug('saga job state: %s %s', pid, state)
+            # We can't rely on the ordering of tasks and states in the task
+            # container, so we hope that the task container's bulk state query
+            # lead to a caching of state information, and we thus have cache
+            # hits when querying the pilots individually
+            with self._pilots_lock, self._check_lock:
 
-                if state in [rs.job.DONE, rs.job.FAILED, rs.job.CANCELED]:
-                    pilot = self._pilots[pid]['pilot']
-                    if state == rs.job.DONE    : pilot['state'] = rps.DONE
-                    if state == rs.job.FAILED  : pilot['state'] = rps.FAILED
-                    if state == rs.job.CANCELED: pilot['state'] = rps.CANCELED
-                    final_pilots.append(pilot)
+                for pid in pids:
+
+                    info  = self._pilots[pid]
+                    state = info['job'].state
+                    self._log.debug('saga job state: %s %s', pid, state)
+
+                    if state in [rs.job.DONE, rs.job.FAILED, rs.job.CANCELED]:
+                        pilot = info['pilot']
+                        if state == rs.job.DONE    : pilot['state'] = rps.DONE
+                        if state == rs.job.FAILED  : pilot['state'] = rps.FAILED
+                        if state == rs.job.CANCELED: pilot['state'] = rps.CANCELED
+                        final_pilots.append(pilot)
+                        continue
+
+                    # reschedule the next check, backing off if nothing changed
+                    if state == rs.job.RUNNING:
+                        max_interval = JOB_CHECK_INTERVAL_ACTIVE
+                    else:
+                        max_interval = JOB_CHECK_INTERVAL_PENDING
+
+                    if state != info['job_state']:
+                        info['job_state'] = state
+                        info['interval']  = JOB_CHECK_INTERVAL_MIN
+                    else:
+                        info['interval']  = min(max_interval,
+                                            info['interval'] * JOB_CHECK_BACKOFF)
+
+                    heapq.heappush(self._check_queue,
+                                   (now + info['interval'], pid))
 
         if final_pilots:
 
@@ -300,24 +352,28 @@ class Default(PMGRLaunchingComponent):
         # all checks are done, final pilots are weeded out.  Now check if any
         # pilot is scheduled for cancellation and is overdue, and kill it
         # forcefully.
-        to_cancel  = list()
+        to_cancel = list()
         with self._pilots_lock:
 
-            for pid in self._pilots:
+            while self._cancel_queue and self._cancel_queue[0][0] <= now:
 
-                pilot   = self._pilots[pid]['pilot']
-                time_cr = pilot.get('cancel_requested')
+                due, pid = heapq.heappop(self._cancel_queue)
+                pilot    = self._pilots[pid]['pilot']
+                time_cr  = pilot.get('cancel_requested')
 
                 # check if the pilot is final meanwhile
                 if pilot['state'] in rps.FINAL:
                     continue
 
-                if time_cr and time_cr + JOB_CANCEL_DELAY < time.time():
-                    self._log.debug('pilot needs killing: %s :  %s + %s < %s',
-                            pid, time_cr, JOB_CANCEL_DELAY, time.time())
-                    del(pilot['cancel_requested'])
-                    self._log.debug(' cancel pilot %s', pid)
-                    to_cancel.append(pid)
+                # ignore stale entries from earlier cancellation requests
+                if not time_cr or time_cr + JOB_CANCEL_DELAY != due:
+                    continue
+
+                self._log.debug('pilot needs killing: %s :  %s + %s < %s',
+                        pid, time_cr, JOB_CANCEL_DELAY, now)
+                del(pilot['cancel_requested'])
+                self._log.debug(' cancel pilot %s', pid)
+                to_cancel.append(pid)
 
         if to_cancel:
             self._kill_pilots(to_cancel)
@@ -351,6 +407,8 @@ class Default(PMGRLaunchingComponent):
                 if pid in self._pilots:
                     self._log.debug('update cancel req: %s %s', pid, now)
                     self._pilots[pid]['pilot']['cancel_requested'] = now
+                    heapq.heappush(self._cancel_queue,
+                                   (now + JOB_CANCEL_DELAY, pid))
 
 
     # --------------------------------------------------------------------------
@@ -501,12 +559,14 @@ class Default(PMGRLaunchingComponent):
         We expect `_prepare_pilot(resource, pilot)` to return a dict with:
 
             { 
-              'js' : saga.job.Description,
-              'ft' : [ 
+              'js'  : saga.job.Description,
+              'ft'  : [ 
                 { 'src' : string  # absolute source file name
                   'tgt' : string  # relative target file name
                   'rem' : bool    # shall we remove src?
                 }, 
+                ... ],
+              'art' : [ string,   # absolute artifact file name
                 ... ]
             }
 
@@ -514,15 +574,13 @@ class Default(PMGRLaunchingComponent):
         once (in fact, we put all src files into a tarball and unpack that on
         the target side).
 
-        The returned dicts are expected to only contain files which actually
-        need staging, ie. which have not been staged during a previous pilot
-        submission.  That implies one of two things: either this component is
-        stateful, and remembers what has been staged -- which makes it difficult
-        to use multiple component instances; or the component inspects the
-        target resource for existing files -- which involves additional
-        expensive remote hops.
-        FIXME: since neither is implemented at this point we won't discuss the
-               tradeoffs further -- right now files are unique per pilot bulk.
+        Files which are the same for all pilots (sdists, bootstrapper, CA
+        certificates) are returned as 'artifacts'.  Those are stored in
+        a content addressed store in the resource sandbox, which is shared
+        across pilots and sessions (see `artifacts.py`).  We check the remote
+        manifest of that store once per resource, and only stage artifacts
+        which are not yet present.  The artifacts are then linked into the
+        session sandbox, where the bootstrapper expects them.
 
         Once all dicts are collected, we create one additional file which
         contains the staging information, and then pack all src files into
@@ -558,7 +616,8 @@ class Default(PMGRLaunchingComponent):
             assert(schema == pilot['description'].get('access_schema')), \
                     'inconsistent scheme on launch / staging'
 
-        session_sandbox = self._session._get_session_sandbox(pilots[0]).path
+        session_sandbox  = self._session._get_session_sandbox (pilots[0]).path
+        resource_sandbox = self._session._get_resource_sandbox(pilots[0]).path
 
 
         # we will create the session sandbox before we untar, so we can use that
@@ -566,12 +625,16 @@ class Default(PMGRLaunchingComponent):
         # implies that we have to recheck that all URLs in fact do point into
         # the session sandbox.
 
-        ft_list = list()  # files to stage
-        jd_list = list()  # jobs  to submit
+        ft_list  = list()  # files to stage
+        jd_list  = list()  # jobs  to submit
+        art_list = list()  # artifacts to make available
         for pilot in pilots:
             info = self._prepare_pilot(resource, rcfg, pilot)
             ft_list += info['ft']
             jd_list.append(info['jd'])
+            for art in info['art']:
+                if art not in art_list:
+                    art_list.append(art)
             self._prof.prof('staging_in_start', uid=pilot['uid'])
 
         for ft in ft_list:
@@ -621,13 +684,6 @@ class Default(PMGRLaunchingComponent):
                 fs = rsfs.Directory(fs_url, session=self._session)
                 self._saga_fs_cache[fs_url] = fs
 
-        tar_rem      = rs.Url(fs_url)
-        tar_rem.path = "%s/%s" % (session_sandbox, tar_name)
-
-        fs.copy(tar_url, tar_rem, flags=rsfs.CREATE_PARENTS)
-
-        shutil.rmtree(tmp_dir)
-
         # we now need to untar on the target machine.
         js_url = ru.Url(pilots[0]['js_url'])
 
@@ -651,8 +707,56 @@ class Default(PMGRLaunchingComponent):
                 js_tmp  = rs.job.Service(js_url, session=self._session)
                 self._saga_js_cache[js_url] = js_tmp
 
+        # check what artifacts are present in the resource sandbox.  We only
+        # inspect the remote manifest once per resource -- after that we rely
+        # on our own bookkeeping.
+        art_dir = '%s/%s' % (resource_sandbox, ARTIFACT_DIR)
+        if not self._artifacts.is_known(resource_sandbox):
+            j = js_tmp.run_job('cat %s/%s 2>/dev/null; true'
+                              % (art_dir, ARTIFACT_MANIFEST))
+            j.wait()
+            self._artifacts.set_manifest(resource_sandbox, j.get_stdout_string())
+
+        art_missing = self._artifacts.get_missing(resource_sandbox, art_list)
+        self._log.debug('artifacts: %d needed, %d missing',
+                        len(art_list), len(art_missing))
+
+        tar_rem      = rs.Url(fs_url)
+        tar_rem.path = "%s/%s" % (session_sandbox, tar_name)
+
+        fs.copy(tar_url, tar_rem, flags=rsfs.CREATE_PARENTS)
+
+        shutil.rmtree(tmp_dir)
+
+        cmd = ''
+        if art_missing:
+
+            # stage the missing artifacts, from a (possibly cached) tarball
+            # which unpacks relative to the resource sandbox.  Only unpacked
+            # artifacts are added to the manifest.
+            art_tar      = self._artifacts.get_tarball(art_missing)
+            art_name     = '%s.%s.artifacts.tgz' % (sid, self.uid)
+            art_rem      = rs.Url(fs_url)
+            art_rem.path = "%s/%s" % (session_sandbox, art_name)
+
+            fs.copy(rs.Url('file://localhost/%s' % art_tar), art_rem,
+                    flags=rsfs.CREATE_PARENTS)
+
+            hashes = ' '.join([self._artifacts.get_hash(art)
+                               for art in art_missing])
+            cmd += "tar zmxf %s/%s -C %s && " \
+                   "for h in %s; do echo $h >> %s/%s; done && " \
+                   % (session_sandbox, art_name, resource_sandbox,
+                      hashes, art_dir, ARTIFACT_MANIFEST)
+
+        # link all artifacts into the session sandbox
+        for art in art_list:
+            cmd += "ln -sf %s/%s %s/%s && " \
+                   % (resource_sandbox, self._artifacts.get_rel_path(art),
+                      session_sandbox,  os.path.basename(art))
+
      ## cmd = "tar zmxvf %s/%s -C / ; rm -f %s" % \
-        cmd = "tar zmxvf %s/%s -C %s" % \
+        cmd += "tar zmxvf %s/%s -C %s" % \
                 (session_sandbox, tar_name, session_sandbox)
         j = js_tmp.run_job(cmd)
         j.wait()
@@ -660,6 +764,11 @@ class Default(PMGRLaunchingComponent):
         self._log.debug('tar cmd : %s', cmd)
         self._log.debug('tar done: %s, %s, %s', j.state, j.stdout, j.stderr)
 
+        if j.exit_code:
+            raise RuntimeError('pilot sandbox setup failed: %s' % cmd)
+
+        self._artifacts.mark_staged(resource_sandbox, art_missing)
+
         for pilot in pilots:
             self._prof.prof('staging_in_stop', uid=pilot['uid'])
             self._prof.prof('submission_start', uid=pilot['uid'])
@@ -717,12 +826,17 @@ class Default(PMGRLaunchingComponent):
             with self._pilots_lock:
 
                 self._pilots[pid] = dict()
-                self._pilots[pid]['pilot'] = pilot
-                self._pilots[pid]['job']   = j
+                self._pilots[pid]['pilot']     = pilot
+                self._pilots[pid]['job']       = j
+                self._pilots[pid]['js']        = js_ep
+                self._pilots[pid]['job_state'] = j.state
+                self._pilots[pid]['interval']  = JOB_CHECK_INTERVAL_MIN
 
             # make sure we watch that pilot
             with self._check_lock:
                 self._checking.append(pid)
+                heapq.heappush(self._check_queue,
+                               (time.time() + JOB_CHECK_INTERVAL_MIN, pid))
 
         for pilot in pilots:
             self._prof.prof('submission_stop', uid=pilot['uid'])
@@ -733,8 +847,9 @@ class Default(PMGRLaunchingComponent):
     def _prepare_pilot(self, resource, rcfg, pilot):
 
         pid = pilot["uid"]
-        ret = {'ft' : list(),
-               'jd' : None  }
+        ret = {'ft'  : list(),
+               'art' : list(),
+               'jd'  : None  }
 
       # # ----------------------------------------------------------------------
       # # the rcfg can contain keys with string expansion placeholders where
@@ -1097,43 +1212,27 @@ class Default(PMGRLaunchingComponent):
                           'tgt' : '%s/%s' % (pilot_sandbox, '%s.prof.tgz' % pid),
                           'rem' : False})  # don't remove /dev/null
 
-        # check if we have a sandbox cached for that resource.  If so, we have
-        # nothing to do.  Otherwise we create the sandbox and stage the RP
-        # stack etc.
-        # NOTE: this will race when multiple pilot launcher instances are used!
-        with self._cache_lock:
-
-            if resource not in self._sandboxes:
-
-                for sdist in sdist_paths:
-                    base = os.path.basename(sdist)
-                    ret['ft'].append({'src' : sdist, 
-                                      'tgt' : '%s/%s' % (session_sandbox, base),
-                                      'rem' : False})
-
-                # Copy the bootstrap shell script.
-                bootstrapper_path = os.path.abspath("%s/agent/%s"
-                                  % (self._root_dir, BOOTSTRAPPER_0))
-                self._log.debug("use bootstrapper %s", bootstrapper_path)
-
-                ret['ft'].append({'src' : bootstrapper_path, 
-                                  'tgt' : '%s/%s' % (session_sandbox, BOOTSTRAPPER_0),
-                                  'rem' : False})
-
-                # Some machines cannot run pip due to outdated CA certs.
-                # For those, we also stage an updated certificate bundle
-                # TODO: use booleans all the way?
-                if stage_cacerts:
-
-                    cc_name = 'cacert.pem.gz'
-                    cc_path = os.path.abspath("%s/agent/%s" % (self._root_dir, cc_name))
-                    self._log.debug("use CAs %s", cc_path)
-
-                    ret['ft'].append({'src' : cc_path, 
-                                      'tgt' : '%s/%s' % (session_sandbox, cc_name),
-                                      'rem' : False})
-
-                self._sandboxes[resource] = True
+        # the RP stack, bootstrapper etc. are shared between pilots.  Those are
+        # staged as artifacts, which are only transferred if they don't yet
+        # exist on the target resource.
+        for sdist in sdist_paths:
+            ret['art'].append(sdist)
+
+        # Copy the bootstrap shell script.
+        bootstrapper_path = os.path.abspath("%s/agent/%s"
+                          % (self._root_dir, BOOTSTRAPPER_0))
+        self._log.debug("use bootstrapper %s", bootstrapper_path)
+        ret['art'].append(bootstrapper_path)
+
+        # Some machines cannot run pip due to outdated CA certs.
+        # For those, we also stage an updated certificate bundle
+        # TODO: use booleans all the way?
+        if stage_cacerts:
+
+            cc_name = 'cacert.pem.gz'
+            cc_path = os.path.abspath("%s/agent/%s" % (self._root_dir, cc_name))
+            self._log.debug("use CAs %s", cc_path)
+            ret['art'].append(cc_path)
 
 
         # ----------------------------------------------------------------------
@@ -145,7 +145,10 @@ class ResourceConfig(attributes.Attributes):
 
     .. data:: virtenv_mode
 
-       [Type: `string`] [optional] TODO
+       [Type: `string`] [optional] How to handle the virtenv on the target
+       resource: `create`, `update`, `use`, `recreate`, `private`, or `pack`.
+       In `pack` mode, the virtenv is packed into a checksummed tarball once,
+       and pilots use a node-local, unpacked copy of it (no pip invocations).
 
     .. data:: lrms
 
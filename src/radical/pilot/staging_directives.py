@@ -1,12 +1,51 @@
 
 import os
 import sys
+import hashlib
+import itertools
 
 import radical.utils as ru
 
 from .constants import *
 
 
+# ------------------------------------------------------------------------------
+# repeatedly staged input files are cached once per pilot, in this directory
+# below the pilot's staging area, i.e. in
+# `<pilot_sandbox>/staging_area/staging_cache/` (see `get_cache_url()`)
+STAGING_CACHE = 'staging_cache'
+
+# Parsed staging directives, URL completions and sandbox contexts are cached:
+# the same directives and sandboxes are usually seen for many units.  Caches
+# are reset once they grow beyond this size.
+_CACHE_SIZE   = 10000
+_sd_cache     = dict()   # directive          : expanded directive w/o uid
+_path_cache   = dict()   # path               : [schema, ppath, url]
+_url_cache    = dict()   # (path, context)    : completed url
+_local_cache  = dict()   # sandbox url        : file://localhost/ url
+_sd_ids       = itertools.count()
+
+
+# ------------------------------------------------------------------------------
+#
+def _cache(cache, key, val):
+
+    if len(cache) > _CACHE_SIZE:
+        cache.clear()
+    cache[key] = val
+
+
+# ------------------------------------------------------------------------------
+#
+def generate_sd_id():
+    '''
+    Staging directive IDs are only used for tracing, and are generated from
+    a simple counter, which is cheaper than `ru.generate_id()`.
+    '''
+
+    return 'sd.%04d' % _sd_ids.next()
+
+
 # ------------------------------------------------------------------------------
 #
 def expand_description(descr):
@@ -42,7 +81,9 @@ def expand_description(descr):
 #
 def expand_staging_directives(sds):
     """
-    Take an abbreviated or compressed staging directive and expand it.
+    Take an abbreviated or compressed staging directive and expand it.  Each
+    directive is parsed once -- repeated directives (such as those from unit
+    description templates) are only copied and get a new ID assigned.
     """
 
     if not sds:
@@ -54,81 +95,105 @@ def expand_staging_directives(sds):
     ret = list()
     for sd in sds:
 
-        if isinstance(sd, basestring):
-            # We detected a string, convert into dict.  The interpretation
-            # differs depending of redirection characters being present in the
-            # string.
-
-            if   '>>' in sd: src, tgt = sd.split('>>', 2)
-            elif '>'  in sd: src, tgt = sd.split('>' , 2)
-            elif '<<' in sd: tgt, src = sd.split('<<', 2)
-            elif '<'  in sd: tgt, src = sd.split('<' , 2)
-            else           : src, tgt = sd, os.path.basename(ru.Url(sd).path)
-
-            expanded = {'uid':      ru.generate_id('sd'),
-                        'source':   src.strip(),
-                        'target':   tgt.strip(),
-                        'action':   DEFAULT_ACTION,
-                        'flags':    DEFAULT_FLAGS,
-                        'priority': DEFAULT_PRIORITY}
-
-        elif isinstance(sd, dict):
-
-            # sanity check on dict syntax
-            valid_keys = ['source', 'target', 'action', 'flags', 'priority']
-            for k in sd:
-                if k not in valid_keys:
-                    raise ValueError('"%s" is invalid on staging directive' % k)
-
-            source   = sd.get('source')
-            target   = sd.get('target',   os.path.basename(ru.Url(source).path))
-            action   = sd.get('action',   DEFAULT_ACTION)
-            flags    = sd.get('flags',    DEFAULT_FLAGS)
-            priority = sd.get('priority', DEFAULT_PRIORITY)
-
-            if not source:
-                raise Exception("Staging directive dict has no source member!")
-
-            # RCT flags should always be rendered as OR'ed integers - but old
-            # versions of the RP API rendered them as list of strings.  We
-            # convert to the integer version for backward compatibility - but we
-            # complain loudly if we find actual strings.
-            if isinstance(flags, list):
-                int_flags = 0
-                for flag in flags:
-                    if isinstance(flags, basestring):
-                        raise ValueError('"%s" is no valid RP constant' % flag)
-                    int_flags != flag
-                flags = int_flags
-
-            elif isinstance(flags, basestring):
-                raise ValueError('use RP constants for staging flags!')
-
-            expanded = {'uid':      ru.generate_id('sd'),
-                        'source':   source,
-                        'target':   target,
-                        'action':   action,
-                        'flags':    flags,
-                        'priority': priority}
-
-        else:
-            raise Exception("Unknown type of staging directive: %s (%s)" % (sd, type(sd)))
+        try:
+            if isinstance(sd, dict): key = tuple(sorted(sd.items()))
+            else                   : key = sd
+            template = _sd_cache.get(key)
+        except TypeError:
+            # unhashable directive content (old style flag lists) - no caching
+            key      = None
+            template = None
+
+        if not template:
+            template = _expand_staging_directive(sd)
+            if key is not None:
+                _cache(_sd_cache, key, template)
+
+        expanded        = dict(template)
+        expanded['uid'] = generate_sd_id()
+        ret.append(expanded)
 
-        # we warn the user when  src or tgt are using the deprecated
-        # `staging://` schema
-        if str(expanded['source']).startswith('staging://'):
-            sys.stderr.write('staging:// schema is deprecated - use pilot://\n')
-            expanded['source'] = str(expanded['source']).replace('staging://', 
-                                                                 'pilot://')
+    return ret
 
-        if str(expanded['target']).startswith('staging://'):
-            sys.stderr.write('staging:// schema is deprecated - use pilot://\n')
-            expanded['target'] = str(expanded['target']).replace('staging://', 
-                                                                 'pilot://')
 
-        ret.append(expanded)
+# ------------------------------------------------------------------------------
+#
+def _expand_staging_directive(sd):
+    """
+    Expand a single staging directive -- the result has no `uid` assigned.
+    """
 
-    return ret
+    if isinstance(sd, basestring):
+        # We detected a string, convert into dict.  The interpretation
+        # differs depending of redirection characters being present in the
+        # string.
+
+        if   '>>' in sd: src, tgt = sd.split('>>', 2)
+        elif '>'  in sd: src, tgt = sd.split('>' , 2)
+        elif '<<' in sd: tgt, src = sd.split('<<', 2)
+        elif '<'  in sd: tgt, src = sd.split('<' , 2)
+        else           : src, tgt = sd, os.path.basename(ru.Url(sd).path)
+
+        expanded = {'source':   src.strip(),
+                    'target':   tgt.strip(),
+                    'action':   DEFAULT_ACTION,
+                    'flags':    DEFAULT_FLAGS,
+                    'priority': DEFAULT_PRIORITY}
+
+    elif isinstance(sd, dict):
+
+        # sanity check on dict syntax
+        valid_keys = ['source', 'target', 'action', 'flags', 'priority']
+        for k in sd:
+            if k not in valid_keys:
+                raise ValueError('"%s" is invalid on staging directive' % k)
+
+        source   = sd.get('source')
+        target   = sd.get('target',   os.path.basename(ru.Url(source).path))
+        action   = sd.get('action',   DEFAULT_ACTION)
+        flags    = sd.get('flags',    DEFAULT_FLAGS)
+        priority = sd.get('priority', DEFAULT_PRIORITY)
+
+        if not source:
+            raise Exception("Staging directive dict has no source member!")
+
+        # RCT flags should always be rendered as OR'ed integers - but old
+        # versions of the RP API rendered them as list of strings.  We
+        # convert to the integer version for backward compatibility - but we
+        # complain loudly if we find actual strings.
+        if isinstance(flags, list):
+            int_flags = 0
+            for flag in flags:
+                if isinstance(flags, basestring):
+                    raise ValueError('"%s" is no valid RP constant' % flag)
+                int_flags != flag
+            flags = int_flags
+
+        elif isinstance(flags, basestring):
+            raise ValueError('use RP constants for staging flags!')
+
+        expanded = {'source':   source,
+                    'target':   target,
+                    'action':   action,
+                    'flags':    flags,
+                    'priority': priority}
+
+    else:
+        raise Exception("Unknown type of staging directive: %s (%s)" % (sd, type(sd)))
+
+    # we warn the user when  src or tgt are using the deprecated
+    # `staging://` schema
+    if str(expanded['source']).startswith('staging://'):
+        sys.stderr.write('staging:// schema is deprecated - use pilot://\n')
+        expanded['source'] = str(expanded['source']).replace('staging://', 
+                                                             'pilot://')
+
+    if str(expanded['target']).startswith('staging://'):
+        sys.stderr.write('staging:// schema is deprecated - use pilot://\n')
+        expanded['target'] = str(expanded['target']).replace('staging://', 
+                                                             'pilot://')
+
+    return expanded
 
 
 # ------------------------------------------------------------------------------
@@ -152,18 +217,58 @@ def complete_url(path, context, log=None):
     Other URL schemas are left alone, any other strings are interpreted as
     path in the context of `pwd`.
 
-    The method returns an instance of ru.Url.  Note that URL parsing is not
-    really cheap, so this method should be used conservatively.
+    The method returns an instance of ru.Url.  URL parsing is not really
+    cheap, so results are memoized per path and context URL, and the parsed
+    paths are cached as well.  The returned URL instances are thus shared, and
+    *must not* be changed by the caller.
     '''
 
     # FIXME: consider evaluation of env vars
 
-    purl = ru.Url(path)
+    str_path = str(path)
+    parsed   = _path_cache.get(str_path)
 
-    log.debug('<- %s (%s)', path, type(path))
-    log.debug('   %s', purl)
+    if not parsed:
+        parsed = _parse_path(str_path)
+        _cache(_path_cache, str_path, parsed)
 
-    str_path = str(path)
+    schema, ppath, purl = parsed
+
+    if schema not in context:
+        # no expansion needed
+        return purl
+
+    base = str(context[schema])
+    key  = (str_path, schema, base)
+    ret  = _url_cache.get(key)
+
+    if not ret:
+
+        ret = ru.Url(base)
+
+        if schema in ['resource', 'pilot']:
+            # use a dedicated staging area dir
+            ret.path += '/%s' % STAGING_AREA
+
+        ret.path += '/%s' % ppath
+        _cache(_url_cache, key, ret)
+
+        if log:
+            log.debug('expand %s with %s: %s', str_path, base, ret)
+
+    return ret
+
+
+# ------------------------------------------------------------------------------
+#
+def _parse_path(path):
+    '''
+    Parse a staging path for `complete_url()`, and return the schema to expand
+    it with, the path element to append to the expanded context URL, and the
+    parsed URL itself.
+    '''
+
+    purl = ru.Url(path)
 
     # we always want a schema, and fall back to file:// or pwd://, depending if
     # the path is absolute or relative.  Note that pwd:// is interpreted in the
@@ -172,7 +277,7 @@ def complete_url(path, context, log=None):
     # We further assume that the user knows what she is doing when using
     # absolute paths, and make no attempts to verify those either.
     if not purl.schema:
-        if str_path.startswith('/'):
+        if path.startswith('/'):
             purl.schema = 'file'
         else:
             purl.schema = 'pwd'
@@ -184,34 +289,105 @@ def complete_url(path, context, log=None):
         # We don't check context though.
         schema = 'pwd'  
 
-    log.debug('   %s', schema)
-    if schema in context.keys():
+    # we interpret any hostname as part of the path element
+    if   purl.host and purl.path: ppath = '%s/%s' % (purl.host, purl.path)
+    elif purl.host              : ppath =    '%s' % (           purl.host)
+    elif purl.path              : ppath =    '%s' % (           purl.path)
+    else                        : ppath =     '.'
 
-        # we interpret any hostname as part of the path element
-        if   purl.host and purl.path: ppath = '%s/%s' % (purl.host, purl.path)
-        elif purl.host              : ppath =    '%s' % (           purl.host)
-        elif purl.path              : ppath =    '%s' % (           purl.path)
-        else                        : ppath =     '.'
+    return [schema, ppath, purl]
 
-        if schema not in context:
-            raise ValueError('cannot expand schema (%s) for staging' % schema)
 
-        log.debug('   expand with %s', context[schema])
-        ret = ru.Url(context[schema])
+# ------------------------------------------------------------------------------
+#
+def get_local_context(unit):
+    '''
+    Return the staging context for agent side staging directives of the given
+    unit.  By definition, the agent lives on the pilot's target resource.  As
+    such, we *know* that all staging ops which would refer to the resource now
+    refer to file://localhost, and thus translate the unit, pilot and resource
+    sandboxes into that scope.  Some assumptions are made though:
 
-        if schema in ['resource', 'pilot']:
-            # use a dedicated staging area dir
-            ret.path += '/staging_area'
+      * paths are directly translatable across schemas
+      * resource level storage is in fact accessible via file://
 
-        ret.path += '/%s' % ppath
-        purl      = ret
+    Pilot and resource sandboxes are translated once -- unit sandboxes below
+    the pilot sandbox are translated by substituting the pilot sandbox prefix.
+    '''
 
-    # if not schema is set, assume file:// on localhost
-    if not purl.schema:
-        purl.schema = 'file'
+    psbox = unit['pilot_sandbox']
+    usbox = unit['unit_sandbox']
+
+    pilot_sandbox    = _localize(psbox)
+    resource_sandbox = _localize(unit['resource_sandbox'])
+
+    if  usbox.startswith(psbox) \
+    and psbox.endswith('/') == pilot_sandbox.endswith('/'):
+        unit_sandbox = pilot_sandbox + usbox[len(psbox):]
+    else:
+        unit_sandbox = _localize(usbox)
+
+    return {'pwd'      : unit_sandbox,       # !!!
+            'unit'     : unit_sandbox,
+            'pilot'    : pilot_sandbox,
+            'resource' : resource_sandbox}
+
+
+# ------------------------------------------------------------------------------
+#
+def _localize(url):
+
+    ret = _local_cache.get(url)
+
+    if not ret:
+        tmp        = ru.Url(url)
+        tmp.schema = 'file'
+        tmp.host   = 'localhost'
+        ret        = str(tmp)
+        _cache(_local_cache, url, ret)
+
+    return ret
+
+
+# ------------------------------------------------------------------------------
+#
+def get_cache_path(url, size, mtime):
+    '''
+    Return the location of a cached staging source, relative to the pilot's
+    staging area (`<pilot_sandbox>/staging_area/`).  The cache key is derived
+    from the source URL, size and modification time, so that a changed source
+    results in a new cache entry.
+    '''
+
+    key  = hashlib.sha1('%s:%s:%s' % (url, size, mtime)).hexdigest()
+    name = os.path.basename(ru.Url(url).path)
+
+    return '%s/%s/%s' % (STAGING_CACHE, key, name)
+
+
+# ------------------------------------------------------------------------------
+#
+def get_cache_url(rel):
+    '''
+    Return the staging URL for a cache location as returned by
+    `get_cache_path()`.  `pilot://` URLs are expanded into the pilot's staging
+    area by `complete_url()`, on the client and on the agent side alike.
+    '''
+
+    return 'pilot:///%s' % rel
+
+
+# ------------------------------------------------------------------------------
+#
+def get_cache_dir(pilot_sandbox):
+    '''
+    Return the (normalized) path of the staging cache of the pilot with the
+    given sandbox path, i.e. the directory which `get_cache_url()` URLs expand
+    to on the pilot's resource.
+    '''
 
-    log.debug('-> %s', purl)
-    return purl
+    return os.path.normpath('%s/%s/%s' % (pilot_sandbox, STAGING_AREA,
+                                          STAGING_CACHE))
 
 
 # ------------------------------------------------------------------------------
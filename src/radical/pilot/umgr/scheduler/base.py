@@ -18,6 +18,7 @@ from ... import constants as rpc
 # 'enum' for RPs's umgr scheduler types
 SCHEDULER_ROUND_ROBIN  = "round_robin"
 SCHEDULER_BACKFILLING  = "backfilling"
+SCHEDULER_LATE_BINDING = "late_binding"
 
 # default:
 SCHEDULER_DEFAULT      = SCHEDULER_ROUND_ROBIN
@@ -110,11 +111,13 @@ class UMGRSchedulingComponent(rpu.Component):
 
         from .round_robin  import RoundRobin
         from .backfilling  import Backfilling
+        from .late_binding import LateBinding
 
         try:
             impl = {
-                SCHEDULER_ROUND_ROBIN : RoundRobin,
-                SCHEDULER_BACKFILLING : Backfilling
+                SCHEDULER_ROUND_ROBIN  : RoundRobin,
+                SCHEDULER_BACKFILLING  : Backfilling,
+                SCHEDULER_LATE_BINDING : LateBinding
             }[name]
 
             impl = impl(cfg, session)
@@ -305,7 +308,7 @@ class UMGRSchedulingComponent(rpu.Component):
 
         elif cmd == 'cancel_units':
 
-            uids = arg['uids']
+            uids = set(rpu.expand_uids(arg))
 
             # find the pilots handling these units and forward the caancellation
             # request
@@ -313,16 +316,27 @@ class UMGRSchedulingComponent(rpu.Component):
 
             with self._units_lock:
                 for pid in self._units:
-                    for uid in uids:
-                        if uid in self._units[pid]:
-                            if pid not in to_cancel:
-                                to_cancel[pid] = list()
-                            to_cancel[pid].append(uid)
+                    pilot_uids = uids.intersection(self._units[pid])
+                    if pilot_uids:
+                        to_cancel[pid] = list(pilot_uids)
 
             for pid in to_cancel:
+
+                # pooled units (see late binding) are registered without
+                # a pilot -- any of our pilots may have claimed those, but no
+                # pilot of any other unit manager
+                if pid is None:
+                    with self._pilots_lock:
+                        pids = [p for p in self._pilots
+                                  if self._pilots[p]['role'] == ADDED]
+                    if not pids:
+                        continue
+                else:
+                    pids = pid
+
                 self._session._dbs.pilot_command(cmd='cancel_units',
-                                                 arg={'uids' : to_cancel[pid]},
-                                                 pids=pid)
+                                                 arg=rpu.compress_uids(to_cancel[pid]),
+                                                 pids=pids)
 
         return True
 
@@ -0,0 +1,124 @@
+
+__copyright__ = "Copyright 2013-2017, http://radical.rutgers.edu"
+__license__   = "MIT"
+
+import radical.utils as ru
+
+from ... import utils     as rpu
+from ... import states    as rps
+from ... import constants as rpc
+
+from .round_robin import RoundRobin
+
+
+# ==============================================================================
+#
+class LateBinding(RoundRobin):
+    '''
+    The late binding scheduler does not assign units to pilots at all.  Instead,
+    units are pushed into a per-umgr pool in the DB (units with the umgr's uid,
+    but without a pilot), and any pilot agent which knows about that pool will
+    atomically claim bulks of units sized to its free capacity (see
+    `Agent_0._claim_units()`).  Pilots learn about the pools they should draw
+    from via 'add_pool' and 'remove_pool' pilot commands, which this scheduler
+    issues when pilots are added to or removed from the unit manager.
+
+    Units which have client side input staging directives (`TRANSFER`,
+    `TARBALL`) need a target sandbox before they can be handed over to any
+    agent -- those units are still early-bound, in round-robin fashion.
+    '''
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, cfg, session):
+
+        RoundRobin.__init__(self, cfg, session)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _configure(self):
+
+        RoundRobin._configure(self)
+
+        self._log.debug('LateBinding umgr scheduler configured')
+
+
+    # --------------------------------------------------------------------------
+    #
+    def add_pilots(self, pids):
+
+        # let the new pilots know that they can pull units from our pool
+        self._session._dbs.pilot_command(cmd='add_pool',
+                                         arg={'pool' : self._umgr},
+                                         pids=pids)
+
+        RoundRobin.add_pilots(self, pids)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def remove_pilots(self, pids):
+
+        # removed pilots should not pull any further units from our pool
+        self._session._dbs.pilot_command(cmd='remove_pool',
+                                         arg={'pool' : self._umgr},
+                                         pids=pids)
+
+        RoundRobin.remove_pilots(self, pids)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _work(self, units):
+
+        pooled = list()
+        bound  = list()
+
+        for unit in units:
+
+            # units which were bound to a pilot by the application keep their
+            # pilot
+            if unit.get('pilot'):
+                bound.append(unit)
+                continue
+
+            # units which need client side input staging need a target sandbox,
+            # and are thus bound right away
+            staging = False
+            for sd in unit['description'].get('input_staging', []):
+                if sd['action'] in [rpc.TRANSFER, rpc.TARBALL]:
+                    staging = True
+                    break
+
+            if staging:
+                bound.append(unit)
+                continue
+
+            # all other units go into the pool.  The unit sandbox is determined
+            # by the agent which claims the unit -- only the client sandbox is
+            # known at this point.
+            unit['pilot']          = None
+            unit['client_sandbox'] = str(self._session._get_client_sandbox())
+            pooled.append(unit)
+
+        if pooled:
+
+            # pooled units are registered without a pilot, so that
+            # cancellation requests get forwarded to all our pilots
+            with self._units_lock:
+                if None not in self._units:
+                    self._units[None] = list()
+                self._units[None] += [unit['uid'] for unit in pooled]
+
+            self._log.debug('pool %d units', len(pooled))
+            self.advance(pooled, rps.UMGR_STAGING_INPUT_PENDING,
+                         publish=True, push=True)
+
+        if bound:
+            self._log.debug('bind %d units (bound or client staging)', len(bound))
+            RoundRobin._work(self, bound)
+
+
+# ------------------------------------------------------------------------------
+
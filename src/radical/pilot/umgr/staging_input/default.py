@@ -12,22 +12,39 @@ import tarfile
 import saga          as rs
 import radical.utils as ru
 
+from ...   import utils     as rpu
 from ...   import states    as rps
 from ...   import constants as rpc
 
 from .base import UMGRStagingInputComponent
 
-from ...staging_directives import complete_url
+from ...staging_directives import complete_url, get_cache_path, get_cache_url
+from ...staging_directives import generate_sd_id
 
 
 # if we receive more than a certain numnber of units in a bulk, we create the
 # unit sandboxes in a remote bulk op.  That limit is defined here, along with
 # the definition of the bulk mechanism used to create the sandboxes:
-#   saga: use SAGA bulk ops
-#   tar : unpack a locally created tar which contains all sandboxes
+#   saga  : use SAGA bulk ops
+#   tar   : unpack a locally created tar which contains all sandboxes
+#   stream: stream a tar which contains all sandboxes to the target resource,
+#           and unpack it on the fly (falls back to 'tar' if not supported)
 
 UNIT_BULK_MKDIR_THRESHOLD = 128
-UNIT_BULK_MKDIR_MECHANISM = 'tar'
+UNIT_BULK_MKDIR_MECHANISM = 'stream'
+
+# input files up to this size (in bytes) are not transferred individually, but
+# are collected into one tarball per pilot and unit bulk, which is unpacked on
+# the target resource.  A value of `0` disables grouping.
+DEFAULT_STAGING_GROUP_SIZE = 1024 * 1024
+
+# max number of staging cache entries we keep track of per pilot.  Beyond that
+# limit, entries of completed transfers are forgotten (and the respective files
+# would be transferred again on their next use).
+DEFAULT_STAGING_CACHE_SIZE = 10000
+
+# interval for collecting completed transfers
+STAGING_COLLECT_TIMER = 0.1
 
 
 # ==============================================================================
@@ -58,6 +75,35 @@ class Default(UMGRStagingInputComponent):
         self._pilots      = dict()
         self._pilots_lock = mt.RLock()
 
+        # input files which have been transferred into the staging cache of
+        # a pilot, as {pid : {cache path : transfer task}}.  Entries are
+        # dropped when the pilot is final.
+        self._use_cache   = self._cfg.get('staging_cache', True)
+        self._cache_size  = self._cfg.get('staging_cache_size',
+                                          DEFAULT_STAGING_CACHE_SIZE)
+        self._cached      = dict()
+
+        # transfers are executed concurrently in a transfer pool.  A unit
+        # depends on one or more transfer tasks (its own transfers, the
+        # transfer of grouped files, cached files), and is advanced once all
+        # of those have completed.
+        workers = self._cfg.get('staging_transfer_workers',
+                                rpu.DEFAULT_TRANSFER_WORKERS)
+        handles = self._cfg.get('staging_transfer_handles',
+                                rpu.DEFAULT_TRANSFER_HANDLES)
+        backlog = self._cfg.get('staging_transfer_backlog',
+                                rpu.DEFAULT_TRANSFER_BACKLOG)
+
+        self._group_size  = self._cfg.get('staging_group_size',
+                                          DEFAULT_STAGING_GROUP_SIZE)
+        self._pool        = rpu.TransferPool(self._session, self._log, self.uid,
+                                             workers, handles, backlog)
+        self._pending     = dict()   # uid : {'unit', 'deps', 'failed'}
+        self._js_lock     = mt.RLock()
+        self._group_cnt   = 0
+
+        self.register_timed_cb(self._collect_cb, timer=STAGING_COLLECT_TIMER)
+
         self.register_input(rps.UMGR_STAGING_INPUT_PENDING,
                             rpc.UMGR_STAGING_INPUT_QUEUE, self.work)
 
@@ -65,16 +111,20 @@ class Default(UMGRStagingInputComponent):
         self.register_output(rps.AGENT_STAGING_INPUT_PENDING, None)
 
         # we subscribe to the command channel to learn about pilots being added
-        # to this unit manager.
+        # to this unit manager, and to the state channel to learn about pilots
+        # being final.
         self.register_subscriber(rpc.CONTROL_PUBSUB, self._base_command_cb)
-
+        self.register_subscriber(rpc.STATE_PUBSUB,   self._base_state_cb)
 
 
     # --------------------------------------------------------------------------
     #
     def finalize_child(self):
 
-        self.unregister_subscriber(rpc.STATE_PUBSUB, self._base_command_cb)
+        self.unregister_subscriber(rpc.CONTROL_PUBSUB, self._base_command_cb)
+        self.unregister_subscriber(rpc.STATE_PUBSUB,   self._base_state_cb)
+
+        self._pool.close()
 
         try:
             [fs.close() for fs in self._fs_cache.values()]
@@ -112,6 +162,32 @@ class Default(UMGRStagingInputComponent):
         return True
 
 
+    # --------------------------------------------------------------------------
+    #
+    def _base_state_cb(self, topic, msg):
+
+        # forget the staging cache of pilots which are final
+
+        cmd = msg.get('cmd')
+        arg = msg.get('arg')
+
+        if cmd not in ['update', 'state_update']:
+            return True
+
+        if not isinstance(arg, list):
+            arg = [arg]
+
+        for thing in arg:
+            if  thing.get('type')  == 'pilot' \
+            and thing.get('state') in rps.FINAL:
+                pid = thing['uid']
+                with self._pilots_lock:
+                    if self._cached.pop(pid, None) is not None:
+                        self._log.debug('drop staging cache for %s', pid)
+
+        return True
+
+
     # --------------------------------------------------------------------------
     #
     def work(self, units):
@@ -206,12 +282,26 @@ class Default(UMGRStagingInputComponent):
                                                   session=self._session)
                 saga_dir = self._fs_cache[sbox_fs_str]
 
-                # we have two options for a bulk mkdir:
+                # we have three options for a bulk mkdir:
                 # 1) ask SAGA to create the sandboxes in a bulk op
                 # 2) create a tarball with all unit sandboxes, push it over, and
-                #    untar it (one untar op then creates all dirs).  We implement
-                #    both
-                if UNIT_BULK_MKDIR_MECHANISM == 'saga':
+                #    untar it (one untar op then creates all dirs).
+                # 3) as (2), but stream the tarball through the pilot's js_hop
+                #    without creating it locally.
+                # We implement all three.
+                mechanism = UNIT_BULK_MKDIR_MECHANISM
+
+                if mechanism == 'stream':
+                    dirs = [ru.Url(sbox).path for sbox in unit_sboxes]
+                    try:
+                        if not rpu.tar_stream(pilot['js_hop'], dirs=dirs,
+                                              log=self._log):
+                            mechanism = 'tar'
+                    except RuntimeError as e:
+                        self._log.warn('stream failed, fall back to tar: %s', e)
+                        mechanism = 'tar'
+
+                if mechanism == 'saga':
 
                     tc = rs.task.Container()
                     for sbox in unit_sboxes:
@@ -219,7 +309,7 @@ class Default(UMGRStagingInputComponent):
                     tc.run()
                     tc.wait()
 
-                elif UNIT_BULK_MKDIR_MECHANISM == 'tar':
+                elif mechanism == 'tar':
 
                     tmp_path = tempfile.mkdtemp(prefix='rp_agent_tar_dir')
                     tmp_dir  = os.path.abspath(tmp_path)
@@ -248,15 +338,8 @@ class Default(UMGRStagingInputComponent):
                   # ru.sh_callout('rm -r %s' % tmp_path)
 
                     # get a job service handle to the target resource and run
-                    # the untar command.  Use the hop to skip the batch system
-                    js_url = pilot['js_hop']
-                    self._log.debug('js  : %s', js_url)
-
-                    if  js_url in self._js_cache:
-                        js_tmp = self._js_cache[js_url]
-                    else:
-                        js_tmp = rs.job.Service(js_url, session=self._session)
-                        self._js_cache[js_url] = js_tmp
+                    # the untar command.
+                    js_tmp = self._get_js(pilot)
 
                     cmd = "tar zmxvf %s/%s -C /" % (session_sbox.path, tar_name)
                     j   = js_tmp.run_job(cmd)
@@ -273,19 +356,111 @@ class Default(UMGRStagingInputComponent):
             self.advance(no_staging_units, rps.AGENT_STAGING_INPUT_PENDING,
                          publish=True, push=True)
 
+        # plan the staging for all units.  Small files are collected per
+        # pilot, and are transferred as one group -- all other transfers are
+        # handled per unit.
+        groups = dict()   # pid : {'task' : task, 'files' : [[src, tgt], ...]}
         for unit,actionables in staging_units:
-            self._handle_unit(unit, actionables)
+            self._handle_unit(unit, actionables, groups)
+
+        for pid in groups:
+            self._submit_group(pid, groups[pid])
+
+        # units may not need any transfer if all their files are cached
+        self._check_units([unit['uid'] for unit,_ in staging_units])
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _new_task(self):
+
+        return {'uids'  : list(),
+                'done'  : False,
+                'error' : None}
 
 
     # --------------------------------------------------------------------------
     #
-    def _handle_unit(self, unit, actionables):
+    def _add_dep(self, uid, task):
 
-        # FIXME: we should created unit sandboxes in a bulk
+        if task['done']:
+            # nothing to wait for, but we inherit failures
+            if task['error']:
+                self._pending[uid]['failed'] = True
+            return
+
+        if uid not in task['uids']:
+            task['uids'].append(uid)
+            self._pending[uid]['deps'] += 1
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _check_units(self, uids):
+
+        failed = list()
+        staged = list()
+
+        for uid in uids:
+
+            info = self._pending.get(uid)
+            if not info or info['deps']:
+                continue
+
+            del(self._pending[uid])
+            if info['failed']: failed.append(info['unit'])
+            else             : staged.append(info['unit'])
+
+        if failed:
+            self.advance(failed, rps.FAILED, publish=True, push=False)
+
+        # staging is done, we can advance the units at last
+        if staged:
+            self.advance(staged, rps.AGENT_STAGING_INPUT_PENDING,
+                         publish=True, push=True)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _collect_cb(self):
+
+        uids = list()
+        for task, error in self._pool.get_done():
+
+            task['done']  = True
+            task['error'] = error
+
+            for uid in task['uids']:
+                info = self._pending[uid]
+                info['deps'] -= 1
+                if error:
+                    info['failed'] = True
+                uids.append(uid)
+
+            if error:
+                # make sure failed cache transfers are retried on next use
+                with self._pilots_lock:
+                    for cached in self._cached.values():
+                        for rel in cached.keys():
+                            if cached[rel] is task:
+                                del(cached[rel])
+
+        if uids:
+            self._check_units(uids)
+
+        return True
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _handle_unit(self, unit, actionables, groups):
 
         uid = unit['uid']
+        pid = unit['pilot']
 
-        self._prof.prof("create_sandbox_start", uid=uid)
+        self._pending[uid] = {'unit'   : unit,
+                              'deps'   : 0,
+                              'failed' : False}
 
         src_context = {'pwd'      : os.getcwd(),                # !!!
                        'unit'     : unit['unit_sandbox'], 
@@ -299,20 +474,6 @@ class Default(UMGRStagingInputComponent):
         # we have actionable staging directives, and thus we need a unit
         # sandbox.
         sandbox = rs.Url(unit["unit_sandbox"])
-        tmp     = rs.Url(unit["unit_sandbox"])
-
-        # url used for cache (sandbox url w/o path)
-        tmp.path = '/'
-        key = str(tmp)
-        self._log.debug('key %s / %s', key, tmp)
-
-        if key not in self._fs_cache:
-            self._fs_cache[key] = rs.filesystem.Directory(tmp, 
-                                             session=self._session)
-
-        saga_dir = self._fs_cache[key]
-        saga_dir.make_dir(sandbox, flags=rs.filesystem.CREATE_PARENTS)
-        self._prof.prof("create_sandbox_stop", uid=uid)
 
         # Loop over all transfer directives and filter out tarball staging
         # directives.  Those files are added into a tarball, and a single
@@ -321,6 +482,8 @@ class Default(UMGRStagingInputComponent):
         # create a new actionable list during the filtering
         new_actionables = list()
         tar_file        = None
+        tar_path        = None
+        tar_sd          = None
 
         for sd in actionables:
 
@@ -328,6 +491,22 @@ class Default(UMGRStagingInputComponent):
             if sd['action'] != rpc.TARBALL:
                 new_actionables.append(sd)
 
+            elif self._can_group(pid):
+
+                # tarball staging for all units of this bulk is combined into
+                # the pilot's transfer group.  The directive is then complete,
+                # and we make sure that the agent won't act on it.
+                did = sd['uid']
+                src = complete_url(sd['source'], src_context, self._log)
+                tgt = complete_url(sd['target'], tgt_context, self._log)
+
+                group = self._get_group(pid, groups)
+                group['files'].append([src.path, tgt.path])
+                self._add_dep(uid, group['task'])
+
+                sd['action'] = rpc.TRANSFER
+                self._prof.prof('staging_in_group', uid=uid, msg=did)
+
             else:
 
                 action = sd['action']
@@ -351,7 +530,7 @@ class Default(UMGRStagingInputComponent):
                     tar_file = tarfile.open(fileobj=tmp_file, mode='w')
                     tar_src  = ru.Url('file://localhost/%s' % tar_path)
                     tar_tgt  = ru.Url('unit:////%s.tar'     % uid)
-                    tar_did  = ru.generate_id('sd')
+                    tar_did  = generate_sd_id()
                     tar_sd   = {'action' : rpc.TRANSFER, 
                                 'flags'  : rpc.DEFAULT_FLAGS,
                                 'uid'    : tar_did,
@@ -370,7 +549,10 @@ class Default(UMGRStagingInputComponent):
         if tar_file:
             tar_file.close()
 
-        # work on the filtered TRANSFER actionables 
+        # sort the TRANSFER actionables into cached, grouped and individual
+        # transfers.  The individual transfers form the unit's transfer task.
+        task      = self._new_task()
+        transfers = list()
         for sd in new_actionables:
 
             action = sd['action']
@@ -379,38 +561,262 @@ class Default(UMGRStagingInputComponent):
             src    = sd['source']
             tgt    = sd['target']
 
-            if action == rpc.TRANSFER:
+            if action != rpc.TRANSFER:
+                continue
 
-                src = complete_url(src, src_context, self._log)
-                tgt = complete_url(tgt, tgt_context, self._log)
+            src = complete_url(src, src_context, self._log)
+            tgt = complete_url(tgt, tgt_context, self._log)
 
-                # Check if the src is a folder, if true
-                # add recursive flag if not already specified
-                if os.path.isdir(src.path):
-                    flags |= rs.filesystem.RECURSIVE
+            # tarballs are unique per unit, and are always transferred
+            # individually
+            if sd is not tar_sd:
 
-                # Always set CREATE_PARENTS
-                flags |= rs.filesystem.CREATE_PARENTS
+                if self._use_cache and \
+                   self._transfer_cached(unit, sd, src, tgt_context, groups,
+                                         transfers, task):
+                    continue
 
-                src = complete_url(src, src_context, self._log)
-                tgt = complete_url(tgt, tgt_context, self._log)
+                if self._add_to_group(unit, src, tgt, groups):
+                    self._prof.prof('staging_in_group', uid=uid, msg=did)
+                    continue
 
-                self._prof.prof('staging_in_start', uid=uid, msg=did)
-                saga_dir.copy(src, tgt, flags=flags)
-                self._prof.prof('staging_in_stop', uid=uid, msg=did)
+            # Check if the src is a folder, if true
+            # add recursive flag if not already specified
+            if os.path.isdir(src.path):
+                flags |= rs.filesystem.RECURSIVE
+
+            # Always set CREATE_PARENTS
+            flags |= rs.filesystem.CREATE_PARENTS
+
+            transfers.append([src, tgt, flags, did])
 
 
         if tar_file:
 
             # some tarball staging was done.  Add a staging directive for the
-            # agent to untar the tarball, and clean up.
+            # agent to untar the tarball.  The local tarball is removed once
+            # it got transferred.
             tar_sd['action'] = rpc.TARBALL
             unit['description']['input_staging'].append(tar_sd)
-            os.remove(tar_path)
 
+        if not transfers:
+            return
+
+        # ----------------------------------------------------------------------
+        def _transfer(saga_dir):
+
+            self._prof.prof("create_sandbox_start", uid=uid)
+            saga_dir.make_dir(sandbox, flags=rs.filesystem.CREATE_PARENTS)
+            self._prof.prof("create_sandbox_stop", uid=uid)
 
-        # staging is done, we can advance the unit at last
-        self.advance(unit, rps.AGENT_STAGING_INPUT_PENDING, publish=True, push=True)
+            try:
+                for src, tgt, flags, did in transfers:
+                    self._prof.prof('staging_in_start', uid=uid, msg=did)
+                    saga_dir.copy(src, tgt, flags=flags)
+                    self._prof.prof('staging_in_stop', uid=uid, msg=did)
+            finally:
+                if tar_path:
+                    os.remove(tar_path)
+        # ----------------------------------------------------------------------
+
+        self._add_dep(uid, task)
+        self._pool.submit(sandbox, _transfer, task)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _can_group(self, pid):
+        '''
+        check if transfers can be grouped for the given pilot
+        '''
+
+        if not self._group_size or not pid:
+            return False
+
+        with self._pilots_lock:
+            # we need the pilot's js_hop to unpack the group
+            return pid in self._pilots
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _is_small(self, src, pid):
+        '''
+        check if a source can be added to a transfer group for the given pilot
+        '''
+
+        if not self._can_group(pid):
+            return False
+
+        if src.schema != 'file' or not os.path.isfile(src.path):
+            return False
+
+        return os.path.getsize(src.path) <= self._group_size
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _get_group(self, pid, groups):
+
+        if pid not in groups:
+            groups[pid] = {'task'  : self._new_task(),
+                           'files' : list()}
+        return groups[pid]
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _add_to_group(self, unit, src, tgt, groups):
+
+        pid = unit['pilot']
+
+        if not self._is_small(src, pid):
+            return False
+
+        group = self._get_group(pid, groups)
+        group['files'].append([src.path, tgt.path])
+        self._add_dep(unit['uid'], group['task'])
+
+        return True
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _submit_group(self, pid, group):
+        '''
+        Pack all files of a transfer group into a tarball, transfer it into the
+        pilot sandbox, and unpack it there.  Files are packed with their
+        absolute target paths, so that one unpack operation places all of them.
+
+        Where possible, the tarball is streamed through the pilot's `js_hop`,
+        so that packing, transfer and unpacking overlap.  Otherwise we fall
+        back to a local tarball which is transferred via SAGA.
+        '''
+
+        with self._pilots_lock:
+            pilot = self._pilots[pid]
+
+        self._group_cnt += 1
+        files    = group['files']
+        psbox    = rs.Url(pilot['pilot_sandbox'])
+        tar_name = '%s.%s.%06d.tar' % (self._session.uid, self.uid,
+                                       self._group_cnt)
+        tar_rem  = rs.Url(psbox)
+        tar_rem.path = '%s/%s' % (psbox.path, tar_name)
+
+        self._log.debug('group %d files for %s (%s)', len(files), pid, tar_name)
+
+        # ----------------------------------------------------------------------
+        def _transfer(saga_dir):
+
+            try:
+                if rpu.tar_stream(pilot['js_hop'], files=files, log=self._log):
+                    return
+            except RuntimeError as e:
+                self._log.warn('stream failed, fall back to saga: %s', e)
+
+            tmp_file = tempfile.NamedTemporaryFile(prefix='rp_usi_group.',
+                                                   suffix='.tar', delete=False)
+            tar_path = tmp_file.name
+            try:
+                with tarfile.open(fileobj=tmp_file, mode='w') as tar_file:
+                    for src, tgt in files:
+                        tar_file.add(src, arcname=tgt)
+                tmp_file.close()
+
+                saga_dir.copy(ru.Url('file://localhost/%s' % tar_path),
+                              tar_rem, flags=rs.filesystem.CREATE_PARENTS)
+            finally:
+                os.remove(tar_path)
+
+            cmd = "tar xmf %s -C / && rm -f %s" % (tar_rem.path, tar_rem.path)
+            j   = self._get_js(pilot).run_job(cmd)
+            j.wait()
+
+            if j.exit_code:
+                raise RuntimeError('untar failed: %s: %s' 
+                                  % (cmd, j.get_stderr_string()))
+        # ----------------------------------------------------------------------
+
+        self._pool.submit(psbox, _transfer, group['task'])
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _get_js(self, pilot):
+
+        # get a job service handle to the target resource.  Use the hop to
+        # skip the batch system
+        js_url = pilot['js_hop']
+
+        with self._js_lock:
+            if  js_url not in self._js_cache:
+                self._js_cache[js_url] = rs.job.Service(js_url,
+                                                 session=self._session)
+            return self._js_cache[js_url]
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _transfer_cached(self, unit, sd, src, tgt_context, groups, transfers,
+                         task):
+        '''
+        Transfer a local input file into the staging cache of the unit's pilot,
+        unless it has been transferred there before.  The staging directive is
+        then converted into a `COPY` from the cache, which the agent enacts by
+        hard linking the cached file into the unit sandbox.  Returns `False` if
+        the directive cannot be served from the cache.
+
+        Small files are added to the pilot's transfer group, all others are
+        added to the given `transfers` of the unit's transfer `task`.  Other
+        units which use the same file depend on the respective task.
+        '''
+
+        uid = unit['uid']
+        pid = unit['pilot']
+        did = sd['uid']
+
+        if not pid or src.schema != 'file' or not os.path.isfile(src.path):
+            return False
+
+        st  = os.stat(src.path)
+        rel = get_cache_path(str(src), st.st_size, st.st_mtime)
+
+        with self._pilots_lock:
+            if pid not in self._cached:
+                self._cached[pid] = dict()
+            cached = self._cached[pid]
+
+            if len(cached) > self._cache_size:
+                # forget about completed transfers
+                for key in cached.keys():
+                    if cached[key]['done']:
+                        del(cached[key])
+
+        if rel in cached:
+            self._prof.prof('staging_in_cache_hit', uid=uid, msg=did)
+            self._add_dep(uid, cached[rel])
+
+        else:
+            self._prof.prof('staging_in_cache_miss', uid=uid, msg=did)
+
+            tgt = complete_url(get_cache_url(rel), tgt_context, self._log)
+
+            if self._is_small(src, pid):
+                group = self._get_group(pid, groups)
+                group['files'].append([src.path, tgt.path])
+                cached[rel] = group['task']
+                self._add_dep(uid, group['task'])
+
+            else:
+                transfers.append([src, tgt, rs.filesystem.CREATE_PARENTS, did])
+                cached[rel] = task
+
+        # let the agent materialize the file in the unit sandbox
+        sd['action'] = rpc.COPY
+        sd['source'] = get_cache_url(rel)
+
+        return True
 
 
 # ------------------------------------------------------------------------------
@@ -6,6 +6,7 @@ __license__   = "MIT"
 import os
 import saga as rs
 
+from ...   import utils              as rpu
 from ...   import states             as rps
 from ...   import constants          as rpc
 from ...   import staging_directives as rpsd
@@ -13,6 +14,10 @@ from ...   import staging_directives as rpsd
 from .base import UMGRStagingOutputComponent
 
 
+# interval for collecting completed transfers
+STAGING_COLLECT_TIMER = 0.1
+
+
 # ==============================================================================
 #
 class Default(UMGRStagingOutputComponent):
@@ -22,6 +27,9 @@ class Default(UMGRStagingOutputComponent):
     UMGR_STAGING_OUTPUT_PENDING state, will advance them to UMGR_STAGING_OUTPUT
     state while performing the staging, and then moves then to the respective
     final state.
+
+    The transfers of different units are executed concurrently by
+    a `rpu.TransferPool`, and units are advanced in order of completion.
     """
 
     # --------------------------------------------------------------------------
@@ -35,24 +43,54 @@ class Default(UMGRStagingOutputComponent):
     #
     def initialize_child(self):
 
-        # we keep a cache of SAGA dir handles
-        self._cache = dict()
+        workers = self._cfg.get('staging_transfer_workers',
+                                rpu.DEFAULT_TRANSFER_WORKERS)
+        handles = self._cfg.get('staging_transfer_handles',
+                                rpu.DEFAULT_TRANSFER_HANDLES)
+        backlog = self._cfg.get('staging_transfer_backlog',
+                                rpu.DEFAULT_TRANSFER_BACKLOG)
+
+        # the transfer pool keeps the SAGA dir handles
+        self._pool = rpu.TransferPool(self._session, self._log, self.uid,
+                                      workers, handles, backlog)
 
         self.register_input(rps.UMGR_STAGING_OUTPUT_PENDING, 
                             rpc.UMGR_STAGING_OUTPUT_QUEUE, self.work)
 
         # we don't need an output queue -- units will be final
 
+        # completed units are advanced from the component thread
+        self.register_timed_cb(self._collect_cb, timer=STAGING_COLLECT_TIMER)
+
 
     # --------------------------------------------------------------------------
     #
     def finalize_child(self):
 
-        try:
-            for key in self._cache:
-                self._cache[key].close()
-        except:
-            pass
+        self._pool.close()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _collect_cb(self):
+
+        staged = list()
+        failed = list()
+
+        for unit, error in self._pool.get_done():
+            if error: failed.append(unit)
+            else    : staged.append(unit)
+
+        if failed:
+            self.advance(failed, rps.FAILED, publish=True, push=False)
+
+        # all staging is done -- at this point the units are final
+        if staged:
+            for unit in staged:
+                unit['state'] = unit['target_state']
+            self.advance(staged, publish=True, push=True)
+
+        return True
 
 
     # --------------------------------------------------------------------------
@@ -119,51 +157,46 @@ class Default(UMGRStagingOutputComponent):
                        'pilot'    : unit['pilot_sandbox'], 
                        'resource' : unit['resource_sandbox']}
 
-        # url used for cache (sandbox url w/o path)
-        tmp      = rs.Url(unit["unit_sandbox"])
-        tmp.path = '/'
-        key      = str(tmp)
-
-        if key not in self._cache:
-            self._cache[key] = rs.filesystem.Directory(tmp, 
-                    session=self._session)
-        saga_dir = self._cache[key]
+        # ----------------------------------------------------------------------
+        def _transfer(saga_dir):
+            for sd in actionables:
+                self._transfer(uid, sd, saga_dir, src_context, tgt_context)
+        # ----------------------------------------------------------------------
 
+        self._pool.submit(unit['unit_sandbox'], _transfer, unit)
 
-        # Loop over all transfer directives and execute them.
-        for sd in actionables:
 
-            action = sd['action']
-            flags  = sd['flags']
-            did    = sd['uid']
-            src    = sd['source']
-            tgt    = sd['target']
+    # --------------------------------------------------------------------------
+    #
+    def _transfer(self, uid, sd, saga_dir, src_context, tgt_context):
 
-            self._prof.prof('staging_out_start', uid=uid, msg=did)
+        action = sd['action']
+        flags  = sd['flags']
+        did    = sd['uid']
+        src    = sd['source']
+        tgt    = sd['target']
 
-            self._log.debug('src: %s', src)
-            self._log.debug('tgt: %s', tgt)
+        self._prof.prof('staging_out_start', uid=uid, msg=did)
 
-            src = rpsd.complete_url(src, src_context, self._log)
-            tgt = rpsd.complete_url(tgt, tgt_context, self._log)
+        self._log.debug('src: %s', src)
+        self._log.debug('tgt: %s', tgt)
 
-            self._log.debug('src: %s', src)
-            self._log.debug('tgt: %s', tgt)
+        src = rpsd.complete_url(src, src_context, self._log)
+        tgt = rpsd.complete_url(tgt, tgt_context, self._log)
 
-            # Check if the src is a folder, if true
-            # add recursive flag if not already specified
-            if saga_dir.is_dir(src.path):
-                flags |= rs.filesystem.RECURSIVE
+        self._log.debug('src: %s', src)
+        self._log.debug('tgt: %s', tgt)
 
-            # Always set CREATE_PARENTS
-            flags |= rs.filesystem.CREATE_PARENTS
+        # Check if the src is a folder, if true
+        # add recursive flag if not already specified
+        if saga_dir.is_dir(src.path):
+            flags |= rs.filesystem.RECURSIVE
 
-            saga_dir.copy(src, tgt, flags=flags)
-            self._prof.prof('staging_out_stop', uid=uid, msg=did)
+        # Always set CREATE_PARENTS
+        flags |= rs.filesystem.CREATE_PARENTS
 
-        # all staging is done -- at this point the unit is final
-        unit['state'] = unit['target_state']
-        self.advance(unit, publish=True, push=True)
+        saga_dir.copy(src, tgt, flags=flags)
+        self._prof.prof('staging_out_stop', uid=uid, msg=did)
 
 
 # ------------------------------------------------------------------------------
@@ -288,7 +288,7 @@ class UnitManager(rpu.Component):
 
             self._log.debug('pilot %s is final - pull units', pilot.uid)
 
-            unit_cursor = self.session._dbs._c.find({
+            unit_cursor = self.session._dbs.get_collection('unit').find({
                 'type'    : 'unit',
                 'pilot'   : pilot.uid,
                 'umgr'    : self.uid,
@@ -310,10 +310,11 @@ class UnitManager(rpu.Component):
             #        units.
             uids = [unit['uid'] for unit in units]
 
-            self._session._dbs._c.update({'type'  : 'unit',
-                                          'uid'   : {'$in'     : uids}},
-                                         {'$set'  : {'control' : 'umgr'}},
-                                         multi=True)
+            coll = self._session._dbs.get_collection('unit')
+            coll.update({'type'  : 'unit',
+                         'uid'   : {'$in'     : uids}},
+                        {'$set'  : {'control' : 'umgr'}},
+                        multi=True)
             to_restart = list()
             for unit in units:
 
@@ -377,9 +378,10 @@ class UnitManager(rpu.Component):
         #        to use 'find'.  To avoid finding the same units over and over 
         #        again, we update the 'control' field *before* running the next
         #        find -- so we do it right here.
-        unit_cursor = self.session._dbs._c.find({'type'    : 'unit',
-                                                 'umgr'    : self.uid,
-                                                 'control' : 'umgr_pending'})
+        coll        = self.session._dbs.get_collection('unit')
+        unit_cursor = coll.find({'type'    : 'unit',
+                                 'umgr'    : self.uid,
+                                 'control' : 'umgr_pending'})
 
         if not unit_cursor.count():
             # no units whatsoever...
@@ -390,10 +392,10 @@ class UnitManager(rpu.Component):
         units = list(unit_cursor)
         uids  = [unit['uid'] for unit in units]
 
-        self._session._dbs._c.update({'type'  : 'unit',
-                                      'uid'   : {'$in'     : uids}},
-                                     {'$set'  : {'control' : 'umgr'}},
-                                     multi=True)
+        coll.update({'type'  : 'unit',
+                     'uid'   : {'$in'     : uids}},
+                    {'$set'  : {'control' : 'umgr'}},
+                    multi=True)
 
         self._log.info("units pulled: %4d", len(units))
         self._prof.prof('get', msg="bulk size: %d" % len(units), uid=self.uid)
@@ -972,13 +974,15 @@ class UnitManager(rpu.Component):
             unit_docs = [unit.as_dict()   for unit in units]
             self.advance(unit_docs, state=rps.CANCELED, publish=True, push=True)
 
-        # we *always* issue the cancellation command to the local components
+        # we *always* issue the cancellation command to the local components.
+        # Uids are sent as ranges where possible, to keep bulk cancellation
+        # requests small.
+        arg = rpu.compress_uids(uids)
         self.publish(rpc.CONTROL_PUBSUB, {'cmd' : 'cancel_units', 
-                                          'arg' : {'uids' : uids,
-                                                   'umgr' : self.uid}})
+                                          'arg' : dict(arg, umgr=self.uid)})
 
         # we also inform all pilots about the cancelation request
-        self._session._dbs.pilot_command(cmd='cancel_units', arg={'uids':uids})
+        self._session._dbs.pilot_command(cmd='cancel_units', arg=arg)
 
         # In the default case of calling 'advance' above, we just set the state,
         # so we *know* units are canceled.  But we nevertheless wait until that
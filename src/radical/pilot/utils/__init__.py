@@ -22,9 +22,15 @@ from .prof_utils   import *
 from .misc         import *
 from .queue        import *
 from .pubsub       import *
+from .bridge_host  import *
+from .metrics      import *
+from .unit_store   import *
+from .cancel       import *
 from .session      import *
 from .component    import *
 from .slot_utils   import *
+from .transfer     import *
+from .fs_limit     import *
 
 
 # ------------------------------------------------------------------------------
@@ -0,0 +1,344 @@
+
+__copyright__ = "Copyright 2017, http://radical.rutgers.edu"
+__license__   = "MIT"
+
+
+import zmq
+import copy
+import math
+import msgpack
+import collections
+
+import Queue           as pyq
+import setproctitle    as spt
+import multiprocessing as mp
+
+import radical.utils   as ru
+
+from ..       import constants as rpc
+
+from .misc    import hostip  as rpu_hostip
+from .queue   import _uninterruptible
+from .metrics import Metrics as rpu_Metrics
+
+
+# ------------------------------------------------------------------------------
+#
+_BRIDGE_TIMEOUT  =    10  # how long to wait for the bridge host startup
+_LINGER_TIMEOUT  =   250  # ms to linger after close
+_HIGH_WATER_MARK =     0  # number of messages to buffer before dropping
+_POLL_TIMEOUT    =   100  # ms to wait for messages on any bridge
+_DRAIN_MAX       =  1024  # max messages forwarded per socket and poll cycle
+
+
+# ==============================================================================
+#
+class BridgeHost(ru.Process):
+    """
+    The bridge host runs a set of queue and pubsub bridges in a single process,
+    on a single poll loop.  All bridges are created and bound at once in the
+    child process, and all bridge addresses are reported back to the parent in
+    a single handshake.  Compared to one process per bridge, this saves startup
+    time and memory, at the cost of sharing one CPU core among all bridges.
+
+    The bridges behave like their `Queue` and `Pubsub` counterparts.  Queue
+    bridges honor `stall_hwm`, `bulk_size` and `capacity`, and pubsub bridges
+    forward all pending messages per poll cycle (like the 'drain' mode of
+    `Pubsub` bridges).
+
+    The bridges are passed as dict of bridge configs, indexed by bridge name --
+    the bridge type is derived from the name, as in `Component.start_bridges()`.
+    After construction, `addrs` holds a dict of `[addr_in, addr_out]` pairs,
+    indexed by bridge name.
+
+    If the metrics pubsub is among the hosted bridges, the host publishes
+    message counts and queue depths of all its bridges on that channel, every
+    `metrics_interval` seconds.
+    """
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, session, bridges, log_level=None, metrics_interval=None):
+
+        self._session  = session
+        self._bridges  = copy.deepcopy(bridges)
+        self._level    = log_level
+        self._interval = metrics_interval
+        self._metrics  = None
+
+        self._uid = ru.generate_id('bridge.host')
+        self._log = self._session._get_logger(name=self._uid, level=self._level)
+
+        for bname in self._bridges:
+            if not bname.endswith('queue') and not bname.endswith('pubsub'):
+                raise ValueError('unknown bridge type for %s' % bname)
+
+        self._addrs   = dict()
+        self._ctx     = None
+        self._sockets = dict()   # socket : [bridge name, 'in' | 'out']
+        self._state   = dict()   # bridge name : bridge state
+
+        super(BridgeHost, self).__init__(name=self._uid, log=self._log)
+
+        self._pqueue = mp.Queue()
+        self.start()
+
+        try:
+            addrs = self._pqueue.get(True, _BRIDGE_TIMEOUT)
+
+        except pyq.Empty as e:
+            raise RuntimeError ("bridge host did not come up! (%s)" % e)
+
+        # use the local hostip for bridge addresses
+        for bname, [addr_in, addr_out] in addrs.iteritems():
+            addr_in       = ru.Url(addr_in)
+            addr_out      = ru.Url(addr_out)
+            addr_in.host  = rpu_hostip()
+            addr_out.host = rpu_hostip()
+            self._addrs[bname] = [str(addr_in), str(addr_out)]
+
+        self._log.info('bridge host %s is up (%s)', self._uid,
+                       ', '.join(sorted(self._addrs.keys())))
+
+
+    # --------------------------------------------------------------------------
+    #
+    @property
+    def name(self):
+        return self._uid
+
+    @property
+    def uid(self):
+        return self._uid
+
+    @property
+    def addrs(self):
+        return self._addrs
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _socket(self, stype, hwm=_HIGH_WATER_MARK):
+
+        sock = self._ctx.socket(stype)
+        sock.linger = _LINGER_TIMEOUT
+        sock.hwm    = hwm
+        sock.bind('tcp://*:*')
+
+        return sock
+
+
+    # --------------------------------------------------------------------------
+    #
+    def ru_initialize_child(self):
+
+        self._uid = self._uid + '.child'
+        self._log = self._session._get_logger(name=self._uid, level=self._level)
+
+        spt.setproctitle('rp.%s' % self._uid)
+        self._log.info('start bridge host %s', self._uid)
+
+        self._ctx    = zmq.Context()
+        self._poller = zmq.Poller()
+        self._session._to_destroy.append(self._ctx)
+
+        addrs = dict()
+        for bname, bcfg in self._bridges.iteritems():
+
+            if bname.endswith('queue'):
+                capacity = bcfg.get('capacity') or _HIGH_WATER_MARK
+                b_in     = self._socket(zmq.PULL, hwm=capacity)
+                b_out    = self._socket(zmq.REP)
+                self._state[bname] = {'type'      : 'queue',
+                                      'in'        : b_in,
+                                      'out'       : b_out,
+                                      'hwm'       : bcfg.get('stall_hwm', 1),
+                                      'bulk'      : bcfg.get('bulk_size', 1),
+                                      'capacity'  : capacity,
+                                      'things'    : list(),
+                                      'ready'     : collections.deque(),
+                                      'requested' : False,
+                                      'paused'    : False}
+            else:
+                b_in  = self._socket(zmq.XSUB)
+                b_out = self._socket(zmq.XPUB)
+                self._state[bname] = {'type'      : 'pubsub',
+                                      'in'        : b_in,
+                                      'out'       : b_out}
+
+            self._sockets[b_in ] = [bname, 'in' ]
+            self._sockets[b_out] = [bname, 'out']
+            self._poller.register(b_in,  zmq.POLLIN)
+            self._poller.register(b_out, zmq.POLLIN)
+
+            addrs[bname] = [b_in .getsockopt(zmq.LAST_ENDPOINT),
+                            b_out.getsockopt(zmq.LAST_ENDPOINT)]
+
+            self._log.info('bound bridge %s to %s : %s', bname,
+                           addrs[bname][0], addrs[bname][1])
+
+        # publish metrics directly on the metrics bridge, if we host it
+        if rpc.METRICS_PUBSUB in self._state and self._interval:
+            self._metrics = rpu_Metrics(self._uid, self._publish_metrics,
+                                        interval=self._interval, log=self._log)
+            for bname, state in self._state.iteritems():
+                if state['type'] == 'queue':
+                    self._metrics.gauge('depth.%s' % bname,
+                                        lambda state=state: len(state['ready']))
+
+        # communicate all bridge ports to the parent process at once
+        self._pqueue.put(addrs)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _publish_metrics(self, msg):
+
+        # use the message format of `Pubsub.put()`
+        data = msgpack.packb(msg)
+        sock = self._state[rpc.METRICS_PUBSUB]['out']
+        _uninterruptible(sock.send, '%s %s' % (rpc.METRICS_PUBSUB, data))
+
+
+    # --------------------------------------------------------------------------
+    #
+    def ru_finalize_common(self):
+
+        for sock in self._sockets:
+            sock.close()
+        self._sockets = dict()
+
+        if self._ctx:
+            self._ctx.destroy()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def work_cb(self):
+
+        socks = dict(_uninterruptible(self._poller.poll, timeout=_POLL_TIMEOUT))
+
+        for sock in socks:
+
+            bname, side = self._sockets[sock]
+            state       = self._state[bname]
+
+            if state['type'] == 'pubsub':
+                # forward messages, or subscription requests
+                if side == 'in': n = self._drain(state['in'],  state['out'])
+                else           : n = self._drain(state['out'], state['in'])
+
+            else:
+                if side == 'in': n = self._queue_pull(state)
+                else           : n = self._queue_request(state)
+
+                self._queue_serve(state)
+
+            if self._metrics and side == 'in':
+                self._metrics.count('msgs.%s' % bname, n)
+
+        if self._metrics:
+            self._metrics.flush()
+
+        return True
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _drain(self, src, tgt):
+
+        n = 0
+        while n < _DRAIN_MAX:
+            try:
+                frames = src.recv_multipart(flags=zmq.NOBLOCK, copy=False)
+            except zmq.Again:
+                break
+            _uninterruptible(tgt.send_multipart, frames, copy=False)
+            n += 1
+
+        return n
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _queue_pull(self, state):
+
+        hwm  = state['hwm']
+        bulk = state['bulk']
+        n    = 0
+
+        while n < _DRAIN_MAX:
+
+            if state['capacity'] and len(state['ready']) >= state['capacity']:
+                break
+
+            try:
+                data = state['in'].recv(flags=zmq.NOBLOCK)
+            except zmq.Again:
+                break
+
+            n += 1
+
+            if hwm <= 1 and bulk <= 0:
+                # forward message as is
+                state['ready'].append(data)
+                continue
+
+            # stall messages until reaching the hwm, and then chop them up into
+            # bulks of the given size (see `Queue.work_cb()`)
+            msg = msgpack.unpackb(data)
+            if isinstance(msg, list): state['things'] += msg
+            else                    : state['things'].append(msg)
+
+            if len(state['things']) < hwm:
+                continue
+
+            if bulk <= 0:
+                bulks = [state['things']]
+            else:
+                nbulks = int(math.ceil(len(state['things']) / float(bulk)))
+                bulks  = ru.partition(state['things'], nbulks)
+
+            for b in bulks:
+                state['ready'].append(msgpack.packb(b))
+            state['things'] = list()
+
+        return n
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _queue_request(self, state):
+
+        # REP sockets need to reply before receiving the next request, so we
+        # accept at most one request at a time, and don't poll for further
+        # requests until that one is served
+        if not state['requested']:
+            _uninterruptible(state['out'].recv)
+            self._poller.unregister(state['out'])
+            state['requested'] = True
+
+        return 1
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _queue_serve(self, state):
+
+        if state['requested'] and state['ready']:
+            _uninterruptible(state['out'].send, state['ready'].popleft())
+            self._poller.register(state['out'], zmq.POLLIN)
+            state['requested'] = False
+
+        # stop pulling messages while the queue is at capacity, so that the
+        # producers stall
+        if state['capacity']:
+            full = len(state['ready']) >= state['capacity']
+            if full != state['paused']:
+                if full: self._poller.unregister(state['in'])
+                else   : self._poller.register(state['in'], zmq.POLLIN)
+                state['paused'] = full
+
+
+# ------------------------------------------------------------------------------
+
@@ -0,0 +1,190 @@
+
+__copyright__ = "Copyright 2017, http://radical.rutgers.edu"
+__license__   = "MIT"
+
+
+import re
+import time
+import threading as mt
+
+
+# ------------------------------------------------------------------------------
+#
+CANCEL_TTL = 3600.0  # seconds to keep cancellation requests around
+
+# uids are compressed into ranges if they end in a numerical index
+_UID_INDEX = re.compile(r'^(.*?)(\d+)$')
+
+
+# ------------------------------------------------------------------------------
+#
+def compress_uids(uids):
+    """
+    Compress a list of uids into a cancellation request argument, of the form
+
+        {'uids'   : [uid, ...],
+         'ranges' : [[prefix, first, last, width], ...]}
+
+    where each range stands for all uids `prefix + '%0*d' % (width, idx)` with
+    `first <= idx <= last`.  Uids which don't end in an index, or which are not
+    part of a consecutive sequence, are listed individually.
+    """
+
+    uids   = sorted(set(uids))
+    single = list()
+    ranges = list()
+    groups = dict()   # [prefix, width] : [indexes]
+
+    for uid in uids:
+        match = _UID_INDEX.match(uid)
+        if not match:
+            single.append(uid)
+            continue
+        prefix, idx = match.groups()
+        groups.setdefault((prefix, len(idx)), list()).append(int(idx))
+
+    for (prefix, width), idxs in groups.iteritems():
+
+        idxs.sort()
+        start = 0
+        for i in range(1, len(idxs) + 1):
+
+            if i < len(idxs) and idxs[i] == idxs[i - 1] + 1:
+                continue
+
+            if i - start > 2:
+                ranges.append([prefix, idxs[start], idxs[i - 1], width])
+            else:
+                for idx in idxs[start:i]:
+                    single.append('%s%0*d' % (prefix, width, idx))
+            start = i
+
+    return {'uids'   : single,
+            'ranges' : ranges}
+
+
+# ------------------------------------------------------------------------------
+#
+def expand_uids(arg):
+    """
+    Return the list of uids in a cancellation request argument (see
+    `compress_uids()`).  Plain uid lists and single uids are also accepted.
+    """
+
+    if not arg:
+        return list()
+
+    if isinstance(arg, basestring):
+        return [arg]
+
+    if isinstance(arg, list):
+        return arg
+
+    uids = arg.get('uids') or list()
+    if not isinstance(uids, list):
+        uids = [uids]
+    else:
+        uids = list(uids)
+
+    for prefix, first, last, width in arg.get('ranges', []):
+        uids.extend(['%s%0*d' % (prefix, width, idx)
+                     for idx in xrange(first, last + 1)])
+
+    return uids
+
+
+# ==============================================================================
+#
+class CancelIndex(object):
+    """
+    A thread safe set of uids for which cancellation was requested.  Requests
+    expire after `ttl` seconds (on `expire()`), so that requests for things
+    which never pass by do not accumulate.  Lookups are constant time, and
+    `filter()` splits bulks of things into canceled and other things.
+    """
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, ttl=CANCEL_TTL):
+
+        self._ttl  = ttl
+        self._uids = dict()     # uid : time of request
+        self._lock = mt.Lock()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def __len__(self):
+        return len(self._uids)
+
+
+    def __contains__(self, uid):
+        return uid in self._uids
+
+
+    # --------------------------------------------------------------------------
+    #
+    def add(self, uids):
+
+        now = time.time()
+        with self._lock:
+            for uid in uids:
+                self._uids[uid] = now
+
+
+    # --------------------------------------------------------------------------
+    #
+    def pop(self, uid):
+        """
+        Remove the request for the given uid, and return `True` if one existed.
+        """
+
+        with self._lock:
+            return self._uids.pop(uid, None) is not None
+
+
+    # --------------------------------------------------------------------------
+    #
+    def filter(self, things):
+        """
+        Return a tuple `(things, canceled)` of the given things which are not
+        canceled, and of those which are.  The requests for canceled things are
+        consumed.
+        """
+
+        if not self._uids:
+            return things, list()
+
+        keep     = list()
+        canceled = list()
+        with self._lock:
+            for thing in things:
+                if self._uids.pop(thing['uid'], None) is None:
+                    keep.append(thing)
+                else:
+                    canceled.append(thing)
+
+        return keep, canceled
+
+
+    # --------------------------------------------------------------------------
+    #
+    def expire(self):
+        """
+        Remove all requests older than the ttl, and return their number.
+        """
+
+        if not self._uids or not self._ttl:
+            return 0
+
+        limit = time.time() - self._ttl
+        with self._lock:
+            old = [uid for uid, t in self._uids.iteritems() if t < limit]
+            for uid in old:
+                del(self._uids[uid])
+
+        return len(old)
+
+
+# ------------------------------------------------------------------------------
+
@@ -6,6 +6,8 @@ import time
 import pprint
 import signal
 
+import zmq
+import Queue           as pyq
 import setproctitle    as spt
 import threading       as mt
 import multiprocessing as mp
@@ -18,11 +20,45 @@ from .queue      import Queue          as rpu_Queue
 from .queue      import QUEUE_OUTPUT   as rpu_QUEUE_OUTPUT
 from .queue      import QUEUE_INPUT    as rpu_QUEUE_INPUT
 from .queue      import QUEUE_BRIDGE   as rpu_QUEUE_BRIDGE
+from .queue      import QueueShards    as rpu_QueueShards
+from .queue      import SHARD_KEY_UID  as rpu_SHARD_KEY_UID
+from .queue      import _uninterruptible
 
 from .pubsub     import Pubsub         as rpu_Pubsub
 from .pubsub     import PUBSUB_PUB     as rpu_PUBSUB_PUB
 from .pubsub     import PUBSUB_SUB     as rpu_PUBSUB_SUB
 from .pubsub     import PUBSUB_BRIDGE  as rpu_PUBSUB_BRIDGE
+from .pubsub     import PUBSUB_MODE_PROXY as rpu_PUBSUB_MODE_PROXY
+
+from .bridge_host import BridgeHost as rpu_BridgeHost
+
+from .metrics    import Metrics          as rpu_Metrics
+from .metrics    import METRICS_INTERVAL as rpu_METRICS_INTERVAL
+
+from .unit_store import UnitStore        as rpu_UnitStore
+from .unit_store import STORE_REF        as rpu_STORE_REF
+
+from .cancel     import CancelIndex      as rpu_CancelIndex
+from .cancel     import CANCEL_TTL       as rpu_CANCEL_TTL
+from .cancel     import expand_uids      as rpu_expand_uids
+
+
+# ------------------------------------------------------------------------------
+#
+_POLL_TIMEOUT = 100   # ms to wait for any input to become ready
+_MAX_DRAIN    =  16   # max number of bulks to get from one input at once
+_CANCEL_SWEEP =  60   # seconds between expiry sweeps of the cancel index
+
+# the component types which consume from a queue (to check shard coverage)
+_QUEUE_CONSUMERS = {
+        rpc.AGENT_STAGING_INPUT_QUEUE  : rpc.AGENT_STAGING_INPUT_COMPONENT,
+        rpc.AGENT_SCHEDULING_QUEUE     : rpc.AGENT_SCHEDULING_COMPONENT,
+        rpc.AGENT_EXECUTING_QUEUE      : rpc.AGENT_EXECUTING_COMPONENT,
+        rpc.AGENT_STAGING_OUTPUT_QUEUE : rpc.AGENT_STAGING_OUTPUT_COMPONENT,
+        rpc.UMGR_STAGING_INPUT_QUEUE   : rpc.UMGR_STAGING_INPUT_COMPONENT,
+        rpc.UMGR_SCHEDULING_QUEUE      : rpc.UMGR_SCHEDULING_COMPONENT,
+        rpc.UMGR_STAGING_OUTPUT_QUEUE  : rpc.UMGR_STAGING_OUTPUT_COMPONENT,
+        rpc.PMGR_LAUNCHING_QUEUE       : rpc.PMGR_LAUNCHING_COMPONENT}
 
 
 # ==============================================================================
@@ -121,6 +157,20 @@ class Component(ru.Process):
         This method will return a list of created bridge instances.  It is up to
         the callee to watch those bridges for health and to terminate them as
         needed.
+
+        Queues can be sharded over multiple bridges, by setting `shards` to
+        a value larger than one in the bridge config.  The addresses of all
+        shards are then added to the config as `shard_addrs` (a list of
+        `[addr_in, addr_out]` pairs), and `addr_in` and `addr_out` point to the
+        first shard.  Consumers are assigned to shards by their global instance
+        index (see `start_components()`) -- with `steal` disabled, each shard
+        needs its own consumer, and we raise a `ValueError` if there are fewer
+        consumers (in `cfg` and its sub-agents) than shards.
+
+        If `cfg['bridge_host']` is set (to a config dict for the host, such as
+        `{'log_level' : 'error'}`), all bridges are started in a single
+        `BridgeHost` process.  Sharded queues, pubsubs in 'proxy' mode, and
+        bridges with `hosted` set to `False` are still started individually.
         '''
 
         bspec = cfg.get('bridges', {})
@@ -132,6 +182,34 @@ class Component(ru.Process):
 
         # start all bridges which don't yet have an address
         bridges = list()
+
+        hcfg = cfg.get('bridge_host')
+        if hcfg:
+
+            hosted = dict()
+            for bname,bcfg in bspec.iteritems():
+
+                if bcfg.get('addr_in')                             : continue
+                if not bcfg.get('hosted', True)                    : continue
+                if bcfg.get('shards', 1) > 1                       : continue
+                if bcfg.get('bridge_mode') == rpu_PUBSUB_MODE_PROXY: continue
+
+                hosted[bname] = bcfg
+
+            if hosted:
+                log.info('create bridge host for %s', sorted(hosted.keys()))
+                host = rpu_BridgeHost(session, hosted,
+                                      log_level=hcfg.get('log_level'),
+                                      metrics_interval=cfg.get('metrics_interval',
+                                                           rpu_METRICS_INTERVAL))
+
+                for bname, [addr_in, addr_out] in host.addrs.iteritems():
+                    bspec[bname]['addr_in']  = addr_in
+                    bspec[bname]['addr_out'] = addr_out
+
+                bridges.append(host)
+                log.info('created bridge host %s', host.uid)
+
         for bname,bcfg in bspec.iteritems():
 
             addr_in  = bcfg.get('addr_in')
@@ -148,7 +226,24 @@ class Component(ru.Process):
             bcfg_clone = copy.deepcopy(bcfg)
 
             # The type of bridge (queue or pubsub) is derived from the name.
-            if bname.endswith('queue'):
+            if bname.endswith('queue') and bcfg.get('shards', 1) > 1:
+
+                Component._check_shards(cfg, bname, bcfg, log)
+
+                shard_addrs = list()
+                for _ in range(bcfg['shards']):
+                    bridge = rpu_Queue(session, bname, rpu_QUEUE_BRIDGE, bcfg_clone)
+                    shard_addrs.append([str(bridge.addr_in), str(bridge.addr_out)])
+                    bridges.append(bridge)
+
+                bcfg['shard_addrs'] = shard_addrs
+                bcfg['addr_in']     = shard_addrs[0][0]
+                bcfg['addr_out']    = shard_addrs[0][1]
+
+                log.info('created bridge %s (%d shards)', bname, len(shard_addrs))
+                continue
+
+            elif bname.endswith('queue'):
                 bridge = rpu_Queue(session, bname, rpu_QUEUE_BRIDGE, bcfg_clone)
 
             elif bname.endswith('pubsub'):
@@ -171,6 +266,39 @@ class Component(ru.Process):
         return bridges
 
 
+    # --------------------------------------------------------------------------
+    #
+    @staticmethod
+    def _check_shards(cfg, bname, bcfg, log):
+        '''
+        Make sure that all shards of a sharded queue are drained: without work
+        stealing, this requires at least one consumer per shard.
+        '''
+
+        shards = bcfg['shards']
+        ctype  = _QUEUE_CONSUMERS.get(bname)
+        specs  = [cfg.get('components', {})]
+        specs += [sa.get('components', {})
+                  for sa in cfg.get('agents', {}).values()]
+        count  = sum([spec.get(ctype, {}).get('count', 1)
+                      for spec in specs if ctype in spec])
+
+        if not count:
+            # consumers are not started from this config -- we can't check
+            log.warn('%s: %d shards, consumers unknown', bname, shards)
+            return
+
+        if count >= shards:
+            return
+
+        if not bcfg.get('steal', True):
+            raise ValueError('%s: %d shards but %d consumers - enable steal'
+                            % (bname, shards, count))
+
+        log.warn('%s: %d shards but %d consumers - shards rely on stealing',
+                 bname, shards, count)
+
+
     # --------------------------------------------------------------------------
     #
     @staticmethod
@@ -184,6 +312,10 @@ class Component(ru.Process):
         This method will return a list of created component instances.  It is up
         to the callee to watch those components for health and to terminate them
         as needed.  
+
+        Each component gets a `number` (its index among the components of the
+        same type in `cfg`), and an `index` which is unique over all agents
+        (offset by `cfg['component_offsets'][type]`, if set).
         '''
 
         # ----------------------------------------------------------------------
@@ -239,6 +371,8 @@ class Component(ru.Process):
                 tmp_cfg = copy.deepcopy(cfg)
                 tmp_cfg['cname']      = cname
                 tmp_cfg['number']     = i
+                tmp_cfg['index']      = i + cfg.get('component_offsets', {})\
+                                                   .get(cname, 0)
                 tmp_cfg['owner']      = cfg.get('uid', session.uid)
 
                 # avoid recursion - but keep bridge information around.  
@@ -306,17 +440,25 @@ class Component(ru.Process):
         self._ctype      = "%s.%s" % (self.__class__.__module__,
                                       self.__class__.__name__)
         self._number     = cfg.get('number', 0)
+        self._index      = cfg.get('index', self._number)
         self._name       = cfg.get('name.%s' %  self._number,
                                    '%s.%s'   % (self._ctype, self._number))
 
         self._bridges    = list()       # communication bridges
         self._components = list()       # sub-components
         self._inputs     = dict()       # queues to get things from
+        self._poller     = None         # poller for all input queues
+        self._idle       = False        # last poll returned no things
         self._outputs    = dict()       # queues to send things to
         self._workers    = dict()       # methods to work on things
         self._publishers = dict()       # channels to send notifications to
         self._threads    = dict()       # subscriber and idler threads
         self._cb_lock    = mt.RLock()   # guard threaded callback invokations
+        self._put_lock   = mt.RLock()   # guard sockets used by worker threads
+        self._worker_pool = list()      # worker thread pool (optional)
+        self._metrics    = None         # metrics collection (optional)
+        self._store      = None         # unit store for handles (optional)
+        self._cancel_idx = None         # uids of things to cancel
 
         if self._owner == self.uid:
             self._owner = 'root'
@@ -410,8 +552,9 @@ class Component(ru.Process):
     #
     def _cancel_monitor_cb(self, topic, msg):
         """
-        We listen on the control channel for cancel requests, and append any
-        found UIDs to our cancel list.
+        We listen on the control channel for cancel requests, and add any found
+        UIDs to our cancel index.  Requests can list uids individually or as
+        uid ranges (see `rpu.compress_uids()`).
         """
 
         self.is_valid()
@@ -428,15 +571,10 @@ class Component(ru.Process):
 
         if cmd == 'cancel_units':
 
-            uids = arg['uids']
-
-            if not isinstance(uids, list):
-                uids = [uids]
-
-            self._log.debug('register for cancellation: %s', uids)
+            uids = rpu_expand_uids(arg)
 
-            with self._cancel_lock:
-                self._cancel_list += uids
+            self._log.debug('register %d uids for cancellation', len(uids))
+            self._cancel_idx.add(uids)
 
         if cmd == 'terminate':
             self._log.info('got termination command')
@@ -575,6 +713,23 @@ class Component(ru.Process):
         self.register_publisher(rpc.STATE_PUBSUB)
         self.register_publisher(rpc.CONTROL_PUBSUB)
 
+        # if a metrics channel exists, we periodically publish metrics on it --
+        # but only from the process which does the actual work
+        interval = self._cfg.get('metrics_interval', rpu_METRICS_INTERVAL)
+        if  rpc.METRICS_PUBSUB in self._cfg['bridges'] and interval \
+            and (self._ru_is_child or not self._ru_spawned):
+            self.register_publisher(rpc.METRICS_PUBSUB)
+            self._metrics = rpu_Metrics(self.uid, self._publish_metrics,
+                                        interval=interval, log=self._log)
+            self._metrics.gauge('backlog', self._get_backlog)
+            self._metrics.gauge('full',    self._get_full_outputs)
+            self.register_timed_cb(self._metrics_cb, timer=interval)
+
+        # if a unit store is configured, units are passed over queues as
+        # handles (see `UnitStore`)
+        if self._cfg.get('unit_store'):
+            self._store = rpu_UnitStore(self._cfg['unit_store'], log=self._log)
+
         # call component level initialize
         self.initialize_common()
 
@@ -585,6 +740,39 @@ class Component(ru.Process):
         pass # can be overloaded
 
 
+    # --------------------------------------------------------------------------
+    #
+    def _metrics_cb(self):
+
+        self._metrics.flush(force=True)
+        return True
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _publish_metrics(self, msg):
+
+        self.publish(rpc.METRICS_PUBSUB, msg)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _get_backlog(self):
+
+        # number of bulks waiting for a worker thread
+        return sum([q.qsize() for _, q in self._worker_pool])
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _get_full_outputs(self):
+
+        # names of output queues which currently stall producers
+        with self._put_lock:
+            return sorted(set([q.qname for q in self._outputs.values()
+                                       if  q and q.is_full()]))
+
+
     # --------------------------------------------------------------------------
     #
     def ru_initialize_parent(self):
@@ -615,10 +803,29 @@ class Component(ru.Process):
             sys.stderr = open("%s.err" % self.uid, "w")
 
 
-        # set controller callback to handle cancellation requests
-        self._cancel_list = list()
-        self._cancel_lock = mt.RLock()
+        # set controller callback to handle cancellation requests.  Requests
+        # for things we never see expire after `cancel_ttl` seconds.
+        self._cancel_idx = rpu_CancelIndex(ttl=self._cfg.get('cancel_ttl',
+                                                             rpu_CANCEL_TTL))
         self.register_subscriber(rpc.CONTROL_PUBSUB, self._cancel_monitor_cb)
+        self.register_timed_cb(self._cancel_expire_cb, timer=_CANCEL_SWEEP)
+
+        # don't use the lock inherited over the fork
+        self._put_lock = mt.RLock()
+
+        # if so configured, worker methods are invoked on a pool of threads
+        # (see `work_cb()`).  Each thread has its own backlog of bulks.
+        self._worker_pool = list()
+        for i in range(self._cfg.get('worker_threads', 0)):
+            q = pyq.Queue()
+            t = mt.Thread(target=self._pool_worker, args=[q],
+                          name='%s.worker.%d' % (self.uid, i))
+            t.daemon = True
+            t.start()
+            self._worker_pool.append([t, q])
+
+        if self._worker_pool:
+            self._log.info('use %d worker threads', len(self._worker_pool))
 
         # call component level initialize
         self.initialize_child()
@@ -659,6 +866,11 @@ class Component(ru.Process):
                 comp.stop()
             self._components = list()
 
+            # no more things to pack or unpack
+            if self._store:
+                self._store.close()
+                self._store = None
+
           # #  FIXME: the stuff below caters to unsuccessful or buggy termination
           # #         routines - but for now all those should be served by the
           # #         respective unregister routines.
@@ -702,6 +914,13 @@ class Component(ru.Process):
     #
     def ru_finalize_child(self):
 
+        # let the worker threads complete their backlog
+        for t, q in self._worker_pool:
+            q.put(None)
+        for t, q in self._worker_pool:
+            t.join()
+        self._worker_pool = list()
+
         # call component level finalize
         self.finalize_child()
 
@@ -747,6 +966,12 @@ class Component(ru.Process):
 
         Worker invocation is synchronous, ie. the main event loop will only
         check for the next thing once the worker method returns.
+
+        If the queue is sharded, the component attaches to the shard
+        `index % shards`, where `index` is the component's instance index over
+        all agents.  Unless `steal` is disabled in the bridge config, the
+        component will also attach to all other shards, but will only request
+        things from those when its own shard runs dry (work stealing).
         """
 
         self.is_valid()
@@ -759,13 +984,28 @@ class Component(ru.Process):
         if name in self._inputs:
             raise ValueError('input %s already registered' % name)
 
-        # get address for the queue
-        addr = self._cfg['bridges'][input]['addr_out']
-        self._log.debug("using addr %s for input %s", addr, input)
+        # get address for the queue (or for the shards of the queue)
+        bcfg   = self._cfg['bridges'][input]
+        addrs  = [shard[1] for shard in bcfg.get('shard_addrs', [])]
+        addrs  = addrs or [bcfg['addr_out']]
+        home   = self._index % len(addrs)
+        steal  = list()
+        self._log.debug("using addr %s for input %s", addrs[home], input)
+
+        q = rpu_Queue(self._session, input, rpu_QUEUE_OUTPUT, self._cfg,
+                      addr=addrs[home])
+
+        if bcfg.get('steal', True):
+            for idx, addr in enumerate(addrs):
+                if idx != home:
+                    steal.append(rpu_Queue(self._session, input,
+                                           rpu_QUEUE_OUTPUT, self._cfg,
+                                           addr=addr))
 
-        q = rpu_Queue(self._session, input, rpu_QUEUE_OUTPUT, self._cfg, addr=addr)
         self._inputs[name] = {'queue'  : q,
+                              'steal'  : steal,
                               'states' : states}
+        self._poller       = None   # add new input to poller
 
         self._log.debug('registered input %s', name)
 
@@ -803,7 +1043,10 @@ class Component(ru.Process):
             return
 
         self._inputs[name]['queue'].stop()
+        for q in self._inputs[name]['steal']:
+            q.stop()
         del(self._inputs[name])
+        self._poller = None   # remove input from poller
         self._log.debug('unregistered input %s', name)
 
         for state in states:
@@ -850,11 +1093,20 @@ class Component(ru.Process):
                 self._outputs[state] = None
             else:
                 # get address for the queue
-                addr = self._cfg['bridges'][output]['addr_in']
+                bcfg = self._cfg['bridges'][output]
+                addr = bcfg['addr_in']
                 self._log.debug("using addr %s for output %s", addr, output)
 
-                # non-final state, ie. we want a queue to push to
-                q = rpu_Queue(self._session, output, rpu_QUEUE_INPUT, self._cfg, addr=addr)
+                # non-final state, ie. we want a queue to push to -- for
+                # sharded queues, we push to all shards.
+                if bcfg.get('shard_addrs'):
+                    addrs = [shard[0] for shard in bcfg['shard_addrs']]
+                    key   = bcfg.get('shard_key', rpu_SHARD_KEY_UID)
+                    q     = rpu_QueueShards(self._session, output, self._cfg,
+                                            addrs, key=key)
+                else:
+                    q = rpu_Queue(self._session, output, rpu_QUEUE_INPUT,
+                                  self._cfg, addr=addr)
                 self._outputs[state] = q
 
                 self._log.debug('registered output    : %s : %s : %s' \
@@ -1195,10 +1447,10 @@ class Component(ru.Process):
         """
         This is the main routine of the component, as it runs in the component
         process.  It will first initialize the component in the process context.
-        Then it will attempt to get new things from all input queues
-        (round-robin).  For each thing received, it will route that thing to the
-        respective worker method.  Once the thing is worked upon, the next
-        attempt on getting a thing is up.
+        Then it will wait for things to arrive on any of the input queues (which
+        are all registered with a single poller), and will drain all inputs
+        which are ready.  Things are sorted into buckets by state, and each
+        bucket is routed to the respective worker method as a bulk.
         """
 
         self.is_valid()
@@ -1208,76 +1460,193 @@ class Component(ru.Process):
             time.sleep(0.1)
             return True
 
+        # (re)create the poller if the set of inputs changed
+        if not self._poller:
+            self._poller    = zmq.Poller()
+            self._poll_map  = dict()
+            for name in self._inputs:
+                q = self._inputs[name]['queue']
+                self._poller.register(q.socket, zmq.POLLIN)
+                self._poll_map[q.socket] = [name, q, _MAX_DRAIN]
+                for q in self._inputs[name]['steal']:
+                    self._poller.register(q.socket, zmq.POLLIN)
+                    self._poll_map[q.socket] = [name, q, 1]
+
+        # make sure requests are pending on all inputs, then wait for any of
+        # them to deliver.  Other shards of sharded inputs are only asked for
+        # things when the last poll came up empty, and we only take a single
+        # bulk from those at a time.
         for name in self._inputs:
-            input  = self._inputs[name]['queue']
+            self._inputs[name]['queue'].request()
+            if self._idle:
+                for q in self._inputs[name]['steal']:
+                    q.request()
+
+        events = _uninterruptible(self._poller.poll, _POLL_TIMEOUT)
+        self._idle = not events
+        if not events:
+            return True
+
+        # the worker target depends on the state of things, so we need to sort
+        # the things into buckets by state before pushing them
+        buckets = dict()
+        invalid = list()
+        for sock, _ in events:
+
+            name, input, drain = self._poll_map[sock]
             states = self._inputs[name]['states']
 
-            # FIXME: a simple, 1-thing caching mechanism would likely
-            #        remove the req/res overhead completely (for any
-            #        non-trivial worker).
-            things = input.get_nowait(1000) # timeout in microseconds
+            for _ in range(drain):
 
-            if not things:
-                return True
+                things = input.get_nowait(0)
+                if not things:
+                    break
+
+                if not isinstance(things, list):
+                    things = [things]
+
+                if self._store:
+                    things = self._store.unpack(things)
+
+                if self._metrics:
+                    self._metrics.bulk('get', len(things))
+
+                # canceled things are dropped right here
+                if self._cancel_idx:
+                    things, canceled = self._cancel_idx.filter(things)
+                    if canceled:
+                        self._cancel(canceled)
+
+                for thing in things:
+                    state = thing['state']
+                    if state not in states:
+                        invalid.append(thing)
+                        continue
+                    if state not in buckets:
+                        buckets[state] = list()
+                    buckets[state].append(thing)
+
+        if invalid:
+            # this is not fatal -- only the 'things' fail, not the component
+            self._log.error('%d things in inconsistent state', len(invalid))
+            self.advance(invalid, rps.FAILED, publish=True, push=False)
+
+        if self._prof.enabled:
+            for things in buckets.itervalues():
+                for thing in things:
+                    self._prof.prof('get', uid=thing['uid'], state=thing['state'])
+
+        # We now can push bulks of things to the workers
+        for state,things in buckets.iteritems():
+
+            assert(state in self._workers), 'no worker for state %s' % state
+
+            self._log.debug('got %d things for %s', len(things), state)
+
+            if self._metrics:
+                self._metrics.count('get.%s' % state, len(things))
+
+            if self._worker_pool:
+                # things are partitioned over the worker threads by uid, so
+                # that the order of operations on any thing is preserved
+                n     = len(self._worker_pool)
+                parts = [list() for _ in range(n)]
+                for thing in things:
+                    parts[hash(thing['uid']) % n].append(thing)
+                for idx,part in enumerate(parts):
+                    if part:
+                        self._worker_pool[idx][1].put([state, part])
+                continue
 
-            if not isinstance(things, list):
-                things = [things]
+            try:
+                start = time.time()
+                with self._cb_lock:
+                    self._workers[state](things)
 
-            # the worker target depends on the state of things, so we 
-            # need to sort the things into buckets by state before 
-            # pushing them
-            buckets = dict()
-            for thing in things:
-                
-                state = thing['state']
-                uid   = thing['uid']
-                self._prof.prof('get', uid=uid, state=state)
+                if self._metrics:
+                    self._metrics.sample('worker.%s' % state, time.time() - start)
 
-                if not state in buckets:
-                    buckets[state] = list()
-                buckets[state].append(thing)
+            except Exception as e:
 
-            # We now can push bulks of things to the workers
+                # this is not fatal -- only the 'things' fail, not
+                # the component
+                self._log.exception("worker %s failed", self._workers[state])
+                self.advance(things, rps.FAILED, publish=True, push=False)
 
-            for state,things in buckets.iteritems():
 
-                assert(state in states), 'inconsistent state'
-                assert(state in self._workers), 'no worker for state %s' % state
+        # keep work_cb registered
+        return True
 
-                try:
-                    to_cancel = list()
-                    for thing in things:
-                        uid   = thing['uid']
-                        ttype = thing['type']
-                        state = thing['state']
 
-                        # FIXME: this can become expensive over time
-                        #        if the cancel list is never cleaned
-                        if uid in self._cancel_list:
-                            with self._cancel_lock:
-                                self._cancel_list.remove(uid)
-                            to_cancel.append(thing)
+    # --------------------------------------------------------------------------
+    #
+    def _cancel(self, things):
+        """
+        Move things to `CANCELED` which got canceled before reaching a worker.
+        Things which hold resources (slots) get those released.
+        """
 
-                        self._log.debug('got %s (%s)', ttype, uid)
+        self._log.debug('drop %d canceled things', len(things))
 
-                    if to_cancel:
-                        self.advance(to_cancel, rps.CANCELED, publish=True, push=False)
+        if rpc.AGENT_UNSCHEDULE_PUBSUB in self._publishers:
+            for thing in things:
+                if thing.get('slots'):
+                    self.publish(rpc.AGENT_UNSCHEDULE_PUBSUB, thing)
 
-                    with self._cb_lock:
-                        self._workers[state](things)
+        self.advance(things, rps.CANCELED, publish=True, push=False)
 
-                except Exception as e:
 
-                    # this is not fatal -- only the 'things' fail, not
-                    # the component
-                    self._log.exception("worker %s failed", self._workers[state])
-                    self.advance(things, rps.FAILED, publish=True, push=False)
+    # --------------------------------------------------------------------------
+    #
+    def _cancel_expire_cb(self):
 
+        n = self._cancel_idx.expire()
+        if n:
+            self._log.debug('expired %d cancellation requests', n)
 
-        # keep work_cb registered
         return True
 
 
+    # --------------------------------------------------------------------------
+    #
+    def _pool_worker(self, q):
+        """
+        Thread pool mode: invoke the worker methods for bulks of things, outside
+        of the callback lock.  Components should only enable `worker_threads` if
+        their worker methods are thread safe.  Things which got canceled while
+        waiting in the backlog are not passed to the worker.
+        """
+
+        while True:
+
+            item = q.get()
+            if item is None:
+                break
+
+            state, things = item
+
+            try:
+                if self._cancel_idx:
+                    things, canceled = self._cancel_idx.filter(things)
+                    if canceled:
+                        self._cancel(canceled)
+
+                if things:
+                    start = time.time()
+                    self._workers[state](things)
+
+                    if self._metrics:
+                        self._metrics.sample('worker.%s' % state,
+                                             time.time() - start)
+
+            except Exception as e:
+
+                # this is not fatal -- only the 'things' fail, not
+                # the component
+                self._log.exception("worker %s failed", self._workers[state])
+                self.advance(things, rps.FAILED, publish=True, push=False)
+
+
     # --------------------------------------------------------------------------
     #
     def advance(self, things, state=None, publish=True, push=False,
@@ -1337,6 +1706,10 @@ class Component(ru.Process):
                 buckets[_state] = list()
             buckets[_state].append(thing)
 
+        if self._metrics:
+            for _state,_things in buckets.iteritems():
+                self._metrics.count('advance.%s' % _state, len(_things))
+
         # should we publish state information on the state pubsub?
         if publish:
 
@@ -1347,11 +1720,13 @@ class Component(ru.Process):
             # If '$set' is set, we also publish all keys listed in there.
             # In all other cases, we only send 'uid', 'type' and 'state'.
             for thing in things:
-                if '$all' in thing:
-                    del(thing['$all'])
-                    to_publish.append(thing)
-
-                elif thing['state'] in rps.FINAL:
+                if '$all' in thing or thing['state'] in rps.FINAL:
+                    if '$all' in thing:
+                        del(thing['$all'])
+                    if rpu_STORE_REF in thing:
+                        # store references are agent internal
+                        thing = dict(thing)
+                        del(thing[rpu_STORE_REF])
                     to_publish.append(thing)
 
                 else:
@@ -1409,9 +1784,13 @@ class Component(ru.Process):
 
                 output = self._outputs[_state]
 
-                # push the thing down the drain
+                # push the thing down the drain -- as handles if we can
                 self._log.debug('put bulk %s: %s', _state, len(_things))
-                output.put(_things)
+                with self._put_lock:
+                    if self._store:
+                        output.put(self._store.pack(_things))
+                    else:
+                        output.put(_things)
 
                 ts = time.time()
                 for thing in _things:
@@ -1435,7 +1814,8 @@ class Component(ru.Process):
         if not self._publishers[pubsub]:
             raise RuntimeError("no route for '%s' notification: %s" % (pubsub, msg))
 
-        self._publishers[pubsub].put(pubsub, msg)
+        with self._put_lock:
+            self._publishers[pubsub].put(pubsub, msg)
 
 
 
@@ -11,6 +11,18 @@ from   radical.pilot.states import *
 
 _CACHE_BASEDIR = '/tmp/rp_cache_%d/' % os.getuid ()
 
+# session storage layouts: with the 'shared' layout, all documents of
+# a session live in one collection (named after the session ID).  With the
+# 'split' layout, pilot and unit documents live in separate collections
+# (`<sid>.pilot` and `<sid>.unit`), and only the session, pmgr and umgr docs
+# remain in the session collection.  The layout is recorded in the session doc.
+DB_LAYOUT_SHARED = 'shared'
+DB_LAYOUT_SPLIT  = 'split'
+DB_LAYOUTS       = [DB_LAYOUT_SHARED, DB_LAYOUT_SPLIT]
+
+# document types which get their own collection in the 'split' layout
+DB_SPLIT_TYPES   = ['pilot', 'unit']
+
 
 # ------------------------------------------------------------------------------
 #
@@ -40,7 +52,61 @@ def bson2json (bson_data) :
 def get_session_ids(db) :
 
     # this is not bein cashed, as the session list can and will change freqently
-    return db.collection_names(include_system_collections=False)
+    # -- we skip the per-type collections of sessions with 'split' layout
+    return [name for name in db.collection_names(include_system_collections=False)
+                 if  name.rsplit('.', 1)[-1] not in DB_SPLIT_TYPES]
+
+
+# ------------------------------------------------------------------------------
+#
+def get_session_layout(db, sid) :
+
+    doc = db[sid].find_one({'type' : 'session', 
+                            'uid'  : sid}, ['layout'])
+
+    if doc and doc.get('layout'):
+        return doc['layout']
+
+    return DB_LAYOUT_SHARED
+
+
+# ------------------------------------------------------------------------------
+#
+def get_session_collections(db, sid, layout=None) :
+    """
+    Return a dict of collections for the session, indexed by document type
+    ('session', 'pmgr', 'umgr', 'pilot', 'unit').  If no layout is given, it is
+    looked up in the session doc.
+    """
+
+    if not layout:
+        layout = get_session_layout(db, sid)
+
+    if layout not in DB_LAYOUTS:
+        raise ValueError('invalid db layout %s for session %s' % (layout, sid))
+
+    coll  = db[sid]
+    colls = {'session' : coll,
+             'pmgr'    : coll,
+             'umgr'    : coll,
+             'pilot'   : coll,
+             'unit'    : coll}
+
+    if layout == DB_LAYOUT_SPLIT:
+        for ttype in DB_SPLIT_TYPES:
+            colls[ttype] = db['%s.%s' % (sid, ttype)]
+
+    return colls
+
+
+# ------------------------------------------------------------------------------
+#
+def drop_session(db, sid) :
+
+    # drop all collections which may belong to the session
+    db.drop_collection(sid)
+    for ttype in DB_SPLIT_TYPES:
+        db.drop_collection('%s.%s' % (sid, ttype))
 
 
 # ------------------------------------------------------------------------------
@@ -78,11 +144,10 @@ def get_session_docs(db, sid, cache=None, cachedir=None) :
     json_data = dict()
 
     # convert bson to json, i.e. serialize the ObjectIDs into strings.
-    json_data['session'] = bson2json(list(db[sid].find({'type' : 'session'})))
-    json_data['pmgr'   ] = bson2json(list(db[sid].find({'type' : 'pmgr'   })))
-    json_data['pilot'  ] = bson2json(list(db[sid].find({'type' : 'pilot'  })))
-    json_data['umgr'   ] = bson2json(list(db[sid].find({'type' : 'umgr'   })))
-    json_data['unit'   ] = bson2json(list(db[sid].find({'type' : 'unit'   })))
+    colls = get_session_collections(db, sid)
+    for ttype in ['session', 'pmgr', 'pilot', 'umgr', 'unit']:
+        docs = colls[ttype].find({'type' : ttype})
+        json_data[ttype] = bson2json(list(docs))
 
     if  len(json_data['session']) == 0 :
         raise ValueError ('no session %s in db (was `cleanup` disabled on `session.close()`?)' % sid)
@@ -94,14 +159,12 @@ def get_session_docs(db, sid, cache=None, cachedir=None) :
     json_data['session'] = json_data['session'][0]
 
     # we want to add a list of handled units to each pilot doc
-    for pilot in json_data['pilot'] :
+    unit_ids = dict()
+    for unit in json_data['unit'] :
+        unit_ids.setdefault(unit['pilot'], list()).append(unit['uid'])
 
-        pilot['unit_ids'] = list()
-
-        for unit in json_data['unit'] :
-
-            if  unit['pilot'] == pilot['uid']:
-                pilot['unit_ids'].append (unit['uid'])
+    for pilot in json_data['pilot'] :
+        pilot['unit_ids'] = unit_ids.get(pilot['uid'], list())
 
     # if we got here, we did not find a cached version -- thus add this dataset
     # to the cache
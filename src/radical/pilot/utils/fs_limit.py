@@ -0,0 +1,88 @@
+
+__copyright__ = "Copyright 2017, http://radical.rutgers.edu"
+__license__   = "MIT"
+
+
+import os
+import contextlib
+import threading as mt
+
+
+# ------------------------------------------------------------------------------
+#
+def get_fs_id(path):
+    """
+    File systems are identified by the device ID of the closest existing
+    parent directory of a path.  Returns `None` if that cannot be determined.
+    """
+
+    while path and not os.path.exists(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+
+    try:
+        return os.stat(path).st_dev
+    except OSError:
+        return None
+
+
+# ==============================================================================
+#
+class FSLimiter(object):
+    """
+    A thread safe limit for the number of concurrent operations per file
+    system, to avoid thrashing (shared) file systems with too many concurrent
+    staging operations.  Use as:
+
+        limiter = FSLimiter(4)
+        with limiter.occupy(src, tgt):
+            shutil.copy(src, tgt)
+    """
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, limit):
+
+        self._limit = limit
+        self._sems  = dict()     # file system id : semaphore
+        self._lock  = mt.Lock()  # protect self._sems
+
+
+    # --------------------------------------------------------------------------
+    #
+    def get_sem(self, path):
+        """
+        Return the semaphore which limits concurrent operations on the file
+        system the given path lives on.
+        """
+
+        fs = get_fs_id(path)
+
+        with self._lock:
+            if fs not in self._sems:
+                self._sems[fs] = mt.Semaphore(self._limit)
+            return self._sems[fs]
+
+
+    # --------------------------------------------------------------------------
+    #
+    @contextlib.contextmanager
+    def occupy(self, *paths):
+        """
+        Occupy a slot on the file systems of all given paths.
+        """
+
+        sems = set([self.get_sem(path) for path in paths])
+        sems = sorted(sems, key=id)   # avoid lock order deadlocks
+
+        for sem in sems: sem.acquire()
+        try:
+            yield
+        finally:
+            for sem in reversed(sems): sem.release()
+
+
+# ------------------------------------------------------------------------------
+
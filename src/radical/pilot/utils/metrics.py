@@ -0,0 +1,146 @@
+
+__copyright__ = "Copyright 2017, http://radical.rutgers.edu"
+__license__   = "MIT"
+
+
+import time
+import bisect
+import threading as mt
+
+
+# ------------------------------------------------------------------------------
+#
+METRICS_INTERVAL = 5.0   # seconds between metrics publications
+
+# upper bounds of latency histogram buckets (ms) -- the last histogram bucket
+# counts all samples above the last bound
+LATENCY_BUCKETS  = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+
+
+# ==============================================================================
+#
+class Metrics(object):
+    """
+    Collects metrics for a component or bridge, and periodically publishes
+    snapshots of them.  Metrics come in four flavors:
+
+      - counters  : `count(name, n)`  - number of events (things, messages)
+      - bulks     : `bulk(name, size)`- number, total and max size of bulks
+      - latencies : `sample(name, t)` - histogram of durations (in seconds)
+      - gauges    : `gauge(name, cb)` - callables evaluated on publication
+
+    Counters, bulks and latencies are reset on each publication, so that the
+    published values always refer to the last interval.  Snapshots are passed
+    as `{'cmd' : 'metrics', 'arg' : snapshot}` to the `publish` callable.
+    """
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, uid, publish, interval=METRICS_INTERVAL, log=None):
+
+        self._uid      = uid
+        self._publish  = publish
+        self._interval = interval
+        self._log      = log
+        self._lock     = mt.Lock()
+        self._gauges   = dict()
+
+        self._reset(time.time())
+
+
+    # --------------------------------------------------------------------------
+    #
+    @property
+    def interval(self):
+        return self._interval
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _reset(self, now):
+
+        self._start    = now
+        self._counters = dict()
+        self._bulks    = dict()
+        self._hists    = dict()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def count(self, name, n=1):
+
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+
+    # --------------------------------------------------------------------------
+    #
+    def bulk(self, name, size):
+
+        with self._lock:
+            if name not in self._bulks:
+                self._bulks[name] = [0, 0, 0]
+            entry     = self._bulks[name]
+            entry[0] += 1
+            entry[1] += size
+            entry[2]  = max(entry[2], size)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def sample(self, name, duration):
+
+        idx = bisect.bisect_left(LATENCY_BUCKETS, duration * 1000)
+
+        with self._lock:
+            if name not in self._hists:
+                self._hists[name] = [0] * (len(LATENCY_BUCKETS) + 1)
+            self._hists[name][idx] += 1
+
+
+    # --------------------------------------------------------------------------
+    #
+    def gauge(self, name, cb):
+
+        with self._lock:
+            self._gauges[name] = cb
+
+
+    # --------------------------------------------------------------------------
+    #
+    def flush(self, force=False):
+        """
+        Publish a snapshot if the metrics interval passed (or if `force` is
+        set), and reset the metrics.
+        """
+
+        now = time.time()
+
+        with self._lock:
+
+            if not force and now - self._start < self._interval:
+                return
+
+            snapshot = {'uid'      : self._uid,
+                        'time'     : now,
+                        'interval' : now - self._start,
+                        'counters' : self._counters,
+                        'bulks'    : self._bulks,
+                        'latency'  : self._hists,
+                        'gauges'   : dict()}
+            gauges   = self._gauges.items()
+            self._reset(now)
+
+        for name, cb in gauges:
+            try:
+                snapshot['gauges'][name] = cb()
+            except Exception:
+                if self._log:
+                    self._log.exception('metrics gauge %s failed', name)
+
+        self._publish({'cmd' : 'metrics',
+                       'arg' : snapshot})
+
+
+# ------------------------------------------------------------------------------
+
@@ -32,6 +32,34 @@ def tail(txt, maxlen=MAX_IO_LOGLENGTH):
         return txt
 
 
+# ------------------------------------------------------------------------------
+#
+def tail_file(path, maxlen=MAX_IO_LOGLENGTH):
+
+    # same as `tail()`, but for file content.  Only the end of the file is
+    # read, so that cost and memory consumption do not depend on the file size.
+    # Invalid UTF-8 sequences are replaced -- but if the data look binary, we
+    # return `None`.
+
+    maxbytes = 4 * maxlen   # UTF-8 uses up to 4 bytes per character
+
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        f.seek(max(0, size - maxbytes))
+        data = f.read(maxbytes)
+
+    if '\0' in data:
+        return None
+
+    txt = data.decode('utf-8', 'replace')
+
+    if size > maxbytes and len(txt) <= maxlen:
+        return "[... CONTENT SHORTENED ...]\n%s" % txt
+    else:
+        return tail(txt, maxlen)
+
+
 # ------------------------------------------------------------------------------
 #
 def get_rusage():
@@ -1,6 +1,10 @@
 
 import os
 import glob
+import time
+import errno
+import Queue
+import threading
 
 import radical.utils               as ru
 from   radical.pilot import states as rps
@@ -224,4 +228,110 @@ def get_session_description(sid, src=None, dburl=None):
 
 
 # ------------------------------------------------------------------------------
+#
+# interval for merging unit profiles (seconds)
+PROFILE_MERGE_INTERVAL = 1.0
+
+
+# ==============================================================================
+#
+class ProfileMerger(object):
+    """
+    The profile merger appends unit profiles (as written by the unit launch
+    scripts) to a single profile file.  Unit profiles use the same format as
+    component profiles, and are thus not parsed, but copied verbatim.  That
+    happens in a separate thread, which collects all unit profiles added since
+    its last run, and appends them to the target profile in a single write.
+    The target profile starts with the `ru.Profiler` header and time sync
+    entry.  On `close()`, pending unit profiles are merged, and the target
+    profile is terminated with an `END` event.
+    """
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, path, name, log, interval=PROFILE_MERGE_INTERVAL):
+
+        self._path     = path
+        self._name     = name
+        self._log      = log
+        self._interval = interval
+
+        self._queue    = Queue.Queue()
+        self._term     = threading.Event()
+        self._thread   = threading.Thread(target=self._merge,
+                                          name='%s.merger' % name)
+        self._thread.daemon = True
+        self._thread.start()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def add(self, path):
+
+        self._queue.put(path)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def close(self):
+
+        self._term.set()
+        self._thread.join()
 
+
+    # --------------------------------------------------------------------------
+    #
+    def _merge(self):
+
+        try:
+            with open(self._path, 'a') as out:
+
+                # write the same header and time sync entry as `ru.Profiler`.
+                # We sync with the system time: the clock correction for this
+                # host is derived from the component profiles.
+                now = time.time()
+                out.write('#%s\n' % ','.join(ru.Profiler.fields))
+                out.write('%.4f,sync_abs,%s,MainThread,,,%s:%s:%s:%s:sys\n'
+                         % (now, self._name, ru.get_hostname(),
+                            ru.get_hostip(), now, now))
+
+                while True:
+
+                    term = self._term.wait(self._interval)
+
+                    paths = list()
+                    while True:
+                        try:
+                            paths.append(self._queue.get_nowait())
+                        except Queue.Empty:
+                            break
+
+                    blocks = list()
+                    for path in paths:
+                        try:
+                            with open(path, 'r') as f:
+                                data = f.read()
+                        except (IOError, OSError) as e:
+                            if e.errno != errno.ENOENT:
+                                self._log.warn('cannot merge %s: %s', path, e)
+                            continue
+
+                        if data and not data.endswith('\n'):
+                            data += '\n'
+                        blocks.append(data)
+
+                    if blocks:
+                        out.write(''.join(blocks))
+                        out.flush()
+
+                    if term:
+                        break
+
+                out.write('%.4f,END,%s,MainThread,,,\n'
+                         % (time.time(), self._name))
+
+        except Exception:
+            self._log.exception('profile merger failed')
+
+
+# ------------------------------------------------------------------------------
@@ -11,6 +11,7 @@ import msgpack
 
 import Queue           as pyq
 import setproctitle    as spt
+import threading       as mt
 import multiprocessing as mp
 
 import radical.utils   as ru
@@ -31,6 +32,16 @@ _BRIDGE_TIMEOUT  =     5  # how long to wait for bridge startup
 _LINGER_TIMEOUT  =   250  # ms to linger after close
 _HIGH_WATER_MARK =     0  # number of messages to buffer before dropping
 
+# defines for bridge modes
+PUBSUB_MODE_POLL  = 'poll'   # forward one message per socket and poll cycle
+PUBSUB_MODE_DRAIN = 'drain'  # forward all pending messages per poll cycle
+PUBSUB_MODE_PROXY = 'proxy'  # forward in libzmq (zmq.proxy_steerable)
+PUBSUB_MODES      = [PUBSUB_MODE_POLL, PUBSUB_MODE_DRAIN, PUBSUB_MODE_PROXY]
+
+_POLL_TIMEOUT    =   100  # ms to wait for messages in drain and proxy mode
+_DRAIN_MAX       =  1024  # max messages forwarded per socket and drain cycle
+_METRICS_TIMEOUT =    10  # seconds between throughput reports of bridges
+
 
 # --------------------------------------------------------------------------
 #
@@ -74,6 +85,16 @@ class Pubsub(ru.Process):
         Addresses are of the form 'tcp://host:port'.  Both 'host' and 'port' can
         be wildcards for BRIDGE roles -- the bridge will report the in and out
         addresses as obj.addr_in and obj.addr_out.
+
+        Bridges forward messages according to `cfg['bridge_mode']`:
+
+          - 'poll' : forward one message per socket and poll cycle (default)
+          - 'drain': forward all pending messages per poll cycle, zero-copy
+          - 'proxy': forward messages within libzmq (`zmq.proxy_steerable()`)
+
+        In proxy mode, `cfg['capture']` enables a capture socket, which is used
+        to report message throughput to the bridge log.  Drain mode reports
+        throughput without a capture socket.
         """
 
         self._session = session
@@ -103,6 +124,14 @@ class Pubsub(ru.Process):
         self._out  = None
         self._ctx  = None
 
+        # bridge mode, and capture / control sockets for proxy mode
+        self._mode    = self._cfg.get('bridge_mode', PUBSUB_MODE_POLL)
+        self._capture = None
+        self._control = None
+        self._proxy   = None
+
+        assert(self._mode in PUBSUB_MODES), 'invalid mode %s' % self._mode
+
         if not self._addr:
             self._addr = 'tcp://*:*'
 
@@ -233,16 +262,98 @@ class Pubsub(ru.Process):
 
         self._log.info('bound bridge %s to %s : %s', self._uid, _addr_in, _addr_out)
 
+        # throughput metrics (messages and bytes forwarded)
+        self._n_msgs  = 0
+        self._n_bytes = 0
+        self._t_last  = time.time()
+
+        if self._mode == PUBSUB_MODE_PROXY \
+            and not hasattr(zmq, 'proxy_steerable'):
+            self._log.warn('zmq.proxy_steerable unavailable - use drain mode')
+            self._mode = PUBSUB_MODE_DRAIN
+
+        if self._mode == PUBSUB_MODE_PROXY:
+
+            # the proxy runs in a separate thread and is stopped via the control
+            # socket.  If requested, the proxy copies all forwarded messages to
+            # the capture socket, which we use to collect throughput metrics.
+            self._control = self._ctx.socket(zmq.PAIR)
+            self._control.linger = _LINGER_TIMEOUT
+            self._control.bind('inproc://%s.control' % self._uid)
+
+            ctrl = self._ctx.socket(zmq.PAIR)
+            ctrl.linger = _LINGER_TIMEOUT
+            ctrl.connect('inproc://%s.control' % self._uid)
+
+            capt = None
+            if self._cfg.get('capture'):
+                self._capture = self._ctx.socket(zmq.PULL)
+                self._capture.linger = _LINGER_TIMEOUT
+                self._capture.hwm    = _HIGH_WATER_MARK
+                self._capture.bind('inproc://%s.capture' % self._uid)
+
+                capt = self._ctx.socket(zmq.PUSH)
+                capt.linger = _LINGER_TIMEOUT
+                capt.hwm    = _HIGH_WATER_MARK
+                capt.connect('inproc://%s.capture' % self._uid)
+
+            self._proxy = mt.Thread(target=self._run_proxy,
+                                    args=[ctrl, capt],
+                                    name='%s.proxy' % self._uid)
+            self._proxy.daemon = True
+            self._proxy.start()
+
         # start polling for messages
         self._poll = zmq.Poller()
-        self._poll.register(self._in,  zmq.POLLIN)
-        self._poll.register(self._out, zmq.POLLIN)
+        if self._mode == PUBSUB_MODE_PROXY:
+            if self._capture:
+                self._poll.register(self._capture, zmq.POLLIN)
+        else:
+            self._poll.register(self._in,  zmq.POLLIN)
+            self._poll.register(self._out, zmq.POLLIN)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _run_proxy(self, ctrl, capt):
+
+        try:
+            zmq.proxy_steerable(self._in, self._out, capt, ctrl)
+
+        except zmq.ContextTerminated:
+            pass
+
+        except Exception:
+            self._log.exception('proxy failed')
+
+        finally:
+            ctrl.close()
+            if capt:
+                capt.close()
 
 
     # --------------------------------------------------------------------------
     # 
     def ru_finalize_common(self):
 
+        if self._proxy:
+            # terminate the proxy before closing the sockets it uses -- zmq
+            # sockets are not thread safe, so we must not close them while the
+            # proxy thread may still use them.  The proxy handles TERMINATE in
+            # its poll loop, so the join will not take long.  If the proxy
+            # died, it closed its end of the control socket already, so we must
+            # not block on the send.
+            if self._proxy.is_alive():
+                try:
+                    _uninterruptible(self._control.send, 'TERMINATE',
+                                     flags=zmq.NOBLOCK)
+                except zmq.Again:
+                    self._log.warn('proxy is gone - cannot terminate')
+            self._proxy.join()
+            self._control.close()
+            if self._capture:
+                self._capture.close()
+
         if self._q   : self._q  .close()
         if self._in  : self._in .close()
         if self._out : self._out.close()
@@ -251,8 +362,78 @@ class Pubsub(ru.Process):
 
     # --------------------------------------------------------------------------
     # 
+    def _metrics(self, n_msgs, n_bytes):
+
+        self._n_msgs  += n_msgs
+        self._n_bytes += n_bytes
+
+        now = time.time()
+        if now - self._t_last < _METRICS_TIMEOUT:
+            return
+
+        self._log.info('forwarded %d msgs (%d bytes) in %.1fs', self._n_msgs,
+                       self._n_bytes, now - self._t_last)
+        self._n_msgs  = 0
+        self._n_bytes = 0
+        self._t_last  = now
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _drain(self, src, tgt):
+        """
+        forward all messages pending on `src` to `tgt` (up to `_DRAIN_MAX`),
+        without copying the message frames.
+        """
+
+        n_msgs  = 0
+        n_bytes = 0
+        while n_msgs < _DRAIN_MAX:
+            try:
+                frames = src.recv_multipart(flags=zmq.NOBLOCK, copy=False)
+            except zmq.Again:
+                break
+            if tgt:
+                _uninterruptible(tgt.send_multipart, frames, copy=False)
+            n_msgs  += 1
+            n_bytes += sum([len(frame) for frame in frames])
+
+        return n_msgs, n_bytes
+
+
+    # --------------------------------------------------------------------------
+    #
     def work_cb(self):
 
+        if self._mode == PUBSUB_MODE_PROXY:
+
+            if not self._proxy.is_alive():
+                self._log.error('proxy died')
+                return False
+
+            if not self._capture:
+                time.sleep(_POLL_TIMEOUT / 1000.0)
+                return True
+
+            if _uninterruptible(self._poll.poll, timeout=_POLL_TIMEOUT):
+                self._metrics(*self._drain(self._capture, None))
+            return True
+
+
+        if self._mode == PUBSUB_MODE_DRAIN:
+
+            _socks = dict(_uninterruptible(self._poll.poll, timeout=_POLL_TIMEOUT))
+
+            # forward all published messages, and all subscription requests
+            if self._in in _socks:
+                self._metrics(*self._drain(self._in, self._out))
+
+            if self._out in _socks:
+                self._drain(self._out, self._in)
+
+            return True
+
+
         _socks = dict(_uninterruptible(self._poll.poll, timeout=1000)) # timeout in ms
 
         if self._in in _socks:
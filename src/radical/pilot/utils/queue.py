@@ -30,6 +30,13 @@ QUEUE_ROLES   = [QUEUE_INPUT, QUEUE_BRIDGE, QUEUE_OUTPUT]
 _BRIDGE_TIMEOUT  =     1  # how long to wait for bridge startup
 _LINGER_TIMEOUT  =   250  # ms to linger after close
 _HIGH_WATER_MARK =     0  # number of messages to buffer before dropping
+_BACKOFF_MIN     =  0.01  # initial wait time when putting to a full queue
+_BACKOFF_MAX     =  1.00  # max     wait time when putting to a full queue
+
+# defines for shard keys of sharded queues
+SHARD_KEY_UID  = 'uid'   # partition things by uid hash
+SHARD_KEY_NODE = 'node'  # partition things by the first node they are placed on
+SHARD_KEYS     = [SHARD_KEY_UID, SHARD_KEY_NODE]
 
 
 # --------------------------------------------------------------------------
@@ -151,6 +158,12 @@ class Queue(ru.Process):
         self._stall_hwm  = cfg.get('stall_hwm', 1)
         self._bulk_size  = cfg.get('bulk_size', 1)
 
+        # The queue capacity (in messages) is configured per bridge.  Bridges
+        # get their own config passed, queue ends get the component config, and
+        # find the bridge config therein.
+        bcfg = self._cfg.get('bridges', {}).get(self._qname, self._cfg)
+        self._capacity   = bcfg.get('capacity') or _HIGH_WATER_MARK
+
         if not self._addr:
             self._addr = 'tcp://*:*'
 
@@ -171,7 +184,7 @@ class Queue(ru.Process):
 
             self._q   = self._ctx.socket(zmq.PUSH)
             self._q.linger = _LINGER_TIMEOUT
-            self._q.hwm    = _HIGH_WATER_MARK
+            self._q.hwm    = self._capacity
             self._q.connect(self._addr)
             self.start(spawn=False)
 
@@ -249,6 +262,10 @@ class Queue(ru.Process):
         assert(self._role == QUEUE_BRIDGE), 'addr_out only set on bridges'
         return self._addr_out
 
+    @property
+    def capacity(self):
+        return self._capacity
+
 
     # --------------------------------------------------------------------------
     # 
@@ -271,7 +288,7 @@ class Queue(ru.Process):
 
         self._in = self._ctx.socket(zmq.PULL)
         self._in.linger = _LINGER_TIMEOUT
-        self._in.hwm    = _HIGH_WATER_MARK
+        self._in.hwm    = self._capacity
         self._in.bind(self._addr)
 
         self._out = self._ctx.socket(zmq.REP)
@@ -389,7 +406,47 @@ class Queue(ru.Process):
       # if self._debug:
       #     self._log.debug("-> %s", pprint.pformat(msg))
         data = msgpack.packb(msg) 
-        _uninterruptible(self._q.send, data)
+
+        if not self._capacity:
+            _uninterruptible(self._q.send, data)
+            return
+
+        # the queue is bounded: if it is full, we back off until the consumers
+        # caught up, which propagates back-pressure to the caller
+        backoff = _BACKOFF_MIN
+        stalled = False
+        while True:
+            try:
+                _uninterruptible(self._q.send, data, flags=zmq.NOBLOCK)
+                break
+            except zmq.Again:
+                if not stalled:
+                    self._log.warn('queue %s is full - stall', self._qname)
+                    stalled = True
+                time.sleep(backoff)
+                backoff = min(backoff * 2, _BACKOFF_MAX)
+
+        if stalled:
+            self._log.info('queue %s accepts messages again', self._qname)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def is_full(self):
+        """
+        Returns `True` if the queue is bounded and full, ie. if a `put()` would
+        currently stall.  This can only be called on the input end, and is not
+        thread safe with respect to concurrent `put()` calls.
+        """
+
+        if not self._role == QUEUE_INPUT:
+            raise RuntimeError("queue %s (%s) can't is_full()" % (self._qname, self._role))
+
+        if not self._capacity:
+            return False
+
+        events = _uninterruptible(self._q.getsockopt, zmq.EVENTS)
+        return not (events & zmq.POLLOUT)
 
 
     # --------------------------------------------------------------------------
@@ -408,6 +465,40 @@ class Queue(ru.Process):
         return msg
 
 
+    # --------------------------------------------------------------------------
+    #
+    @property
+    def socket(self):
+        """
+        The socket of an output end can be registered with a poller -- but
+        messages will only arrive after `request()` has been called.
+        """
+
+        return self._q
+
+
+    # --------------------------------------------------------------------------
+    #
+    def request(self):
+        """
+        Make sure that a request for the next message is pending, and return
+        the socket on which that message will arrive.  That socket can be polled
+        (along with sockets of other queues) to find out when `get_nowait()` will
+        return a message without waiting.
+        """
+
+        if not self._role == QUEUE_OUTPUT:
+            raise RuntimeError("queue %s (%s) can't request()" % (self._qname, self._role))
+
+        with self._lock: # need to protect self._requested
+
+            if not self._requested:
+                _uninterruptible(self._q.send, 'request')
+                self._requested = True
+
+        return self._q
+
+
     # --------------------------------------------------------------------------
     #
     def get_nowait(self, timeout=None): # timeout in ms
@@ -444,5 +535,101 @@ class Queue(ru.Process):
                 return None
 
 
+# ==============================================================================
+#
+class QueueShards(object):
+    """
+    A sharded queue is backed by multiple queue bridges (shards), so that the
+    message throughput is not limited by a single bridge process.  This class
+    represents the input end of a sharded queue: `put()` partitions bulks of
+    things over all shards, by a key derived from each thing:
+
+      - `SHARD_KEY_UID` : hash of the thing's uid
+      - `SHARD_KEY_NODE`: hash of the first node in the thing's slots (falls back
+                          to the uid for things which are not yet placed)
+
+    Output ends attach to individual shards (see `Component.register_input()`).
+    Local message order is only maintained per shard.
+    """
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, session, qname, cfg, addrs, key=SHARD_KEY_UID):
+
+        if key not in SHARD_KEYS:
+            raise ValueError('invalid shard key %s for %s' % (key, qname))
+
+        self._qname  = qname
+        self._key    = key
+        self._queues = [Queue(session, qname, QUEUE_INPUT, cfg, addr=addr)
+                        for addr in addrs]
+
+
+    # --------------------------------------------------------------------------
+    #
+    @property
+    def name(self):
+        return self._qname
+
+    @property
+    def qname(self):
+        return self._qname
+
+    @property
+    def shards(self):
+        return len(self._queues)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def stop(self):
+
+        for q in self._queues:
+            q.stop()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def is_full(self):
+
+        for q in self._queues:
+            if q.is_full():
+                return True
+        return False
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _get_shard(self, thing):
+
+        key = None
+        if self._key == SHARD_KEY_NODE:
+            try:
+                key = thing['slots']['nodes'][0][0]
+            except (KeyError, IndexError, TypeError):
+                pass
+
+        if key is None:
+            key = thing['uid']
+
+        return hash(key) % len(self._queues)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def put(self, msg):
+
+        if not isinstance(msg, list):
+            msg = [msg]
+
+        parts = [list() for _ in self._queues]
+        for thing in msg:
+            parts[self._get_shard(thing)].append(thing)
+
+        for q, part in zip(self._queues, parts):
+            if part:
+                q.put(part)
+
+
 # ------------------------------------------------------------------------------
 
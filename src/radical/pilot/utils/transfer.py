@@ -0,0 +1,272 @@
+
+__copyright__ = "Copyright 2017, http://radical.rutgers.edu"
+__license__   = "MIT"
+
+
+import time
+import Queue           as pyq
+import tarfile
+import tempfile
+import threading       as mt
+import subprocess      as sp
+
+import saga            as rs
+import radical.utils   as ru
+
+
+# ------------------------------------------------------------------------------
+#
+# default settings for concurrent transfers
+DEFAULT_TRANSFER_WORKERS = 8      # number of concurrent transfers
+DEFAULT_TRANSFER_HANDLES = 4      # max number of fs handles per endpoint
+DEFAULT_TRANSFER_BACKLOG = 1024   # max number of pending transfer tasks
+
+
+# ==============================================================================
+#
+class TransferPool(object):
+    """
+    The transfer pool executes file transfer tasks concurrently on a set of
+    worker threads.  Tasks are callables which get passed a SAGA directory
+    handle for a given endpoint (a URL w/o path).  The pool keeps a limited set
+    of handles per endpoint, which are reused across tasks -- a task will wait
+    for a free handle if all handles for its endpoint are in use.
+
+    The number of pending tasks is bounded: `submit()` will block if the backlog
+    is full, which propagates back-pressure to the caller.  Completed tasks are
+    collected via `get_done()`, which returns a list of `[token, error]` tuples,
+    where `token` is the token passed on `submit()`, and `error` is `None` on
+    success.
+    """
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, session, log, name,
+                 workers=DEFAULT_TRANSFER_WORKERS,
+                 handles=DEFAULT_TRANSFER_HANDLES,
+                 backlog=DEFAULT_TRANSFER_BACKLOG):
+
+        self._session   = session
+        self._log       = log
+        self._n_handles = handles
+
+        self._handles   = dict()             # endpoint : {'free', 'count'}
+        self._lock      = mt.Lock()          # protect self._handles
+        self._todo      = pyq.Queue(maxsize=backlog)
+        self._done      = pyq.Queue()
+
+        self._workers   = list()
+        for i in range(workers):
+            worker = mt.Thread(target=self._work,
+                               name='%s.transfer.%d' % (name, i))
+            worker.daemon = True
+            worker.start()
+            self._workers.append(worker)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def close(self):
+
+        for worker in self._workers:
+            self._todo.put(None)
+
+        for worker in self._workers:
+            worker.join()
+
+        with self._lock:
+            for endpoint in self._handles:
+                free = self._handles[endpoint]['free']
+                while not free.empty():
+                    try:
+                        free.get_nowait().close()
+                    except Exception:
+                        pass
+            self._handles = dict()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def submit(self, url, task, token):
+        """
+        Schedule `task(handle)` for execution, where `handle` is a SAGA
+        directory handle for the endpoint of `url`.  This call blocks while
+        the backlog of pending tasks is full.
+        """
+
+        endpoint      = ru.Url(url)   # deep copy
+        endpoint.path = '/'
+
+        self._todo.put([str(endpoint), task, token])
+
+
+    # --------------------------------------------------------------------------
+    #
+    def get_done(self):
+
+        ret = list()
+        while True:
+            try:
+                ret.append(self._done.get_nowait())
+            except pyq.Empty:
+                break
+        return ret
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _get_handle(self, endpoint):
+
+        with self._lock:
+
+            if endpoint not in self._handles:
+                self._handles[endpoint] = {'free'  : pyq.Queue(),
+                                           'count' : 0}
+            entry = self._handles[endpoint]
+
+            try:
+                return entry['free'].get_nowait()
+            except pyq.Empty:
+                pass
+
+            create = (entry['count'] < self._n_handles)
+            if create:
+                entry['count'] += 1
+
+        if create:
+            self._log.debug('create fs handle for %s', endpoint)
+            try:
+                return rs.filesystem.Directory(rs.Url(endpoint),
+                                               session=self._session)
+            except:
+                with self._lock:
+                    entry['count'] -= 1
+                raise
+
+        # all handles are in use - wait for one to be released
+        return entry['free'].get()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _release_handle(self, endpoint, handle):
+
+        with self._lock:
+            self._handles[endpoint]['free'].put(handle)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _work(self):
+
+        while True:
+
+            item = self._todo.get()
+            if item is None:
+                break
+
+            endpoint, task, token = item
+            error  = None
+            handle = None
+
+            try:
+                handle = self._get_handle(endpoint)
+                task(handle)
+
+            except Exception as e:
+                self._log.exception('transfer task failed')
+                error = str(e)
+
+            finally:
+                if handle:
+                    self._release_handle(endpoint, handle)
+
+            self._done.put([token, error])
+
+
+# ------------------------------------------------------------------------------
+#
+def tar_stream(url, files=None, dirs=None, log=None):
+    """
+    Pack the given files and directories into a tar stream, and unpack that
+    stream on the host identified by `url` (a job service URL with schema
+    `fork`, `ssh` or `gsissh`, such as a pilot's `js_hop`).  Packing, transfer
+    and unpacking overlap, and no temporary files are created on either side.
+
+    `files` is a list of `[src, tgt]` pairs, where `src` is a local path and
+    `tgt` the absolute target path.  `dirs` is a list of absolute directory
+    paths to create on the target host.
+
+    Returns `False` if the URL schema does not support streaming, so that the
+    caller can fall back to a different transfer mechanism.  A `RuntimeError`
+    (including the remote stderr) is raised if the stream fails.
+    """
+
+    if not files: files = list()
+    if not dirs : dirs  = list()
+
+    url    = ru.Url(url)
+    untar  = 'tar xmf - -C /'
+    schema = url.schema.split('+')
+
+    if 'gsissh' in schema or 'ssh' in schema:
+        cmd = ['gsissh' if 'gsissh' in schema else 'ssh', '-o', 'BatchMode=yes']
+        if url.port    : cmd += ['-p', str(url.port)]
+        if url.username: cmd += ['%s@%s' % (url.username, url.host)]
+        else           : cmd += [url.host]
+        cmd += [untar]
+
+    elif 'fork' in schema or 'local' in schema:
+        cmd = untar.split()
+
+    else:
+        return False
+
+    if log:
+        log.debug('tar stream %d files, %d dirs: %s', len(files), len(dirs), cmd)
+
+    # stdout and stderr go to a temporary file: they are not read before the
+    # stream completes, and a pipe would block the remote side once full
+    out   = tempfile.TemporaryFile(prefix='rp_tar_stream.')
+    proc  = sp.Popen(cmd, stdin=sp.PIPE, stdout=out, stderr=sp.STDOUT)
+    error = None
+    try:
+        tar = tarfile.open(fileobj=proc.stdin, mode='w|')
+
+        now = time.time()
+        for tgt in dirs:
+            info       = tarfile.TarInfo(tgt.lstrip('/'))
+            info.type  = tarfile.DIRTYPE
+            info.mode  = 0o755
+            info.mtime = now
+            tar.addfile(info)
+
+        for src, tgt in files:
+            tar.add(src, arcname=tgt.lstrip('/'))
+
+        tar.close()
+
+    except (IOError, OSError) as e:
+        # the remote side likely died (EPIPE) -- its output will tell why
+        error = e
+
+    finally:
+        try:
+            proc.stdin.close()
+        except (IOError, OSError):
+            pass
+
+        ret = proc.wait()
+        out.seek(0)
+        msg = out.read()
+        out.close()
+
+    if ret or error:
+        raise RuntimeError('tar stream to %s failed (%s, %s): %s'
+                          % (url, ret, error, msg))
+
+    return True
+
+
+# ------------------------------------------------------------------------------
+
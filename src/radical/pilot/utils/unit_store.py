@@ -0,0 +1,205 @@
+
+__copyright__ = "Copyright 2017, http://radical.rutgers.edu"
+__license__   = "MIT"
+
+
+import os
+import mmap
+import fcntl
+import msgpack
+import threading as mt
+
+
+# ------------------------------------------------------------------------------
+#
+# unit fields which are kept in the store, and are not sent over queues
+STORE_KEYS = ['description']
+
+# key for the store reference of a unit: [offset, length]
+STORE_REF  = '$ref'
+
+# file locks are held per process, so appends of different store instances
+# within the same process are serialized by this lock
+_append_lock = mt.Lock()
+
+
+# ==============================================================================
+#
+class UnitStore(object):
+    """
+    The unit store is an append-only file which holds the immutable, and
+    usually large, parts of unit dicts (see `STORE_KEYS`).  Components which
+    share the store file only send unit *handles* over their queues: the unit
+    dict without the stored fields, plus a reference (offset and length) into
+    the store.  The receiving component maps the store file into memory and
+    restores the stored fields from there.  A unit is thus serialized once when
+    it enters the store, instead of once per queue put, bridge and get.
+
+    Any process can append to the store: appends are serialized via a file
+    lock (and a thread lock within a process).  Stored fields must not be
+    altered while the unit is in the agent -- components which do so need to
+    remove the unit's `STORE_REF`, so that the fields are stored again on the
+    next push.
+
+    All components which exchange handles must run on the same node, as the
+    store relies on the coherence of the local page cache.
+    """
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, path, log=None):
+
+        self._path = os.path.abspath(path)
+        self._log  = log
+        self._lock = mt.Lock()
+        self._wfd  = None     # append handle
+        self._rfd  = None     # read handle
+        self._map  = None     # memory map of the read handle
+        self._size = 0        # size of the memory map
+
+        if self._log:
+            self._log.info('use unit store %s', self._path)
+
+
+    # --------------------------------------------------------------------------
+    #
+    @property
+    def path(self):
+        return self._path
+
+
+    # --------------------------------------------------------------------------
+    #
+    def close(self):
+
+        with self._lock:
+
+            if self._map:
+                self._map.close()
+                self._map = None
+
+            for fd in [self._rfd, self._wfd]:
+                if fd is not None:
+                    os.close(fd)
+
+            self._rfd  = None
+            self._wfd  = None
+            self._size = 0
+
+
+    # --------------------------------------------------------------------------
+    #
+    def pack(self, things):
+        """
+        Return handles for the given things: stored fields are removed, and
+        replaced by a reference into the store.  Units which were not stored
+        before are appended to the store in a single write, and their store
+        reference is also recorded in the original dict, for subsequent pushes.
+        Things other than units are returned as they are.
+        """
+
+        handles = list()
+        blobs   = list()
+        todo    = list()
+
+        for thing in things:
+
+            if thing.get('type') != 'unit':
+                handles.append(thing)
+                continue
+
+            handle = dict()
+            for key, val in thing.iteritems():
+                if key not in STORE_KEYS:
+                    handle[key] = val
+            handles.append(handle)
+
+            if STORE_REF not in thing:
+                blobs.append(msgpack.packb(dict([[key, thing[key]]
+                                                 for key in STORE_KEYS
+                                                 if  key in thing])))
+                todo.append([thing, handle])
+
+        if todo:
+            offset = self._append(''.join(blobs))
+            for [thing, handle], blob in zip(todo, blobs):
+                thing [STORE_REF] = [offset, len(blob)]
+                handle[STORE_REF] = [offset, len(blob)]
+                offset += len(blob)
+
+        return handles
+
+
+    # --------------------------------------------------------------------------
+    #
+    def unpack(self, things):
+        """
+        Restore the stored fields of the given unit handles (in place).  The
+        store reference is kept, so that pushing the units again does not
+        store them again.  Things without a store reference are not changed.
+        """
+
+        for thing in things:
+
+            ref = thing.get(STORE_REF)
+            if ref:
+                offset, length = ref
+                thing.update(msgpack.unpackb(self._read(offset, length)))
+
+        return things
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _append(self, data):
+
+        with self._lock:
+
+            if self._wfd is None:
+                self._wfd = os.open(self._path, os.O_WRONLY | os.O_CREAT
+                                                            | os.O_APPEND)
+
+            # we need to know where our data ends up, so need to hold the file
+            # lock until the write completes
+            with _append_lock:
+                fcntl.lockf(self._wfd, fcntl.LOCK_EX)
+                try:
+                    offset = os.lseek(self._wfd, 0, os.SEEK_END)
+                    done   = 0
+                    while done < len(data):
+                        done += os.write(self._wfd, data[done:])
+                finally:
+                    fcntl.lockf(self._wfd, fcntl.LOCK_UN)
+
+        return offset
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _read(self, offset, length):
+
+        with self._lock:
+
+            # the store grows over time -- remap as needed
+            if offset + length > self._size:
+
+                if self._rfd is None:
+                    self._rfd = os.open(self._path, os.O_RDONLY)
+
+                size = os.fstat(self._rfd).st_size
+                if offset + length > size:
+                    raise RuntimeError('invalid store reference %s:%s (%s)'
+                                       % (offset, length, self._path))
+
+                if self._map:
+                    self._map.close()
+
+                self._size = size
+                self._map  = mmap.mmap(self._rfd, self._size,
+                                       access=mmap.ACCESS_READ)
+
+            return self._map[offset:offset + length]
+
+
+# ------------------------------------------------------------------------------
+
@@ -27,7 +27,9 @@ class Update(rpu.Worker):
     compete for update requests on the update_queue.  Those requests will be
     triplets of collection name, query dict, and update dict.  Update requests
     will be collected into bulks over some time (BULK_COLLECTION_TIME) and
-    number (BULK_COLLECTION_SIZE) to reduce number of roundtrips.
+    number (BULK_COLLECTION_SIZE) to reduce number of roundtrips.  Depending on
+    the session's DB layout, updates go to different collections -- we then
+    collect one bulk per collection.
     """
 
     # --------------------------------------------------------------------------
@@ -58,11 +60,11 @@ class Update(rpu.Worker):
         # TODO: get db handle from a connected session
         _, db, _, _, _   = ru.mongodb_connect(self._dburl)
         self._mongo_db   = db
-        self._coll       = self._mongo_db[self._session_id]
-        self._bulk       = self._coll.initialize_ordered_bulk_op()
+        self._colls      = rpu.get_session_collections(db, self._session_id)
+        self._bulks      = dict()             # collection name : [coll, bulk]
         self._last       = time.time()        # time of last bulk push
         self._uids       = list()             # list of collected uids
-        self._lock       = threading.RLock()  # protect _bulk
+        self._lock       = threading.RLock()  # protect _bulks
 
         self._bct        = self._cfg.get('bulk_collection_time',
                                           DEFAULT_BULK_COLLECTION_TIME)
@@ -108,8 +110,9 @@ class Update(rpu.Worker):
             return False
 
         try:
-            res = self._bulk.execute()
-            self._log.debug("bulk update result: %s", res)
+            for name, [coll, bulk] in self._bulks.iteritems():
+                res = bulk.execute()
+                self._log.debug("bulk update result (%s): %s", name, res)
         except pymongo.errors.OperationFailure as e:
             self._log.exception('bulk exec error: %s' % e.details)
             raise
@@ -129,10 +132,10 @@ class Update(rpu.Worker):
             else:
                 self._prof.prof('update_pushed', uid=uid)
 
-        # empty bulk, refresh state
-        self._last = now
-        self._bulk = self._coll.initialize_ordered_bulk_op()
-        self._uids = list()
+        # empty bulks, refresh state
+        self._last  = now
+        self._bulks = dict()
+        self._uids  = list()
 
         return True
 
@@ -243,11 +246,18 @@ class Update(rpu.Worker):
 
             with self._lock:
 
-                # push the update request onto the bulk
+                # push the update request onto the bulk for the collection
+                # which holds this type of thing (create as needed)
+                coll = self._colls.get(ttype, self._colls['session'])
+                if coll.name not in self._bulks:
+                    self._bulks[coll.name] = [coll,
+                                              coll.initialize_ordered_bulk_op()]
+                bulk = self._bulks[coll.name][1]
+
                 self._uids.append([uid, ttype, state])
-                self._bulk.find  ({'uid'  : uid, 
-                                   'type' : ttype}) \
-                          .update(update_dict)
+                bulk.find  ({'uid'  : uid, 
+                             'type' : ttype}) \
+                    .update(update_dict)
 
         with self._lock:
             # attempt a timed update
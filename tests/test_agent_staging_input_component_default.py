@@ -8,6 +8,7 @@ import string
 import unittest
 import radical.utils as ru
 import radical.pilot as rp
+import radical.pilot.utils as rpu
 from radical.pilot.agent.staging_input.default import Default
 
 try: 
@@ -118,6 +119,8 @@ class TestStagingInputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._cache_dir = None
+        component._fs = rpu.FSLimiter(4)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -144,6 +147,8 @@ class TestStagingInputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._cache_dir = None
+        component._fs = rpu.FSLimiter(4)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -171,6 +176,8 @@ class TestStagingInputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._cache_dir = None
+        component._fs = rpu.FSLimiter(4)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -198,6 +205,8 @@ class TestStagingInputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._cache_dir = None
+        component._fs = rpu.FSLimiter(4)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -224,6 +233,8 @@ class TestStagingInputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._cache_dir = None
+        component._fs = rpu.FSLimiter(4)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -251,6 +262,8 @@ class TestStagingInputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._cache_dir = None
+        component._fs = rpu.FSLimiter(4)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -278,6 +291,8 @@ class TestStagingInputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._cache_dir = None
+        component._fs = rpu.FSLimiter(4)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -304,6 +319,8 @@ class TestStagingInputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._cache_dir = None
+        component._fs = rpu.FSLimiter(4)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -331,6 +348,8 @@ class TestStagingInputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._cache_dir = None
+        component._fs = rpu.FSLimiter(4)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -358,6 +377,8 @@ class TestStagingInputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._cache_dir = None
+        component._fs = rpu.FSLimiter(4)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -386,6 +407,8 @@ class TestStagingInputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._cache_dir = None
+        component._fs = rpu.FSLimiter(4)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -417,6 +440,8 @@ class TestStagingInputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._cache_dir = None
+        component._fs = rpu.FSLimiter(4)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -448,6 +473,8 @@ class TestStagingInputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._cache_dir = None
+        component._fs = rpu.FSLimiter(4)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -476,6 +503,8 @@ class TestStagingInputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._cache_dir = None
+        component._fs = rpu.FSLimiter(4)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -507,6 +536,8 @@ class TestStagingInputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._cache_dir = None
+        component._fs = rpu.FSLimiter(4)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -537,6 +568,8 @@ class TestStagingInputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._cache_dir = None
+        component._fs = rpu.FSLimiter(4)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -565,6 +598,8 @@ class TestStagingInputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._cache_dir = None
+        component._fs = rpu.FSLimiter(4)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -597,6 +632,8 @@ class TestStagingInputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._cache_dir = None
+        component._fs = rpu.FSLimiter(4)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -628,6 +665,8 @@ class TestStagingInputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._cache_dir = None
+        component._fs = rpu.FSLimiter(4)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -656,6 +695,8 @@ class TestStagingInputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._cache_dir = None
+        component._fs = rpu.FSLimiter(4)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -684,6 +725,8 @@ class TestStagingInputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._cache_dir = None
+        component._fs = rpu.FSLimiter(4)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -712,6 +755,8 @@ class TestStagingInputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._cache_dir = None
+        component._fs = rpu.FSLimiter(4)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -740,6 +785,8 @@ class TestStagingInputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._cache_dir = None
+        component._fs = rpu.FSLimiter(4)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -768,6 +815,8 @@ class TestStagingInputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._cache_dir = None
+        component._fs = rpu.FSLimiter(4)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -796,6 +845,8 @@ class TestStagingInputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._cache_dir = None
+        component._fs = rpu.FSLimiter(4)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -824,6 +875,8 @@ class TestStagingInputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._cache_dir = None
+        component._fs = rpu.FSLimiter(4)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -852,6 +905,8 @@ class TestStagingInputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._cache_dir = None
+        component._fs = rpu.FSLimiter(4)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -880,6 +935,8 @@ class TestStagingInputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._cache_dir = None
+        component._fs = rpu.FSLimiter(4)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -913,6 +970,8 @@ class TestStagingInputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._cache_dir = None
+        component._fs = rpu.FSLimiter(4)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -946,6 +1005,8 @@ class TestStagingInputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._cache_dir = None
+        component._fs = rpu.FSLimiter(4)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -979,6 +1040,8 @@ class TestStagingInputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._cache_dir = None
+        component._fs = rpu.FSLimiter(4)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -1012,6 +1075,8 @@ class TestStagingInputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._cache_dir = None
+        component._fs = rpu.FSLimiter(4)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -1045,6 +1110,8 @@ class TestStagingInputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._cache_dir = None
+        component._fs = rpu.FSLimiter(4)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -1077,6 +1144,8 @@ class TestStagingInputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._cache_dir = None
+        component._fs = rpu.FSLimiter(4)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -1110,6 +1179,8 @@ class TestStagingInputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._cache_dir = None
+        component._fs = rpu.FSLimiter(4)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -1143,6 +1214,8 @@ class TestStagingInputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._cache_dir = None
+        component._fs = rpu.FSLimiter(4)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -1184,6 +1257,8 @@ class TestStagingInputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._cache_dir = None
+        component._fs = rpu.FSLimiter(4)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -1210,6 +1285,8 @@ class TestStagingInputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._cache_dir = None
+        component._fs = rpu.FSLimiter(4)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -1237,6 +1314,8 @@ class TestStagingInputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._cache_dir = None
+        component._fs = rpu.FSLimiter(4)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -1264,6 +1343,8 @@ class TestStagingInputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._cache_dir = None
+        component._fs = rpu.FSLimiter(4)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -1290,6 +1371,8 @@ class TestStagingInputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._cache_dir = None
+        component._fs = rpu.FSLimiter(4)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -1317,6 +1400,8 @@ class TestStagingInputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._cache_dir = None
+        component._fs = rpu.FSLimiter(4)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -1344,6 +1429,8 @@ class TestStagingInputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._cache_dir = None
+        component._fs = rpu.FSLimiter(4)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -1370,6 +1457,8 @@ class TestStagingInputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._cache_dir = None
+        component._fs = rpu.FSLimiter(4)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -1397,6 +1486,8 @@ class TestStagingInputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._cache_dir = None
+        component._fs = rpu.FSLimiter(4)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -1424,6 +1515,8 @@ class TestStagingInputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._cache_dir = None
+        component._fs = rpu.FSLimiter(4)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -1452,6 +1545,8 @@ class TestStagingInputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._cache_dir = None
+        component._fs = rpu.FSLimiter(4)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -1483,6 +1578,8 @@ class TestStagingInputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._cache_dir = None
+        component._fs = rpu.FSLimiter(4)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -1514,6 +1611,8 @@ class TestStagingInputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._cache_dir = None
+        component._fs = rpu.FSLimiter(4)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -1542,6 +1641,8 @@ class TestStagingInputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._cache_dir = None
+        component._fs = rpu.FSLimiter(4)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -1573,6 +1674,8 @@ class TestStagingInputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._cache_dir = None
+        component._fs = rpu.FSLimiter(4)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -1603,6 +1706,8 @@ class TestStagingInputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._cache_dir = None
+        component._fs = rpu.FSLimiter(4)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -1631,6 +1736,8 @@ class TestStagingInputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._cache_dir = None
+        component._fs = rpu.FSLimiter(4)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
@@ -1663,6 +1770,8 @@ class TestStagingInputComponent(unittest.TestCase):
         component = Default(cfg=self.cfg, session=None)
         component._prof = mocked_profiler
         component._log = ru.get_logger('dummy')
+        component._cache_dir = None
+        component._fs = rpu.FSLimiter(4)
         actionables = list()
         actionables.append({
             'uid'   : ru.generate_id('sd'),
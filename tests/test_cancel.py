@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+
+import time
+
+import radical.pilot.utils as rpu
+
+
+# ------------------------------------------------------------------------------
+#
+def test_compress_uids():
+
+    uids = ['unit.%06d' % i for i in range(100)]          # one range
+    uids += ['unit.%04d' % i for i in range(5, 10)]       # other width
+    uids += ['task.%06d' % i for i in [1, 2, 3, 7, 9]]    # other prefix, gaps
+    uids += ['unit.foo', 'bar']                           # no index
+    uids += ['unit.000050']                               # duplicate
+
+    arg = rpu.compress_uids(uids)
+
+    # consecutive indexes are compressed, per prefix and width
+    assert(['unit.', 0, 99, 6] in arg['ranges'])
+    assert(['unit.', 5,  9, 4] in arg['ranges'])
+    assert(['task.', 1,  3, 6] in arg['ranges'])
+    assert(len(arg['ranges']) == 3)
+
+    # single uids and short sequences are listed individually
+    assert(sorted(arg['uids']) == sorted(['task.000007', 'task.000009',
+                                          'unit.foo', 'bar']))
+
+    # the round trip results in the (unique) original uids
+    assert(sorted(rpu.expand_uids(arg)) == sorted(set(uids)))
+
+
+# ------------------------------------------------------------------------------
+#
+def test_expand_uids():
+
+    assert(rpu.expand_uids(None)             == [])
+    assert(rpu.expand_uids('unit.000001')    == ['unit.000001'])
+    assert(rpu.expand_uids(['a', 'b'])       == ['a', 'b'])
+    assert(rpu.expand_uids({'uids' : 'a'})   == ['a'])
+    assert(rpu.expand_uids({'ranges' : [['u.', 8, 10, 2]]})
+                                             == ['u.08', 'u.09', 'u.10'])
+    assert(rpu.expand_uids(rpu.compress_uids([])) == [])
+
+
+# ------------------------------------------------------------------------------
+#
+def test_cancel_index_filter():
+
+    idx = rpu.CancelIndex()
+    idx.add(['unit.000001', 'unit.000003'])
+
+    assert(len(idx) == 2)
+    assert('unit.000001' in idx)
+
+    things = [{'uid' : 'unit.%06d' % i} for i in range(5)]
+    keep, canceled = idx.filter(things)
+
+    assert([t['uid'] for t in keep]     == ['unit.000000', 'unit.000002',
+                                            'unit.000004'])
+    assert([t['uid'] for t in canceled] == ['unit.000001', 'unit.000003'])
+
+    # requests are consumed by the filter
+    assert(len(idx) == 0)
+    keep, canceled = idx.filter(things)
+    assert(len(keep) == 5 and not canceled)
+
+    # pop reports if a request existed
+    idx.add(['unit.000002'])
+    assert(idx.pop('unit.000002') is True)
+    assert(idx.pop('unit.000002') is False)
+
+
+# ------------------------------------------------------------------------------
+#
+def test_cancel_index_expire():
+
+    idx = rpu.CancelIndex(ttl=0.1)
+    idx.add(['unit.000001'])
+    time.sleep(0.2)
+    idx.add(['unit.000002'])
+
+    # only the old request expires
+    assert(idx.expire() == 1)
+    assert('unit.000001' not in idx)
+    assert('unit.000002' in idx)
+
+    # no ttl: requests never expire
+    idx = rpu.CancelIndex(ttl=0)
+    idx.add(['unit.000001'])
+    assert(idx.expire() == 0)
+    assert(len(idx) == 1)
+
+
+# ------------------------------------------------------------------------------
+
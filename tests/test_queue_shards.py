@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+
+import logging
+
+import radical.pilot.utils as rpu
+
+try:
+    import mock
+except ImportError:
+    from unittest import mock
+
+
+# ------------------------------------------------------------------------------
+#
+_log   = logging.getLogger('test_queue_shards')
+_addrs = ['tcp://127.0.0.1:%d' % port for port in range(10000, 10004)]
+
+# we don't want to connect to real bridges -- any object will do
+_QUEUE  = 'radical.pilot.utils.queue.Queue'
+_OUTPUT = 'radical.pilot.utils.component.rpu_Queue'
+
+
+def _queue(*args, **kwargs):
+    return mock.Mock(addr=kwargs.get('addr'))
+
+
+# ------------------------------------------------------------------------------
+#
+def _unit(i, node=None):
+
+    unit = {'uid' : 'unit.%06d' % i}
+    if node is not None:
+        unit['slots'] = {'nodes' : [['node.%04d' % node, 'n%d' % node]]}
+    return unit
+
+
+# ------------------------------------------------------------------------------
+#
+@mock.patch(_QUEUE, side_effect=_queue)
+def test_shard_select(_):
+
+    shards = rpu.QueueShards(None, 'agent_executing_queue', {}, _addrs)
+    assert(shards.shards == 4)
+
+    # the uid key spreads things over all shards, consistently
+    units = [_unit(i) for i in range(100)]
+    idxs  = [shards._get_shard(unit) for unit in units]
+    assert(set(idxs) == set(range(4)))
+    assert(idxs == [shards._get_shard(unit) for unit in units])
+
+    # the node key keeps things on the same node on the same shard...
+    shards = rpu.QueueShards(None, 'agent_executing_queue', {}, _addrs,
+                             key=rpu.SHARD_KEY_NODE)
+    for node in range(8):
+        idxs = [shards._get_shard(_unit(i, node)) for i in range(20)]
+        assert(len(set(idxs)) == 1)
+
+    # ... and falls back to the uid for things without placement
+    for unit in [_unit(1), dict(_unit(2), slots=None),
+                 dict(_unit(3), slots={'nodes' : []})]:
+        assert(shards._get_shard(unit) == hash(unit['uid']) % 4)
+
+    # unknown keys are rejected
+    try:
+        rpu.QueueShards(None, 'agent_executing_queue', {}, _addrs, key='foo')
+        assert(False), 'expected ValueError'
+    except ValueError:
+        pass
+
+
+# ------------------------------------------------------------------------------
+#
+@mock.patch(_QUEUE, side_effect=_queue)
+def test_shard_put(_):
+
+    shards = rpu.QueueShards(None, 'agent_executing_queue', {}, _addrs)
+    units  = [_unit(i) for i in range(100)]
+
+    shards.put(units)
+
+    # each shard gets one bulk with exactly the things hashed to it
+    seen = list()
+    for idx, q in enumerate(shards._queues):
+        assert(q.put.call_count == 1)
+        part = q.put.call_args[0][0]
+        assert(all([shards._get_shard(unit) == idx for unit in part]))
+        seen += part
+    assert(sorted(seen) == sorted(units))
+
+    # shards without things are not bothered
+    for q in shards._queues:
+        q.put.reset_mock()
+    shards.put(units[0])
+    assert(sum([q.put.call_count for q in shards._queues]) == 1)
+
+
+# ------------------------------------------------------------------------------
+#
+def _component(index, steal=None):
+
+    bcfg = {'addr_out'    : _addrs[0],
+            'shard_addrs' : [[addr, addr] for addr in _addrs]}
+    if steal is not None:
+        bcfg['steal'] = steal
+
+    comp = mock.Mock(uid='comp.%04d' % index, _index=index, _inputs=dict(),
+                     _workers=dict(), _session=None, _log=_log,
+                     _cfg={'bridges' : {'agent_executing_queue' : bcfg}})
+    return comp
+
+
+def _register(comp):
+
+    # ----------------------------------------------------------------------
+    def work(units):
+        pass
+    # ----------------------------------------------------------------------
+
+    rpu.Component.__dict__['register_input'](comp, 'AGENT_EXECUTING_PENDING',
+                                             'agent_executing_queue', work)
+    return comp._inputs.values()[0]
+
+
+# ------------------------------------------------------------------------------
+#
+@mock.patch(_OUTPUT, side_effect=_queue)
+def test_shard_steal(_):
+
+    # components attach to their home shard by instance index...
+    for index in range(8):
+        inp = _register(_component(index))
+        assert(inp['queue'].addr == _addrs[index % 4])
+
+        # ... and steal from all others
+        assert(sorted([q.addr for q in inp['steal']])
+               == sorted(_addrs[:index % 4] + _addrs[index % 4 + 1:]))
+
+    # stealing can be disabled
+    inp = _register(_component(5, steal=False))
+    assert(inp['queue'].addr == _addrs[1])
+    assert(inp['steal'] == [])
+
+
+# ------------------------------------------------------------------------------
+#
+def test_check_shards():
+
+    bname = 'agent_executing_queue'
+    ctype = 'AgentExecutingComponent'
+    log   = mock.Mock()
+
+    # enough consumers over all agents
+    cfg = {'components' : {ctype : {'count' : 2}},
+           'agents'     : {'agent_1' : {'components' : {ctype : {'count' : 2}}}}}
+    rpu.Component._check_shards(cfg, bname, {'shards' : 4}, log)
+    assert(not log.warn.called)
+
+    # too few consumers: stealing drains the other shards...
+    cfg = {'components' : {ctype : {'count' : 2}}}
+    rpu.Component._check_shards(cfg, bname, {'shards' : 4}, log)
+    assert(log.warn.call_count == 1)
+
+    # ... but without stealing some shards are never drained
+    try:
+        rpu.Component._check_shards(cfg, bname, {'shards' : 4,
+                                                 'steal'  : False}, log)
+        assert(False), 'expected ValueError'
+    except ValueError:
+        pass
+
+    # consumers not started from this config
+    log.reset_mock()
+    rpu.Component._check_shards({}, bname, {'shards' : 4}, log)
+    assert(log.warn.call_count == 1)
+
+
+# ------------------------------------------------------------------------------
+
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+
+import os
+
+import radical.pilot.staging_directives as rpsd
+
+
+# ------------------------------------------------------------------------------
+#
+def test_expand_cached():
+
+    sd  = {'source' : 'client:///input.dat',
+           'target' : 'unit:///input.dat',
+           'action' : rpsd.TRANSFER}
+    ret = rpsd.expand_staging_directives([sd, sd, 'input.dat > staged.dat'])
+
+    # repeated directives get the same content, but new IDs and new dicts
+    assert(ret[0]['uid'] != ret[1]['uid'])
+    assert(ret[0] is not ret[1])
+    for key in ['source', 'target', 'action', 'flags', 'priority']:
+        assert(ret[0][key] == ret[1][key])
+
+    # changes to an expanded directive don't leak into the cache
+    ret[0]['source'] = 'changed'
+    again = rpsd.expand_staging_directives(sd)[0]
+    assert(again['source'] == 'client:///input.dat')
+
+    # string directives are expanded as before
+    assert(ret[2]['source'] == 'input.dat')
+    assert(ret[2]['target'] == 'staged.dat')
+    assert(ret[2]['action'] == rpsd.DEFAULT_ACTION)
+
+    # deprecated schemas are translated
+    ret = rpsd.expand_staging_directives('staging:///data.txt')
+    assert(ret[0]['source'] == 'pilot:///data.txt')
+
+
+# ------------------------------------------------------------------------------
+#
+def test_cache_size():
+
+    old = rpsd._CACHE_SIZE
+    try:
+        rpsd._CACHE_SIZE = 2
+        cache = dict()
+        for i in range(3):
+            rpsd._cache(cache, i, i)
+        assert(len(cache) == 3)
+
+        # the cache is reset once it grows beyond its size
+        rpsd._cache(cache, 3, 3)
+        assert(cache == {3 : 3})
+
+    finally:
+        rpsd._CACHE_SIZE = old
+
+
+# ------------------------------------------------------------------------------
+#
+def test_complete_url():
+
+    ctx_1 = {'pwd'      : 'sftp://host/sbox/unit.000000/',
+             'unit'     : 'sftp://host/sbox/unit.000000/',
+             'pilot'    : 'sftp://host/sbox/',
+             'resource' : 'sftp://host/rp/'}
+    ctx_2 = dict(ctx_1)
+    ctx_2['pilot'] = 'sftp://other/sbox/'
+
+    url_1 = rpsd.complete_url('pilot:///data/input.dat', ctx_1)
+    url_2 = rpsd.complete_url('pilot:///data/input.dat', ctx_2)
+
+    # pilot URLs expand into the pilot's staging area
+    assert(url_1.host == 'host')
+    assert(os.path.normpath(url_1.path) == '/sbox/staging_area/data/input.dat')
+
+    # results are cached per path and context
+    assert(rpsd.complete_url('pilot:///data/input.dat', ctx_1) is url_1)
+    assert(url_2.host == 'other')
+
+    # relative paths and client paths are interpreted relative to pwd
+    for path in ['input.dat', 'client:///input.dat']:
+        url = rpsd.complete_url(path, ctx_1)
+        assert(os.path.normpath(url.path) == '/sbox/unit.000000/input.dat')
+
+    # absolute paths are not expanded
+    assert(str(rpsd.complete_url('/tmp/input.dat', ctx_1).path)
+           == '/tmp/input.dat')
+
+
+# ------------------------------------------------------------------------------
+#
+def test_local_context():
+
+    unit = {'pilot_sandbox'    : 'sftp://host/sbox/pilot.0000/',
+            'unit_sandbox'     : 'sftp://host/sbox/pilot.0000/unit.000000/',
+            'resource_sandbox' : 'sftp://host/sbox/'}
+
+    ctx = rpsd.get_local_context(unit)
+
+    assert(ctx['pilot']    == 'file://localhost/sbox/pilot.0000/')
+    assert(ctx['unit']     == 'file://localhost/sbox/pilot.0000/unit.000000/')
+    assert(ctx['pwd']      == ctx['unit'])
+    assert(ctx['resource'] == 'file://localhost/sbox/')
+
+
+# ------------------------------------------------------------------------------
+#
+def test_cache_location():
+
+    rel = rpsd.get_cache_path('file://localhost/data/input.dat', 1024, 12345)
+
+    # the cache key depends on url, size and mtime
+    assert(rel.startswith('%s/' % rpsd.STAGING_CACHE))
+    assert(rel.endswith('/input.dat'))
+    assert(rel == rpsd.get_cache_path('file://localhost/data/input.dat',
+                                      1024, 12345))
+    assert(rel != rpsd.get_cache_path('file://localhost/data/input.dat',
+                                      1024, 12346))
+
+    # umgr (cache URL) and agent (cache dir) agree on the cache location
+    for psbox in ['file://localhost/sbox/pilot.0000/',
+                  'file://localhost/sbox/pilot.0000']:
+        url = rpsd.complete_url(rpsd.get_cache_url(rel), {'pilot' : psbox})
+        cache_dir = rpsd.get_cache_dir('/sbox/pilot.0000/')
+        assert(os.path.normpath(url.path).startswith('%s/' % cache_dir))
+
+
+# ------------------------------------------------------------------------------
+
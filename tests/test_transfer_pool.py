@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+
+import time
+import logging
+import threading as mt
+
+import radical.pilot.utils as rpu
+
+try:
+    import mock
+except ImportError:
+    from unittest import mock
+
+
+# ------------------------------------------------------------------------------
+#
+_log = logging.getLogger('test_transfer_pool')
+
+# we don't want to create real SAGA handles -- any object will do
+_DIRECTORY = 'radical.pilot.utils.transfer.rs.filesystem.Directory'
+
+
+# ------------------------------------------------------------------------------
+#
+def _wait_done(pool, n, timeout=10.0):
+
+    done  = list()
+    start = time.time()
+    while len(done) < n and time.time() - start < timeout:
+        done += pool.get_done()
+        time.sleep(0.01)
+    return done
+
+
+# ------------------------------------------------------------------------------
+#
+@mock.patch(_DIRECTORY, side_effect=lambda *args, **kwargs: mock.Mock())
+def test_get_done(_):
+
+    pool = rpu.TransferPool(None, _log, 'test', workers=4, handles=2)
+
+    # ----------------------------------------------------------------------
+    def _fail(handle):
+        raise RuntimeError('oops')
+    # ----------------------------------------------------------------------
+
+    for i in range(10):
+        pool.submit('file://localhost/tmp/%d' % i, lambda handle: None, i)
+    pool.submit('file://localhost/tmp/fail', _fail, 'fail')
+
+    done = dict(_wait_done(pool, 11))
+    pool.close()
+
+    # all tasks are reported exactly once, with the error of failed tasks
+    assert(sorted(done.keys()) == sorted(range(10) + ['fail']))
+    assert(all([done[i] is None for i in range(10)]))
+    assert('oops' in done['fail'])
+    assert(pool.get_done() == [])
+
+
+# ------------------------------------------------------------------------------
+#
+@mock.patch(_DIRECTORY, side_effect=lambda *args, **kwargs: mock.Mock())
+def test_handles(directory):
+
+    pool    = rpu.TransferPool(None, _log, 'test', workers=8, handles=2)
+    used    = dict()   # endpoint : set of handles
+    active  = dict()   # endpoint : number of active tasks
+    maxed   = dict()   # endpoint : max number of active tasks
+    lock    = mt.Lock()
+
+    # ----------------------------------------------------------------------
+    def _task(ep):
+        def _do(handle):
+            with lock:
+                used.setdefault(ep, set()).add(id(handle))
+                active[ep] = active.get(ep, 0) + 1
+                maxed [ep] = max(maxed.get(ep, 0), active[ep])
+            time.sleep(0.01)
+            with lock:
+                active[ep] -= 1
+        return _do
+    # ----------------------------------------------------------------------
+
+    for i in range(40):
+        ep = ['host_a', 'host_b'][i % 2]
+        pool.submit('sftp://%s/tmp/%d' % (ep, i), _task(ep), i)
+
+    assert(len(_wait_done(pool, 40)) == 40)
+    pool.close()
+
+    # handles are limited per endpoint, and are reused across tasks
+    for ep in ['host_a', 'host_b']:
+        assert(len(used[ep])  <= 2)
+        assert(maxed[ep]      <= 2)
+    assert(directory.call_count <= 4)
+
+
+# ------------------------------------------------------------------------------
+#
+@mock.patch(_DIRECTORY, side_effect=lambda *args, **kwargs: mock.Mock())
+def test_backlog(_):
+
+    pool    = rpu.TransferPool(None, _log, 'test', workers=1, handles=1,
+                               backlog=1)
+    release = mt.Event()
+    started = mt.Event()
+
+    # ----------------------------------------------------------------------
+    def _block(handle):
+        started.set()
+        release.wait()
+    # ----------------------------------------------------------------------
+
+    # the first task occupies the worker, the second fills the backlog
+    pool.submit('file://localhost/tmp/0', _block, 0)
+    started.wait()
+    pool.submit('file://localhost/tmp/1', lambda handle: None, 1)
+
+    # the third submit blocks until the backlog drains
+    submitter = mt.Thread(target=pool.submit,
+                          args=['file://localhost/tmp/2', lambda h: None, 2])
+    submitter.start()
+    time.sleep(0.2)
+    assert(submitter.is_alive())
+    assert(pool.get_done() == [])
+
+    release.set()
+    submitter.join()
+
+    done = _wait_done(pool, 3)
+    pool.close()
+
+    # tasks complete in order on a single worker
+    assert([token for token, error in done] == [0, 1, 2])
+
+
+# ------------------------------------------------------------------------------
+
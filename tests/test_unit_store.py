@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+
+import os
+import shutil
+import tempfile
+import threading       as mt
+import multiprocessing as mp
+
+import radical.pilot.utils as rpu
+
+
+# ------------------------------------------------------------------------------
+#
+def _unit(uid, size=16):
+
+    return {'uid'         : uid,
+            'type'        : 'unit',
+            'state'       : 'AGENT_EXECUTING_PENDING',
+            'description' : {'executable' : '/bin/echo',
+                             'arguments'  : [uid * size]}}
+
+
+# ------------------------------------------------------------------------------
+#
+def _pack(path, prefix, n, refs):
+
+    store = rpu.UnitStore(path)
+    for i in range(n):
+        unit   = _unit('%s.%06d' % (prefix, i))
+        handle = store.pack([unit])[0]
+        refs.append([unit['uid'], handle[rpu.STORE_REF]])
+    store.close()
+
+
+# ------------------------------------------------------------------------------
+#
+def _pack_proc(path, prefix, n, q):
+
+    refs = list()
+    _pack(path, prefix, n, refs)
+    q.put(refs)
+
+
+# ------------------------------------------------------------------------------
+#
+def _check(store, refs, size=16):
+
+    for uid, ref in refs:
+        handle = store.unpack([{'uid'         : uid,
+                                'type'        : 'unit',
+                                rpu.STORE_REF : ref}])[0]
+        assert(handle['description'] == _unit(uid, size)['description'])
+
+
+# ------------------------------------------------------------------------------
+#
+def test_pack_unpack():
+
+    tmp = tempfile.mkdtemp()
+    try:
+        path  = '%s/units.store' % tmp
+        store = rpu.UnitStore(path)
+
+        unit  = _unit('unit.000000')
+        other = {'uid' : 'pilot.0000', 'type' : 'pilot'}
+
+        handles = store.pack([unit, other])
+
+        # stored fields are stripped from the handle, others are passed on
+        assert('description' not in handles[0])
+        assert(handles[0][rpu.STORE_REF] == unit[rpu.STORE_REF])
+        assert(handles[1] is other)
+
+        # packing again does not store again
+        size = os.path.getsize(path)
+        store.pack([unit])
+        assert(os.path.getsize(path) == size)
+
+        # a unit with a changed description needs to drop its reference
+        unit['description']['arguments'] = ['changed']
+        del(unit[rpu.STORE_REF])
+        handle = store.pack([unit])[0]
+        assert(os.path.getsize(path) > size)
+
+        restored = store.unpack([handle])[0]
+        assert(restored['description']['arguments'] == ['changed'])
+        assert(restored[rpu.STORE_REF] == handle[rpu.STORE_REF])
+
+        # things without reference are left alone
+        assert(store.unpack([other])[0] == other)
+
+        store.close()
+
+    finally:
+        shutil.rmtree(tmp)
+
+
+# ------------------------------------------------------------------------------
+#
+def test_remap():
+
+    tmp = tempfile.mkdtemp()
+    try:
+        path   = '%s/units.store' % tmp
+        writer = rpu.UnitStore(path)
+        reader = rpu.UnitStore(path)
+
+        refs = list()
+        for i in range(10):
+            unit = _unit('unit.%06d' % i, size=1024)
+            writer.pack([unit])
+            refs.append([unit['uid'], unit[rpu.STORE_REF]])
+
+            # the reader needs to remap the grown store for each new unit
+            _check(reader, refs, size=1024)
+
+        writer.close()
+        reader.close()
+
+    finally:
+        shutil.rmtree(tmp)
+
+
+# ------------------------------------------------------------------------------
+#
+def test_concurrent_append():
+
+    tmp = tempfile.mkdtemp()
+    try:
+        path = '%s/units.store' % tmp
+        n    = 200
+
+        # two store instances in threads of this process
+        refs_1  = list()
+        refs_2  = list()
+        threads = [mt.Thread(target=_pack, args=[path, 't1', n, refs_1]),
+                   mt.Thread(target=_pack, args=[path, 't2', n, refs_2])]
+        for t in threads: t.start()
+        for t in threads: t.join()
+
+        # two store instances in different processes
+        q     = mp.Queue()
+        procs = [mp.Process(target=_pack_proc, args=[path, 'p1', n, q]),
+                 mp.Process(target=_pack_proc, args=[path, 'p2', n, q])]
+        for p in procs: p.start()
+        refs_3 = q.get()
+        refs_4 = q.get()
+        for p in procs: p.join()
+
+        refs = refs_1 + refs_2 + refs_3 + refs_4
+        assert(len(refs) == 4 * n)
+
+        # no two appends overlap, and all units are intact
+        ranges = sorted([ref for uid, ref in refs])
+        for [o1, l1], [o2, l2] in zip(ranges[:-1], ranges[1:]):
+            assert(o1 + l1 <= o2)
+
+        store = rpu.UnitStore(path)
+        _check(store, refs)
+        store.close()
+
+    finally:
+        shutil.rmtree(tmp)
+
+
+# ------------------------------------------------------------------------------
+